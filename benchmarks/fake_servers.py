@@ -0,0 +1,185 @@
+"""
+Локальные заглушки Bot API Telegram, OpenWeather, Ambee и NOAA для нагрузочного теста.
+
+Все заглушки обслуживает одно приложение aiohttp. Задержки и ошибки задаются параметрами
+и определяются хешем от seed, чата и номера попытки, а не порядком запросов,
+поэтому при одинаковых параметрах прогоны воспроизводимы независимо от параллелизма.
+Статистика (число вызовов, моменты доставки) отдаётся по GET /_stats.
+"""
+import asyncio
+import json
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+
+@dataclass
+class FakeConfig:
+    seed: int = 1
+    telegram_latency: float = 0.03     # задержка ответа Bot API, секунды
+    telegram_jitter: float = 0.02      # равномерный разброс задержки, секунды
+    telegram_error_rate: float = 0.0   # доля ответов 500
+    telegram_429_rate: float = 0.0     # доля первых попыток с ответом 429
+    telegram_retry_after: int = 1      # retry_after в ответах 429, секунды
+    blocked_rate: float = 0.0          # доля чатов, заблокировавших бота (403)
+    upstream_latency: float = 0.1      # задержка ответа погодных API и NOAA, секунды
+    upstream_error_rate: float = 0.0   # доля ответов 503 от погодных API и NOAA
+    flux_dict_rows: bool = False       # отдавать ряд потока списком словарей, а не таблицей с заголовком
+
+
+def chance(*key: object) -> float:
+    """Детерминированное псевдослучайное число из [0, 1) по ключу."""
+    return zlib.crc32(":".join(map(str, key)).encode()) / 2 ** 32
+
+
+class FakeServers:
+    def __init__(self, config: FakeConfig) -> None:
+        self.config = config
+        self.calls: Counter[str] = Counter()
+        self.attempts: Counter[int] = Counter()
+        self.delivered: dict[int, float] = {}
+        self.uploads = 0
+        self._message_id = 0
+
+    def application(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.telegram)
+        app.router.add_get("/data/2.5/weather", self.weather)
+        app.router.add_get("/latest/pollen/by-lat-lng", self.pollen)
+        app.router.add_get("/products/10cm-flux-30-day.json", self.flux)
+        app.router.add_get("/products/noaa-scales.json", self.scales)
+        app.router.add_get("/_stats", self.stats)
+        return app
+
+    async def telegram(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[f"telegram.{method}"] += 1
+        data = await request.post()
+        config = self.config
+        if method not in ("sendMessage", "sendPhoto"):
+            return web.json_response({"ok": True, "result": True})
+
+        chat_id = int(data["chat_id"])
+        self.attempts[chat_id] += 1
+        attempt = self.attempts[chat_id]
+        await asyncio.sleep(config.telegram_latency + config.telegram_jitter * chance(config.seed, "lat", chat_id, attempt))
+
+        if chance(config.seed, "blocked", chat_id) < config.blocked_rate:
+            return _telegram_error(403, "Forbidden: bot was blocked by the user")
+        if attempt == 1 and chance(config.seed, "429", chat_id) < config.telegram_429_rate:
+            return _telegram_error(
+                429, f"Too Many Requests: retry after {config.telegram_retry_after}",
+                {"retry_after": config.telegram_retry_after}
+            )
+        if chance(config.seed, "500", chat_id, attempt) < config.telegram_error_rate:
+            return _telegram_error(500, "Internal Server Error")
+
+        self.delivered.setdefault(chat_id, time.time())
+        self._message_id += 1
+        result = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if method == "sendPhoto":
+            photo = data["photo"]
+            # Загружаемый файл aiogram передаёт отдельной частью формы со ссылкой attach://<имя>
+            if isinstance(photo, str) and photo.startswith("attach://"):
+                photo = data[photo.removeprefix("attach://")]
+            if isinstance(photo, str):
+                file_id = photo
+            else:
+                self.uploads += 1
+                file_id = f"photo-{zlib.crc32(photo.file.read())}"
+            result["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 480, "height": 330}]
+            result["caption"] = data.get("caption")
+        else:
+            result["text"] = data["text"]
+        return web.json_response({"ok": True, "result": result})
+
+    async def _upstream(self, name: str) -> web.Response | None:
+        self.calls[name] += 1
+        await asyncio.sleep(self.config.upstream_latency)
+        if chance(self.config.seed, name, self.calls[name]) < self.config.upstream_error_rate:
+            return web.Response(status=503, reason="Service Unavailable")
+        return None
+
+    async def weather(self, request: web.Request) -> web.Response:
+        error = await self._upstream("openweather")
+        if error is not None:
+            return error
+        lat, lon = float(request.query["lat"]), float(request.query["lon"])
+        spread = chance(self.config.seed, "weather", lat, lon)
+        return web.json_response({
+            "weather": [{"description": "облачно с прояснениями"}],
+            "wind": {"deg": round(spread * 360), "speed": round(1 + spread * 7, 1)},
+            "main": {"feels_like": round(-5 + spread * 20, 1), "grnd_level": round(975 + spread * 50)},
+            "dt": int(time.time()),
+        })
+
+    async def pollen(self, request: web.Request) -> web.Response:
+        error = await self._upstream("ambee")
+        if error is not None:
+            return error
+        return web.json_response({"data": [{
+            "Risk": {"grass_pollen": "Low", "tree_pollen": "Moderate", "weed_pollen": "Low"},
+            "Count": {"grass_pollen": 3, "tree_pollen": 40, "weed_pollen": 1},
+            "Species": {"Tree": {"Birch": 25, "Oak": 5}},
+        }]})
+
+    async def flux(self, request: web.Request) -> web.Response:
+        error = await self._upstream("noaa.flux")
+        if error is not None:
+            return error
+        today = datetime.now(timezone.utc).replace(hour=20, minute=0, second=0, microsecond=0)
+        series = [
+            ((today - timedelta(days=30 - day)).strftime("%Y-%m-%d %H:%M:%S"), 120 + day * 2) for day in range(30)
+        ]
+        if self.config.flux_dict_rows:
+            return web.json_response([{"time_tag": time_tag, "flux": flux} for time_tag, flux in series])
+        return web.json_response([["time_tag", "flux"]] + [[time_tag, str(flux)] for time_tag, flux in series])
+
+    async def scales(self, request: web.Request) -> web.Response:
+        error = await self._upstream("noaa.scales")
+        if error is not None:
+            return error
+        today = datetime.now(timezone.utc).date()
+        return web.json_response({
+            str(day): {"DateStamp": (today + timedelta(days=day)).isoformat(), "G": {"Scale": str(day % 3)}}
+            for day in range(4)
+        })
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "calls": dict(self.calls),
+            "uploads": self.uploads,
+            "delivered": {str(chat_id): at for chat_id, at in self.delivered.items()},
+        })
+
+
+def _telegram_error(status: int, description: str, parameters: dict | None = None) -> web.Response:
+    body = {"ok": False, "error_code": status, "description": description}
+    if parameters:
+        body["parameters"] = parameters
+    return web.json_response(body, status=status)
+
+
+def serve(host: str, port: int, config: dict) -> None:
+    """Запускает заглушки до завершения процесса (используется как цель multiprocessing)."""
+    web.run_app(FakeServers(FakeConfig(**config)).application(), host=host, port=port, print=None)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--config", default="{}", help="JSON with FakeConfig fields")
+    args = parser.parse_args()
+    print(f"Serving fakes on http://{args.host}:{args.port} with {asdict(FakeConfig(**json.loads(args.config)))}")
+    serve(args.host, args.port, json.loads(args.config))
@@ -0,0 +1,243 @@
+"""
+Нагрузочный тест утренней рассылки на локальных заглушках Telegram и внешних API.
+
+Создаёт во временном каталоге базу с N синтетическими подписчиками, чья доставка приходится
+на текущий слот, прогоняет тик колеса доставки (тот же путь, что и по расписанию)
+и выводит пропускную способность, задержку доставки p50/p99, число запросов к внешним API,
+число загрузок графика и пиковое потребление памяти. Все случайные величины задаются seed,
+результаты можно сохранить в JSON и сравнивать между версиями.
+
+Пример:
+    python benchmarks/load_test.py --subscribers 5000 --cells 200 --global-rate 500 --output before.json
+"""
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from dataclasses import fields
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import FakeConfig, serve  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test of the morning broadcast against local fakes.")
+    parser.add_argument("--subscribers", type=int, default=2000, help="synthetic chats to seed")
+    parser.add_argument("--cells", type=int, default=50, help="distinct subscriber locations")
+    parser.add_argument("--default-location-share", type=float, default=0.2,
+                        help="share of chats without a location of their own")
+    parser.add_argument("--global-rate", type=float, default=None,
+                        help="override the broadcast rate limit, messages per second")
+    parser.add_argument("--concurrency", type=int, default=None, help="override the broadcast concurrency")
+    parser.add_argument("--cold", action="store_true", help="do not prewarm reports ahead of the slot")
+    parser.add_argument("--trace", action="store_true", help="record the broadcast as a Chrome trace with a CPU profile")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--record", metavar="ARCHIVE", help="record upstream API responses into this archive")
+    parser.add_argument("--replay", metavar="ARCHIVE", help="serve upstream API responses from this archive")
+    parser.add_argument("--replay-latency", action="store_true", help="replay with the recorded latencies")
+    for field in fields(FakeConfig):
+        flag = f"--{field.name.replace('_', '-')}"
+        if isinstance(field.default, bool):
+            parser.add_argument(flag, action="store_true")
+        else:
+            parser.add_argument(flag, type=type(field.default), default=field.default)
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def percentile(values: list[float], share: float) -> float | None:
+    """Процентиль по ближайшему рангу."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))]
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "-C", ROOT, "describe", "--always", "--dirty"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed_subscribers(args: argparse.Namespace, due: int) -> list[str | None]:
+    """Заполняет базу подписчиками; возвращает их ячейки."""
+    from python_scripts.db import get_database
+    from python_scripts.geo import cell_for
+    from python_scripts.subscriptions import init_db
+
+    init_db()
+    rng = random.Random(args.seed)
+    locations = [(round(rng.uniform(41, 70), 4), round(rng.uniform(20, 140), 4)) for _ in range(args.cells)]
+    rows = []
+    for chat_id in range(1, args.subscribers + 1):
+        if rng.random() < args.default_location_share:
+            rows.append((chat_id, None, None, None, due))
+        else:
+            lat, lon = rng.choice(locations)
+            rows.append((chat_id, lat, lon, cell_for(lat, lon), due))
+    get_database().write(lambda conn: conn.executemany(
+        "INSERT INTO subscribers (chat_id, lat, lon, cell, next_delivery_utc) VALUES (?, ?, ?, ?, ?)", rows
+    ))
+    return sorted({row[3] for row in rows}, key=str)
+
+
+async def run_broadcast(args: argparse.Namespace) -> dict:
+    from python_scripts import jopae_tg_bot
+    from python_scripts.db import get_database
+    from python_scripts.delivery_schedule import slot_of
+    from python_scripts.http_client import get_http_stats
+    from python_scripts.message import report_cache
+    from python_scripts.subscriptions import get_delivery_stats, get_all_subscribers
+    from python_scripts.tracing import tracer
+
+    if args.global_rate is not None:
+        jopae_tg_bot.send_bucket = jopae_tg_bot.TokenBucket(args.global_rate)
+    if args.concurrency is not None:
+        jopae_tg_bot.BroadcastDispatcher = functools.partial(jopae_tg_bot.BroadcastDispatcher, concurrency=args.concurrency)
+
+    due = slot_of(time.time())
+    cells = seed_subscribers(args, due)
+
+    prewarm_duration = 0.0
+    if not args.cold:
+        started = time.monotonic()
+        await jopae_tg_bot.prewarm_reports(cells)
+        prewarm_duration = time.monotonic() - started
+
+    if args.trace:
+        tracer.arm(profile=True)
+    fired_at = time.time()
+    await jopae_tg_bot.wheel.tick(due)
+    await jopae_tg_bot.wheel.wait_fired()
+    duration = time.time() - fired_at
+
+    stats = get_delivery_stats(time.strftime("%Y-%m-%d", time.gmtime(due)))
+    remaining = len(get_all_subscribers())
+    await jopae_tg_bot.bot.session.close()
+    get_database().close()
+    return {
+        "fired_at": fired_at,
+        "duration": duration,
+        "prewarm_duration": prewarm_duration,
+        "cells": len(cells),
+        "deliveries": stats,
+        "pruned": args.subscribers - remaining,
+        "report_cache": report_cache.stats(),
+        "http": get_http_stats(),
+        "trace_files": sorted(
+            os.path.abspath(os.path.join(tracer.directory, name)) for name in os.listdir(tracer.directory)
+        ) if args.trace else [],
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    for name in ("output", "record", "replay"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    config = {field.name: getattr(args, field.name) for field in fields(FakeConfig)}
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+
+    server = multiprocessing.get_context("spawn").Process(target=serve, args=("127.0.0.1", port, config), daemon=True)
+    server.start()
+    try:
+        wait_for(base + "/_stats")
+        os.chdir(tempfile.mkdtemp(prefix="jopae-bench-"))
+        os.environ.update({
+            "JOPAE_BOT": "123456:benchmark",
+            "TELEGRAM_API_URL": base,
+            "OPEN_WEATHER_HOST": base,
+            "AMBEE_HOST": base,
+            "NOAA_BASE": base + "/products/",
+            "OPEN_WEATHER": "benchmark",
+            "AMBEE": "benchmark",
+            "LAT": "55.75",
+            "LON": "37.62",
+            "TIMEZONE": "UTC",
+        })
+        if args.record or args.replay:
+            os.environ.update({
+                "HTTP_MODE": "record" if args.record else "replay",
+                "HTTP_ARCHIVE": args.record or args.replay,
+                "HTTP_REPLAY_LATENCY": "1" if args.replay_latency else "0",
+            })
+        run = asyncio.run(run_broadcast(args))
+        with urllib.request.urlopen(base + "/_stats") as response:
+            fakes = json.load(response)
+    finally:
+        server.terminate()
+        server.join()
+
+    lags = [at - run["fired_at"] for at in fakes["delivered"].values()]
+    delivered = len(lags)
+    calls = fakes["calls"]
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "record", "replay")},
+        "delivered": delivered,
+        "deliveries": run["deliveries"],
+        "pruned": run["pruned"],
+        "duration_s": round(run["duration"], 3),
+        "prewarm_s": round(run["prewarm_duration"], 3),
+        "throughput_msg_s": round(delivered / run["duration"], 1) if run["duration"] else None,
+        "lag_p50_s": percentile(lags, 0.50),
+        "lag_p99_s": percentile(lags, 0.99),
+        "lag_max_s": max(lags, default=None),
+        "upstream_calls": {name: count for name, count in calls.items() if not name.startswith("telegram.")},
+        "telegram_calls": {name: count for name, count in calls.items() if name.startswith("telegram.")},
+        "chart_uploads": fakes["uploads"],
+        "cells": run["cells"],
+        "report_cache": run["report_cache"],
+        "http": run["http"],
+        "trace_files": run["trace_files"],
+        # ru_maxrss в Linux - килобайты
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    for key in ("lag_p50_s", "lag_p99_s", "lag_max_s"):
+        if results[key] is not None:
+            results[key] = round(results[key], 3)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
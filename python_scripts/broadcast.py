@@ -0,0 +1,475 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
+
+from aiohttp import ClientError
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramMigrateToChat,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError
+)
+
+from python_scripts.delivery_schedule import slot_of, SLOT_SECONDS
+from python_scripts.metrics import (
+    TELEGRAM_SENDS,
+    TELEGRAM_SEND_LATENCY,
+    BROADCAST_DURATION,
+    BROADCAST_IN_FLIGHT,
+    BROADCAST_RETRY_QUEUE
+)
+from python_scripts.tracing import span
+from python_scripts.subscriptions import (
+    Partition,
+    mark_deliveries,
+    remove_subscribers,
+    materialize_due_deliveries,
+    get_delivery_stats,
+    get_cells_due_between
+)
+from python_scripts.config.types import BroadcastResult, Subscriber
+from python_scripts.config.consts import (
+    BROADCAST_GLOBAL_RATE,
+    BROADCAST_PER_CHAT_RATE,
+    BROADCAST_PER_CHAT_BUCKETS,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_MAX_ATTEMPTS,
+    BROADCAST_PROGRESS_EVERY,
+    DELIVERY_PENDING,
+    DELIVERY_SENT,
+    DELIVERY_FAILED,
+    DELIVERY_COMMIT_BATCH,
+    DELIVERY_COMMIT_INTERVAL,
+    BROADCAST_RETRY_BACKOFF,
+    PREWARM_LEAD,
+    PREWARM_LOG_SIZE
+)
+
+# Классы ошибок отправки в Telegram
+SEND_DEAD = "dead"                  # чат больше недоступен (бот заблокирован, чат удалён): подписчик удаляется
+SEND_RATE_LIMITED = "rate_limited"  # 429: вся рассылка ставится на паузу, доставка повторяется
+SEND_TRANSIENT = "transient"        # сеть или 5xx: доставка повторяется
+SEND_FAILED = "failed"              # прочие ошибки: сообщение не будет доставлено, но чат жив
+
+# Ответы 400 Bad Request, означающие, что чата больше нет
+DEAD_CHAT_MESSAGES = (
+    "chat not found",
+    "user not found",
+    "peer_id_invalid",
+    "group chat was deactivated",
+)
+
+# Счётчики исходов отправки, полученные заранее: метки не разбираются на каждое сообщение
+_OUTCOMES = {
+    outcome: TELEGRAM_SENDS.labels(outcome)
+    for outcome in (DELIVERY_SENT, SEND_DEAD, SEND_RATE_LIMITED, SEND_TRANSIENT, SEND_FAILED)
+}
+
+
+def classify_send_error(error: BaseException) -> str:
+    """
+    Определяет класс ошибки отправки сообщения.
+    Args:
+        error: исключение, выброшенное при отправке
+    Returns:
+        str: SEND_DEAD, SEND_RATE_LIMITED, SEND_TRANSIENT или SEND_FAILED
+    """
+    if isinstance(error, TelegramRetryAfter):
+        return SEND_RATE_LIMITED
+    # Группа, ставшая супергруппой, получает новый chat_id и должна подписаться заново
+    if isinstance(error, (TelegramForbiddenError, TelegramMigrateToChat)):
+        return SEND_DEAD
+    if isinstance(error, TelegramBadRequest) and any(text in error.message.lower() for text in DEAD_CHAT_MESSAGES):
+        return SEND_DEAD
+    if isinstance(error, (TelegramNetworkError, TelegramServerError, ClientError, asyncio.TimeoutError)):
+        return SEND_TRANSIENT
+    return SEND_FAILED
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: не более rate операций в секунду с запасом capacity.
+    Поддерживает принудительную паузу (например, по retry_after от Telegram).
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Ждёт, пока в ведре появится токен, и забирает его."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def set_rate(self, rate: float) -> None:
+        """Меняет скорость выдачи; ёмкость становится max(1, rate), лишний запас отбрасывается."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self._tokens = min(self._tokens, self.capacity)
+
+    def pause(self, seconds: float) -> None:
+        """Запрещает выдачу токенов на seconds секунд и обнуляет накопленный запас."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class DeliveryOutbox:
+    """
+    Буфер статусов доставки.
+    Статусы фиксируются в журнале 'deliveries' пачками: когда набралось batch_size записей
+    или с предыдущей фиксации прошло больше interval секунд. После перезапуска
+    повторно отправляются не более чем незафиксированные статусы последней пачки.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = DELIVERY_COMMIT_BATCH,
+        interval: float = DELIVERY_COMMIT_INTERVAL,
+    ) -> None:
+        self.batch_size = batch_size
+        self.interval = interval
+        self._buffer: list[tuple[int, str, str]] = []
+        self._flushed_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def record(self, subscriber: Subscriber, status: str) -> None:
+        """Добавляет статус доставки подписчику в буфер и при необходимости фиксирует пачку."""
+        self._buffer.append((subscriber.chat_id, subscriber.delivery_date, status))
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._flushed_at >= self.interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Фиксирует накопленные статусы одной транзакцией вне event loop."""
+        async with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._flushed_at = time.monotonic()
+            if batch:
+                await asyncio.to_thread(mark_deliveries, batch)
+
+
+class TimingWheel:
+    """
+    Колесо доставки с шагом в одну минуту.
+    Слоты колеса хранятся в индексированной колонке subscribers.next_delivery_utc:
+    каждый тик переносит в журнал доставки только подписчиков, чей слот наступил,
+    и отправляет им сообщения пачкой. Накладные расходы тика пропорциональны числу
+    подписчиков к отправке, а не общему числу подписчиков.
+    Под блокировкой выполняется только перенос в журнал; рассылка по дате идёт фоновой задачей,
+    поэтому долгая рассылка не задерживает следующие тики. По одной дате одновременно идёт
+    не больше одной рассылки: если за время рассылки по дате появились новые доставки,
+    после её окончания запускается ещё один проход.
+    Кроме того, каждый тик заранее, за lead секунд, прогревает отчёты для ячеек слота,
+    который наступит через lead, чтобы в момент отправки оставались только запросы к Telegram.
+    """
+
+    def __init__(
+        self,
+        fire: Callable[[str], Awaitable[object]],
+        prewarm: Callable[[list[str | None]], Awaitable[object]] | None = None,
+        lead: float = PREWARM_LEAD,
+    ) -> None:
+        """
+        Args:
+            fire: корутина, отправляющая все ожидающие доставки за местную дату
+            prewarm: корутина, собирающая отчёты для списка географических ячеек
+            lead: за сколько секунд до слота запускать прогрев
+        """
+        self.fire = fire
+        self.prewarm = prewarm
+        self.lead = lead
+        # Статистика прогрева по слотам: сколько ячеек были готовы к отправке, а сколько собирались с опозданием
+        self.warmth: deque[dict] = deque(maxlen=PREWARM_LOG_SIZE)
+        self._prewarm_tasks: set[asyncio.Task] = set()
+        self._fire_tasks: dict[str, asyncio.Task] = {}
+        self._fire_again: set[str] = set()
+        self._lock = asyncio.Lock()
+
+    async def tick(self, now: float | None = None) -> None:
+        """
+        Переносит в журнал все наступившие слоты и запускает в фоне рассылку по их датам.
+        Если предыдущий тик ещё переносит доставки, тик пропускается: просроченные слоты заберёт следующий.
+        Args:
+            now: текущее UNIX-время; по умолчанию - системное время
+        """
+        now = time.time() if now is None else now
+        if self.prewarm is not None:
+            self.start_prewarm(slot_of(now) + self.lead)
+
+        if self._lock.locked():
+            return
+        async with self._lock:
+            dates = await asyncio.to_thread(materialize_due_deliveries, slot_of(now))
+        for delivery_date in sorted(dates):
+            self.start_fire(delivery_date)
+
+    def start_fire(self, delivery_date: str) -> asyncio.Task:
+        """
+        Запускает в фоне рассылку ожидающих доставок за дату. Если рассылка по этой дате уже идёт,
+        новая не запускается, а текущая после окончания пройдёт по журналу ещё раз.
+        Args:
+            delivery_date: местная дата доставки
+        Returns:
+            asyncio.Task: задача рассылки по дате
+        """
+        task = self._fire_tasks.get(delivery_date)
+        if task is not None:
+            self._fire_again.add(delivery_date)
+            return task
+
+        async def run() -> None:
+            while True:
+                self._fire_again.discard(delivery_date)
+                try:
+                    await self.fire(delivery_date)
+                except Exception as e:
+                    print(f"Delivery for {delivery_date} failed: {e}")
+                if delivery_date not in self._fire_again:
+                    return
+
+        task = asyncio.create_task(run())
+        self._fire_tasks[delivery_date] = task
+        task.add_done_callback(lambda _: self._fire_tasks.pop(delivery_date, None))
+        return task
+
+    async def wait_fired(self) -> None:
+        """Ждёт окончания всех запущенных рассылок (например, в тестах и нагрузочном тесте)."""
+        while self._fire_tasks:
+            await asyncio.gather(*self._fire_tasks.values(), return_exceptions=True)
+
+    def record_warmth(self, delivery_date: str, warm: int, late: int) -> None:
+        """
+        Запоминает, сколько ячеек слота были прогреты заранее, а сколько пришлось собирать при отправке.
+        Args:
+            delivery_date: местная дата доставки
+            warm: число ячеек с готовым отчётом
+            late: число ячеек, отчёт для которых собирался в момент отправки
+        """
+        self.warmth.append({"slot": slot_of(time.time()), "delivery_date": delivery_date, "warm": warm, "late": late})
+        if late:
+            print(f"Slot {delivery_date}: {warm} locations prewarmed, {late} fetched late.")
+
+    def start_prewarm(self, slot: int, partitions: Iterable[Partition] | None = None) -> None:
+        """
+        Запускает в фоне прогрев отчётов для ячеек подписчиков, чья доставка приходится на слот.
+        Args:
+            slot: начало слота, UNIX-время
+            partitions: необязательные разделы (k, i) - только ячейки их подписчиков
+        """
+        async def run() -> None:
+            try:
+                cells = await get_cells_due_between(slot - SLOT_SECONDS, slot, partitions)
+                if cells:
+                    await self.prewarm(cells)
+            except Exception as e:
+                print(f"Prewarm for slot {slot} failed: {e}")
+
+        task = asyncio.create_task(run())
+        # Ссылка на задачу нужна, чтобы её не собрал сборщик мусора до завершения
+        self._prewarm_tasks.add(task)
+        task.add_done_callback(self._prewarm_tasks.discard)
+
+    async def resume(self, delivery_dates: Iterable[str]) -> None:
+        """
+        Досылает доставки, прерванные перезапуском.
+        Args:
+            delivery_dates: местные даты, за которые могут остаться записи в статусе pending
+        """
+        for delivery_date in sorted(delivery_dates):
+            stats = await asyncio.to_thread(get_delivery_stats, delivery_date)
+            if stats[DELIVERY_PENDING]:
+                print(f"Resuming deliveries for {delivery_date}: {stats[DELIVERY_PENDING]} messages pending.")
+                await self.start_fire(delivery_date)
+
+
+class BroadcastDispatcher:
+    """
+    Рассылает сообщения по списку чатов с глобальным и поканальным ограничением скорости.
+    Ошибки отправки классифицируются (classify_send_error):
+        - ответ 429 (TelegramRetryAfter) приостанавливает всю рассылку на retry_after секунд;
+        - после 429 и временных ошибок (сеть, 5xx) чат ставится в очередь повторов, которая
+          рассылается после основного прохода с нарастающей паузой, не занимая воркеров ожиданием;
+        - недоступные навсегда чаты (бот заблокирован, чат не найден) собираются и в конце
+          рассылки удаляются из подписчиков одной транзакцией.
+    Лимит Telegram действует на бота целиком, поэтому одновременные рассылки (разные даты
+    доставки, разделы) должны получать одно общее ведро global_bucket; без него у рассылки своё ведро.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Subscriber], Awaitable[object]],
+        global_rate: float = BROADCAST_GLOBAL_RATE,
+        per_chat_rate: float = BROADCAST_PER_CHAT_RATE,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        max_attempts: int = BROADCAST_MAX_ATTEMPTS,
+        progress_every: int = BROADCAST_PROGRESS_EVERY,
+        outbox: DeliveryOutbox | None = None,
+        retry_backoff: float = BROADCAST_RETRY_BACKOFF,
+        prune_dead: bool = True,
+        per_chat_buckets: int = BROADCAST_PER_CHAT_BUCKETS,
+        global_bucket: TokenBucket | None = None,
+    ) -> None:
+        self.send = send
+        self.outbox = outbox
+        self.per_chat_rate = per_chat_rate
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.progress_every = progress_every
+        self.retry_backoff = retry_backoff
+        self.prune_dead = prune_dead
+        self.per_chat_buckets = per_chat_buckets
+        self._global = global_bucket if global_bucket is not None else TokenBucket(global_rate)
+        # Вёдра чатов живут всю рассылку, чтобы повторы в тот же чат шли не чаще per_chat_rate;
+        # хранятся последние per_chat_buckets чатов
+        self._per_chat: OrderedDict[int, TokenBucket] = OrderedDict()
+        self._retry: list[Subscriber] = []
+        self._dead: list[int] = []
+        self._result = BroadcastResult()
+        self._started = 0.0
+        self._next_progress = progress_every
+
+    async def run(self, recipients: Iterable[Subscriber] | AsyncIterable[Subscriber]) -> BroadcastResult:
+        """
+        Выполняет рассылку.
+        Args:
+            recipients: получатели; асинхронный итератор читается по мере отправки,
+                поэтому весь список получателей не держится в памяти
+        Returns:
+            BroadcastResult: итоги рассылки, включая её длительность
+        """
+        self._result = BroadcastResult()
+        self._started = time.monotonic()
+        self._next_progress = self.progress_every
+        self._retry, self._dead = [], []
+
+        try:
+            await self._run_pass(recipients, attempt=1)
+            for attempt in range(2, self.max_attempts + 1):
+                if not self._retry:
+                    break
+                retry, self._retry = self._retry, []
+                self._result.retried += len(retry)
+                BROADCAST_RETRY_QUEUE.dec(len(retry))
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 2))
+                await self._run_pass(retry, attempt)
+        finally:
+            BROADCAST_RETRY_QUEUE.dec(len(self._retry))
+            if self.outbox is not None:
+                await self.outbox.flush()
+            if self._dead and self.prune_dead:
+                self._result.pruned = await asyncio.to_thread(remove_subscribers, self._dead)
+
+        self._result.duration = time.monotonic() - self._started
+        BROADCAST_DURATION.observe(self._result.duration)
+        print(
+            f"Broadcast finished: {self._result.sent}/{self._result.total} sent, "
+            f"{self._result.failed} failed, {self._result.retried} retries, "
+            f"{self._result.pruned} dead chats pruned in {self._result.duration:.1f}s"
+        )
+        return self._result
+
+    async def _run_pass(self, recipients: Iterable[Subscriber] | AsyncIterable[Subscriber], attempt: int) -> None:
+        iterator = _as_async_iterator(recipients)
+        # Асинхронный генератор нельзя продвигать из нескольких корутин одновременно
+        iterator_lock = asyncio.Lock()
+
+        async def worker() -> None:
+            while True:
+                async with iterator_lock:
+                    try:
+                        subscriber = await anext(iterator)
+                    except StopAsyncIteration:
+                        return
+                await self._deliver(subscriber, attempt)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def _deliver(self, subscriber: Subscriber, attempt: int) -> None:
+        chat_id = subscriber.chat_id
+        if attempt == 1:
+            self._result.total += 1
+        chat_bucket = self._chat_bucket(chat_id)
+        try:
+            await chat_bucket.acquire()
+            await self._global.acquire()
+            started = time.perf_counter()
+            try:
+                BROADCAST_IN_FLIGHT.inc()
+                try:
+                    with span("send", chat_id=chat_id, attempt=attempt):
+                        await self.send(subscriber)
+                finally:
+                    BROADCAST_IN_FLIGHT.dec()
+            except Exception as e:
+                kind = classify_send_error(e)
+                _OUTCOMES[kind].inc()
+                if kind == SEND_RATE_LIMITED:
+                    self._global.pause(e.retry_after)
+                if kind in (SEND_RATE_LIMITED, SEND_TRANSIENT) and attempt < self.max_attempts:
+                    self._retry.append(subscriber)
+                    BROADCAST_RETRY_QUEUE.inc()
+                    return
+                if kind == SEND_DEAD:
+                    self._dead.append(chat_id)
+                print(f"Error sending message to chat {chat_id} ({kind}): {e}")
+                self._result.failed += 1
+                await self._record(subscriber, DELIVERY_FAILED)
+            else:
+                _OUTCOMES[DELIVERY_SENT].inc()
+                TELEGRAM_SEND_LATENCY.observe(time.perf_counter() - started)
+                self._result.sent += 1
+                await self._record(subscriber, DELIVERY_SENT)
+        finally:
+            self._report_progress()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._per_chat.get(chat_id)
+        if bucket is None:
+            bucket = self._per_chat[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+            if len(self._per_chat) > self.per_chat_buckets:
+                self._per_chat.popitem(last=False)
+        else:
+            self._per_chat.move_to_end(chat_id)
+        return bucket
+
+    async def _record(self, subscriber: Subscriber, status: str) -> None:
+        if self.outbox is not None:
+            await self.outbox.record(subscriber, status)
+
+    def _report_progress(self) -> None:
+        # Повторы не меняют done, поэтому строка печатается только при переходе через очередную границу
+        done = self._result.sent + self._result.failed
+        if self.progress_every and done >= self._next_progress:
+            self._next_progress = (done // self.progress_every + 1) * self.progress_every
+            elapsed = time.monotonic() - self._started
+            print(f"Broadcast progress: {done} processed in {elapsed:.1f}s")
+
+
+def _as_async_iterator(recipients: Iterable[Subscriber] | AsyncIterable[Subscriber]) -> AsyncIterator[Subscriber]:
+    if isinstance(recipients, AsyncIterable):
+        return aiter(recipients)
+
+    async def wrap() -> AsyncIterator[Subscriber]:
+        for subscriber in recipients:
+            yield subscriber
+
+    return wrap()
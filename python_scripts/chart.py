@@ -0,0 +1,192 @@
+import struct
+import time
+import zlib
+from typing import Sequence
+
+from python_scripts.history import history
+from python_scripts.config.consts import (
+    PRESSURE_THRESHOLD,
+    SOLAR_FLARE_NO_EFFECT,
+    CHART_WIDTH,
+    CHART_PANEL_HEIGHT,
+    CHART_PADDING,
+    CHART_PRESSURE_WINDOW,
+    CHART_FLUX_DAYS
+)
+
+Color = tuple[int, int, int]
+
+BACKGROUND: Color = (255, 255, 255)
+FRAME: Color = (210, 210, 210)
+THRESHOLD: Color = (235, 120, 120)
+PRESSURE_LINE: Color = (40, 90, 200)
+FLUX_LINE: Color = (230, 140, 20)
+# Цвет столбца прогноза по уровню шкалы G: 0, 1, 2, 3, 4-5
+G_SCALE_COLORS: tuple[Color, ...] = ((120, 190, 120), (240, 200, 60), (240, 150, 40), (220, 80, 50), (160, 30, 60))
+
+
+class Canvas:
+    """Простейший RGB-холст с выводом в PNG без сторонних библиотек (только zlib и struct)."""
+
+    def __init__(self, width: int, height: int, background: Color = BACKGROUND) -> None:
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def point(self, x: int, y: int, color: Color) -> None:
+        if 0 <= x < self.width and 0 <= y < self.height:
+            offset = (y * self.width + x) * 3
+            self.pixels[offset:offset + 3] = bytes(color)
+
+    def rect(self, x0: int, y0: int, x1: int, y1: int, color: Color) -> None:
+        """Закрашивает прямоугольник [x0, x1] x [y0, y1]."""
+        x0, x1 = max(min(x0, x1), 0), min(max(x0, x1), self.width - 1)
+        row = bytes(color) * (x1 - x0 + 1)
+        for y in range(max(min(y0, y1), 0), min(max(y0, y1), self.height - 1) + 1):
+            offset = (y * self.width + x0) * 3
+            self.pixels[offset:offset + len(row)] = row
+
+    def frame(self, x0: int, y0: int, x1: int, y1: int, color: Color) -> None:
+        for x0_, y0_, x1_, y1_ in ((x0, y0, x1, y0), (x0, y1, x1, y1), (x0, y0, x0, y1), (x1, y0, x1, y1)):
+            self.rect(x0_, y0_, x1_, y1_, color)
+
+    def line(self, x0: int, y0: int, x1: int, y1: int, color: Color, dash: int = 0) -> None:
+        """Отрезок по алгоритму Брезенхэма; dash > 0 - пунктир с таким шагом."""
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+        error, step = dx + dy, 0
+        while True:
+            if not dash or (step // dash) % 2 == 0:
+                self.point(x0, y0, color)
+            if x0 == x1 and y0 == y1:
+                return
+            step += 1
+            doubled = 2 * error
+            if doubled >= dy:
+                error += dy
+                x0 += sx
+            if doubled <= dx:
+                error += dx
+                y0 += sy
+
+    def png(self) -> bytes:
+        """Кодирует холст в PNG (8 бит на канал, RGB, без фильтрации строк)."""
+        stride = self.width * 3
+        raw = b"".join(
+            b"\x00" + bytes(self.pixels[y * stride:(y + 1) * stride]) for y in range(self.height)
+        )
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return b"\x89PNG\r\n\x1a\n" + b"".join((
+            _chunk(b"IHDR", header),
+            _chunk(b"IDAT", zlib.compress(raw, 9)),
+            _chunk(b"IEND", b""),
+        ))
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def plot_series(
+    canvas: Canvas,
+    top: int,
+    times: Sequence[float],
+    values: Sequence[float],
+    color: Color,
+    threshold: float | None = None,
+) -> None:
+    """
+    Рисует ряд наблюдений ломаной в панели, начинающейся со строки top; масштаб по данным и порогу.
+    Args:
+        canvas: холст
+        top: верхняя строка панели
+        times, values: моменты времени и значения ряда
+        color: цвет линии
+        threshold: необязательный порог, рисуемый пунктиром
+    """
+    left, right = CHART_PADDING, canvas.width - CHART_PADDING - 1
+    upper, lower = top + CHART_PADDING, top + CHART_PANEL_HEIGHT - CHART_PADDING - 1
+    canvas.frame(left, upper, right, lower, FRAME)
+    if not values:
+        return
+
+    low, high = min(values), max(values)
+    if threshold is not None:
+        low, high = min(low, threshold), max(high, threshold)
+    margin = (high - low) * 0.1 or 1
+    low, high = low - margin, high + margin
+    start, span = times[0], (times[-1] - times[0]) or 1
+
+    def x_of(t: float) -> int:
+        return left + 1 + round((t - start) / span * (right - left - 2))
+
+    def y_of(value: float) -> int:
+        return lower - 1 - round((value - low) / (high - low) * (lower - upper - 2))
+
+    if threshold is not None:
+        canvas.line(left + 1, y_of(threshold), right - 1, y_of(threshold), THRESHOLD, dash=4)
+    points = [(x_of(t), y_of(v)) for t, v in zip(times, values)]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        canvas.line(x0, y0, x1, y1, color)
+    for x, y in points:
+        canvas.rect(x - 1, y - 1, x + 1, y + 1, color)
+
+
+def plot_g_forecast(canvas: Canvas, top: int, forecast: Sequence[int | None]) -> None:
+    """
+    Рисует прогноз шкалы G по дням столбцами высотой в уровень шкалы (0-5).
+    Args:
+        canvas: холст
+        top: верхняя строка панели
+        forecast: уровни шкалы G по дням; None - прогноза нет
+    """
+    left, right = CHART_PADDING, canvas.width - CHART_PADDING - 1
+    upper, lower = top + CHART_PADDING, top + CHART_PANEL_HEIGHT - CHART_PADDING - 1
+    canvas.frame(left, upper, right, lower, FRAME)
+    if not forecast:
+        return
+
+    slot = (right - left) // len(forecast)
+    for i, scale in enumerate(forecast):
+        if scale is None:
+            continue
+        height = round((lower - upper - 2) * (max(scale, 0) + 0.5) / 5.5)
+        x0 = left + i * slot + slot // 4
+        canvas.rect(x0, lower - 1 - height, x0 + slot // 2, lower - 1, G_SCALE_COLORS[min(scale, 4)])
+
+
+def render_chart(
+    pressure: tuple[Sequence[float], Sequence[float]],
+    flux: tuple[Sequence[float], Sequence[float]],
+    g_forecast: Sequence[int | None],
+) -> bytes:
+    """
+    Рисует картинку из трёх панелей: давление, поток радиоизлучения Солнца 10.7 см и прогноз шкалы G.
+    Args:
+        pressure: моменты времени и значения давления, мм.рт.ст.
+        flux: моменты времени и значения потока, SFU
+        g_forecast: уровни шкалы G по дням
+    Returns:
+        bytes: PNG
+    """
+    canvas = Canvas(CHART_WIDTH, CHART_PANEL_HEIGHT * 3)
+    plot_series(canvas, 0, *pressure, PRESSURE_LINE, threshold=PRESSURE_THRESHOLD)
+    plot_series(canvas, CHART_PANEL_HEIGHT, *flux, FLUX_LINE, threshold=SOLAR_FLARE_NO_EFFECT)
+    plot_g_forecast(canvas, CHART_PANEL_HEIGHT * 2, g_forecast)
+    return canvas.png()
+
+
+def render_daily_chart(location: str, g_forecast: Sequence[int | None], now: float | None = None) -> bytes:
+    """
+    Рисует утренний график для места по локальной истории наблюдений, без обращения к сети.
+    Args:
+        location: место наблюдения давления (ключ ряда в истории)
+        g_forecast: уровни шкалы G по дням из прогноза NOAA
+        now: текущее UNIX-время
+    Returns:
+        bytes: PNG
+    """
+    now = time.time() if now is None else now
+    pressure = history.window("pressure", location, now - CHART_PRESSURE_WINDOW, now)
+    flux = history.last("flux", "global", CHART_FLUX_DAYS)
+    return render_chart(pressure, flux, g_forecast)
@@ -0,0 +1,72 @@
+import time
+
+from python_scripts.config.consts import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+    BREAKER_MAX_RESET_TIMEOUT
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для одного источника данных.
+    После failure_threshold неудач подряд размыкается, и запросы к источнику не выполняются.
+    По истечении паузы пропускает одну пробу (полуоткрытое состояние): удачная проба
+    замыкает выключатель, неудачная снова размыкает его с удвоенной паузой.
+    Рассчитан на использование из одного event loop.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        max_reset_timeout: float = BREAKER_MAX_RESET_TIMEOUT,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._current_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """
+        Решает, можно ли сейчас обращаться к источнику.
+        Returns:
+            bool: True, если запрос разрешён (в том числе как проба)
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self._current_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Отмечает удачный запрос и замыкает выключатель."""
+        self.state = CLOSED
+        self.failures = 0
+        self._current_timeout = self.reset_timeout
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Отмечает неудачный запрос и при необходимости размыкает выключатель."""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self._current_timeout = min(self._current_timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
@@ -5,6 +5,12 @@ PRESSURE_THRESHOLD = 740
 HPA_TO_MMHG_COEFF = 0.75006
 PRESSURE_ROUND_PRECISION = 2
 
+# Тренды по истории наблюдений
+PRESSURE_DROP_ALERT = 8          # падение давления за сутки, мм.рт.ст., считающееся резким
+PRESSURE_TREND_WINDOW = 24 * 3600  # окно сравнения давления, секунды
+PRESSURE_TREND_TOLERANCE = 6 * 3600  # допустимое отклонение момента сравнения от начала окна, секунды
+FLUX_RISING_DAYS = 3             # столько дней подряд роста потока считается трендом
+
 # Константы для направления ветра
 WIND_SECTOR_COUNT = 8
 WIND_SECTOR_DEG = 360 // WIND_SECTOR_COUNT
@@ -20,15 +26,167 @@ G_SCALE_MODERATE = "2"
 G_SCALE_STRONG = "3"
 G_SCALE_POWERFUL = {"4", "5"}
 
+# Пороги отвала жопы по умолчанию; подписчик может задать свои (/sensitivity)
+DEFAULT_G_SCALE_THRESHOLD = 1    # буря от этого уровня шкалы G
+THRESHOLD_LIMITS = {             # допустимые значения пользовательских порогов
+    "pressure": (700, 800),
+    "flux": (50, 400),
+    "g": (1, 5),
+}
+
+# Биты вердикта: по какой причине у подписчика отвалится жопа
+VERDICT_WEATHER = 1
+VERDICT_POLLEN = 2
+VERDICT_SOLAR = 4
+VERDICT_GEOMAGNETIC = 8
+VERDICT_ALL = VERDICT_WEATHER | VERDICT_POLLEN | VERDICT_SOLAR | VERDICT_GEOMAGNETIC
+
+# Секции сообщения (/settings) обозначаются теми же битами, что и причины вердикта
+SECTION_BITS = {
+    "weather": VERDICT_WEATHER,
+    "pollen": VERDICT_POLLEN,
+    "solar": VERDICT_SOLAR,
+    "geomagnetic": VERDICT_GEOMAGNETIC,
+}
+DEFAULT_SECTIONS = VERDICT_WEATHER | VERDICT_SOLAR | VERDICT_GEOMAGNETIC  # пыльца по умолчанию выключена
+
+# Размер географической ячейки, градусы: подписчики одной ячейки получают общий прогноз
+GEO_CELL_DEG = 0.25
+# Сколько ячеек прогревать одновременно перед рассылкой
+PREWARM_CONCURRENCY = 8
+# За сколько секунд до слота доставки заранее собирать отчёты (должно быть меньше REPORT_CACHE_TTL)
+PREWARM_LEAD = 10 * 60
+# Сколько последних слотов хранить в статистике прогрева
+PREWARM_LOG_SIZE = 24 * 60
+
+# Каталог локальной истории наблюдений
+HISTORY_DIR = "history"
+
+# Утренний график: давление, поток 10.7 см и прогноз шкалы G
+CHART_WIDTH = 480
+CHART_PANEL_HEIGHT = 110          # высота каждой из трёх панелей, пиксели
+CHART_PADDING = 8
+CHART_PRESSURE_WINDOW = 3 * 24 * 3600  # сколько истории давления показывать, секунды
+CHART_FLUX_DAYS = 30              # сколько дней потока показывать
+CHART_FILE_TTL = 24 * 60 * 60     # сколько хранить file_id загруженного в Telegram графика, секунды
+CHART_UPLOAD_ATTEMPTS = 2         # попыток получить file_id, если загрузка в чужой чат не удалась
+CHART_FILENAME = "jopae.png"
+CHART_TEXT_SENT_SIZE = 10000      # сколько чатов помнить, что длинный текст ушёл, а график ещё нет
+TELEGRAM_CAPTION_LIMIT = 1024     # длиннее подписи к фото текст уходит отдельным сообщением
+
+# Режим webhook: встроенный HTTP-сервер и очередь обновлений
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8080
+WEBHOOK_QUEUE_SIZE = 1000        # обновлений в очереди; при переполнении Telegram получает 503 и повторит позже
+WEBHOOK_WORKERS = 16             # одновременно обрабатываемых обновлений
+WEBHOOK_DRAIN_TIMEOUT = 10       # сколько дообрабатывать очередь при остановке, секунды
+
+# Метрики в формате Prometheus; воркеры рассылки слушают следующие порты (METRICS_PORT + 1 + номер)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108              # 0 - не запускать сервер метрик
+METRICS_PATH = "/metrics"
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15)  # секунды
+METRICS_RENDER_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+METRICS_BROADCAST_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# Трассировка рассылок по требованию (файлы Chrome trace и свёрнутые стеки профиля CPU)
+TRACE_DIR = "traces"
+TRACE_MAX_EVENTS = 500_000       # событий в одной трассировке; лишние отбрасываются, чтобы не съесть память
+TRACE_PROFILE_INTERVAL = 0.005   # период выборки стеков профилировщиком, секунды
+
 # Сообщения
 GREETINGS = "Привет! Подписка на утренние сообщения об отвале жопы оформлена ☀️"
 
 DB_PATH = "subscriptions.db"
+DB_COMMIT_WINDOW = 0.005  # сколько ждать попутных записей для общей транзакции, секунды
+DB_MAX_BATCH = 500        # максимум операций записи в одной транзакции
+DB_BUSY_TIMEOUT = 5000    # ожидание блокировки базы, миллисекунды
+DB_PAGE_SIZE = 1000       # строк на страницу при потоковом чтении подписчиков
+
+# Время жизни закэшированного утреннего отчёта, секунды
+REPORT_CACHE_TTL = 15 * 60
+
+# Отчёт по запросу (/test, /report)
+ON_DEMAND_COOLDOWN = 60          # не чаще одного запроса в столько секунд на чат
+ON_DEMAND_COOLDOWN_SIZE = 10000  # сколько чатов помнить для ограничения частоты
+ON_DEMAND_BUDGET = 3             # за сколько секунд ответить пользователю, даже если отчёт ещё собирается
+
+# Дедлайны получения данных, секунды: на один источник и на весь отчёт целиком
+SOURCE_TIMEOUT = 10
+REPORT_TIMEOUT = 15
+
+# Параметры HTTP-клиента для внешних API
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 5
+HTTP_MAX_RETRIES = 2             # повторов после первой попытки
+HTTP_BACKOFF_BASE = 0.5          # базовая пауза перед повтором, секунды
+HTTP_BACKOFF_MAX = 4             # максимальная пауза перед повтором, секунды
+HTTP_RETRY_BUDGET = 9            # на все попытки запроса вместе с паузами, секунды; меньше SOURCE_TIMEOUT
+HTTP_PER_HOST_LIMIT = 4          # одновременных запросов к одному хосту
+HTTP_POOL_SIZE = 10              # keep-alive соединений на хост
+HTTP_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Дисковый кэш ответов внешних API с условными запросами (ETag / Last-Modified)
+HTTP_CACHE_DIR = "http_cache"
+# Сколько секунд ответ источника считается свежим и отдаётся без обращения к API
+HTTP_CACHE_FRESHNESS = {
+    "weather": 10 * 60,
+    "solar_flare": 60 * 60,
+    "geomagnetic": 15 * 60,
+}
+# До этого возраста устаревший ответ источника отдаётся сразу, а обновляется в фоне; более старый
+# перепроверяется синхронно. Погода меняется быстро, поэтому её устаревший ответ живёт минуты
+HTTP_CACHE_STALE_MAX = {
+    "weather": 30 * 60,
+    "solar_flare": 24 * 60 * 60,
+    "geomagnetic": 3 * 60 * 60,
+}
+
+# Архив ответов внешних API для режимов записи и воспроизведения (HTTP_MODE=record|replay)
+HTTP_ARCHIVE_PATH = "http_archive.jsonl.gz"
+HTTP_ARCHIVE_SECRET_PARAMS = {"appid"}  # параметры запроса (ключи API), которые не попадают в архив
+
+# Автоматический выключатель (circuit breaker) источников данных
+BREAKER_FAILURE_THRESHOLD = 3        # подряд неудачных запросов до размыкания
+BREAKER_RESET_TIMEOUT = 60           # пауза до первой пробы разомкнутого источника, секунды
+BREAKER_MAX_RESET_TIMEOUT = 30 * 60  # предел паузы при повторно неудачных пробах, секунды
+FALLBACK_MAX_AGE = 24 * 60 * 60      # последние удачные данные старше этого не используются, секунды
+
+# Параметры рассылки
+BROADCAST_HOUR = 7
+BROADCAST_MINUTE = 0
+BROADCAST_GLOBAL_RATE = 25       # сообщений в секунду на бота (лимит Telegram ~30)
+BROADCAST_PER_CHAT_RATE = 1      # сообщений в секунду в один чат
+BROADCAST_PER_CHAT_BUCKETS = 10000  # сколько последних чатов помнить для ограничения скорости в чат
+BROADCAST_CONCURRENCY = 20       # одновременных запросов к Bot API
+BROADCAST_MAX_ATTEMPTS = 3       # попыток доставки одному чату
+BROADCAST_RETRY_BACKOFF = 2      # пауза перед первым повтором временных ошибок, удваивается с каждым проходом, секунды
+BROADCAST_PROGRESS_EVERY = 1000  # как часто печатать прогресс рассылки
+
+# Многопроцессная рассылка: аренды разделов и лидера в общей базе
+LEASE_TTL = 30                   # срок аренды; разделы упавшего воркера переходят к другим через столько секунд
+SHARD_POLL_INTERVAL = 5          # период продления аренд и проверки журнала доставки, секунды
+
+# Журнал доставки: статусы и частота фиксации в базе
+DELIVERY_PENDING = "pending"
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+DELIVERY_COMMIT_BATCH = 200      # статусов в одной транзакции
+DELIVERY_COMMIT_INTERVAL = 1.0   # максимальная задержка фиксации статуса, секунды
+DELIVERY_MAX_LATENESS = 3 * 3600 # доставки, просроченные сильнее (например, бот был выключен), пропускаются
 
 HELP_MESSAGE = (
-    "🤖 Бот присылает ежедневное утреннее сообщение в 7:00\n\n"
+    "🤖 Бот присылает ежедневное утреннее сообщение (по умолчанию в 7:00)\n\n"
     "Команды:\n"
     "/start — подписаться на рассылку\n"
     "/stop  — отписаться\n"
+    "/location <широта> <долгота> — указать своё местоположение (или отправьте геопозицию)\n"
+    "/time ЧЧ:ММ — время доставки\n"
+    "/timezone <пояс> — часовой пояс, например Europe/Moscow\n"
+    "/sensitivity pressure|flux|g <порог> — свой порог давления, солнечного потока или шкалы G "
+    "(/sensitivity reset — пороги по умолчанию)\n"
+    "/settings [weather|pollen|solar|geomagnetic] — показать или переключить секции сообщения\n"
+    "/report — получить сообщение прямо сейчас\n"
     "/help  — показать это сообщение"
 )
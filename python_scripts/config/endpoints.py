@@ -1,5 +1,10 @@
-OPEN_WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+from python_scripts.config.env import getenv
+
+# Адреса API можно переопределить в окружении, например чтобы направить запросы на локальные заглушки
+OPEN_WEATHER_HOST = getenv("OPEN_WEATHER_HOST", "https://api.openweathermap.org")
+OPEN_WEATHER_URL = OPEN_WEATHER_HOST+"/data/2.5/weather"
+AMBEE_HOST = getenv("AMBEE_HOST", "https://api.ambeedata.com")
 AMBEE_URL = "/latest/pollen/by-lat-lng?lat={lat}&lng={lon}"
-NOAA_BASE = "https://services.swpc.noaa.gov/products/"
+NOAA_BASE = getenv("NOAA_BASE", "https://services.swpc.noaa.gov/products/")
 X_RAY_URL = NOAA_BASE+"10cm-flux-30-day.json"
 GEOMAGNETIC_URL = NOAA_BASE+"noaa-scales.json"
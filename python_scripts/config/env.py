@@ -0,0 +1,17 @@
+import os
+from dotenv import load_dotenv
+
+# Файл .env читается один раз на процесс - при первом импорте этого модуля
+load_dotenv()
+
+
+def getenv(name: str, default: str | None = None) -> str | None:
+    """
+    Возвращает переменную окружения с учётом файла .env.
+    Args:
+        name: имя переменной
+        default: значение, если переменная не задана
+    Returns:
+        str | None: значение переменной или default
+    """
+    return os.getenv(name, default)
@@ -1,6 +1,51 @@
-from dataclasses import dataclass
+import math
+from dataclasses import dataclass, field
 
 @dataclass
 class JopaeReport:
     jopae: bool
     report: str
+
+
+@dataclass(frozen=True)
+class Subscriber:
+    chat_id: int
+    cell: str | None = None  # None - местоположение по умолчанию (LAT/LON из окружения)
+    delivery_date: str | None = None  # местная дата доставки, для которой чат стоит в журнале
+    delivery_time: str | None = None  # None - время доставки по умолчанию
+    tz: str | None = None  # None - часовой пояс бота
+    sections: int | None = None  # битовая маска секций сообщения; None - секции по умолчанию
+
+
+@dataclass
+class BroadcastResult:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    pruned: int = 0  # удалено недоступных чатов
+    duration: float = 0.0
+
+
+@dataclass
+class SourceStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+
+@dataclass(frozen=True)
+class ReportMetrics:
+    pressure: float = math.inf  # мм.рт.ст.; inf - данных нет, порог давления не срабатывает
+    flux: float = -math.inf  # поток 10 см, SFU; -inf - данных нет
+    g_scale: int = -1  # прогноз по шкале G; -1 - данных нет
+    fixed: int = 0  # биты вердикта, не зависящие от порогов подписчика
+
+
+@dataclass(frozen=True)
+class CellReport:
+    sections: tuple[str, ...]  # тексты секций в порядке сообщения, без строки вердикта
+    metrics: ReportMetrics
+    variants: dict[tuple[int, int], str] = field(default_factory=dict, compare=False, repr=False)  # (маска секций, вердикт) -> текст
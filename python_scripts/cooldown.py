@@ -0,0 +1,40 @@
+import time
+from collections import OrderedDict
+
+from python_scripts.config.consts import ON_DEMAND_COOLDOWN, ON_DEMAND_COOLDOWN_SIZE
+
+
+class ChatCooldown:
+    """
+    Ограничение частоты запросов по чатам: не чаще одного раза в interval секунд.
+    Время последних запросов хранится в OrderedDict в порядке использования, размер ограничен
+    max_size - при переполнении забывается чат, обращавшийся раньше всех, поэтому память
+    не растёт с числом пользователей.
+    """
+
+    def __init__(self, interval: float = ON_DEMAND_COOLDOWN, max_size: int = ON_DEMAND_COOLDOWN_SIZE) -> None:
+        self.interval = interval
+        self.max_size = max_size
+        self._last: OrderedDict[int, float] = OrderedDict()
+
+    def check(self, chat_id: int, now: float | None = None) -> float:
+        """
+        Проверяет, можно ли чату выполнить запрос, и если да - запоминает его.
+        Args:
+            chat_id: идентификатор чата Telegram
+            now: текущее монотонное время
+        Returns:
+            float: сколько секунд ещё ждать; 0 - запрос разрешён
+        """
+        now = time.monotonic() if now is None else now
+        last = self._last.get(chat_id)
+        if last is not None and now - last < self.interval:
+            return self.interval - (now - last)
+        self._last[chat_id] = now
+        self._last.move_to_end(chat_id)
+        while len(self._last) > self.max_size:
+            self._last.popitem(last=False)
+        return 0.0
+
+    def __len__(self) -> int:
+        return len(self._last)
@@ -0,0 +1,172 @@
+import asyncio
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, TypeVar
+
+from python_scripts.tracing import span
+from python_scripts.config.consts import DB_PATH, DB_COMMIT_WINDOW, DB_MAX_BATCH, DB_BUSY_TIMEOUT
+
+T = TypeVar("T")
+
+# Маркер остановки потока записи
+_STOP = object()
+
+
+class Database:
+    """
+    Долгоживущий доступ к SQLite в режиме WAL.
+    Чтение идёт через отдельное соединение и не блокируется записью.
+    Все записи выполняет один фоновый поток: операции, пришедшие в пределах
+    commit_window секунд, объединяются в одну транзакцию (group commit),
+    поэтому всплеск /start стоит одного fsync, а не сотни.
+    """
+
+    def __init__(
+        self,
+        path: str = DB_PATH,
+        commit_window: float = DB_COMMIT_WINDOW,
+        max_batch: int = DB_MAX_BATCH,
+    ) -> None:
+        self.path = path
+        self.commit_window = commit_window
+        self.max_batch = max_batch
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: транзакциями управляем явно
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Выполняет чтение на общем читающем соединении.
+        Args:
+            fn: функция, получающая соединение и возвращающая результат
+        Returns:
+            T: результат fn
+        """
+        with span("db.read", op=getattr(fn, "__qualname__", "")), self._read_lock:
+            return fn(self._reader)
+
+    async def read_async(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Асинхронный вариант read: чтение выполняется вне event loop."""
+        return await asyncio.to_thread(self.read, fn)
+
+    def submit(self, fn: Callable[[sqlite3.Connection], T]) -> Future:
+        """
+        Ставит операцию записи в очередь группового коммита.
+        Args:
+            fn: функция, выполняющая запись на переданном соединении
+        Returns:
+            Future: результат fn после фиксации транзакции
+        """
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Синхронно выполняет запись и ждёт фиксации транзакции."""
+        return self.submit(fn).result()
+
+    async def write_async(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Асинхронно выполняет запись, не блокируя event loop."""
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def close(self) -> None:
+        """Дожидается записи поставленных операций и закрывает соединения."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._read_lock:
+            self._reader.close()
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        try:
+            while True:
+                batch, stop = self._collect_batch()
+                if batch:
+                    with span("db.commit", operations=len(batch)):
+                        self._commit_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _collect_batch(self) -> tuple[list[tuple[Callable, Future]], bool]:
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.commit_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    @staticmethod
+    def _commit_batch(conn: sqlite3.Connection, batch: list[tuple[Callable, Future]]) -> None:
+        results: list[tuple[Future, Any, BaseException | None]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, future in batch:
+                # Ошибка одной операции откатывает только её, а не всю пачку
+                conn.execute("SAVEPOINT op")
+                try:
+                    results.append((future, fn(conn), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    results.append((future, None, e))
+                finally:
+                    conn.execute("RELEASE op")
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_database: Database | None = None
+_database_lock = threading.Lock()
+
+
+def get_database() -> Database:
+    """
+    Возвращает общий экземпляр Database, создавая его при первом обращении.
+    Returns:
+        Database: доступ к базе подписок
+    """
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database()
+            atexit.register(_database.close)
+        return _database
@@ -0,0 +1,77 @@
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from python_scripts.config.env import getenv
+from python_scripts.config.consts import BROADCAST_HOUR, BROADCAST_MINUTE
+
+DEFAULT_TIMEZONE: str = getenv("TIMEZONE", "UTC")
+DEFAULT_DELIVERY_TIME: str = f"{BROADCAST_HOUR:02d}:{BROADCAST_MINUTE:02d}"
+
+# Шаг колеса доставки: все времена доставки выравниваются по минутам
+SLOT_SECONDS = 60
+
+
+def parse_delivery_time(text: str) -> str | None:
+    """
+    Разбирает время доставки вида 'ЧЧ:ММ'.
+    Args:
+        text: строка со временем
+    Returns:
+        str | None: нормализованное время 'ЧЧ:ММ' или None, если строка некорректна
+    """
+    try:
+        parsed = datetime.strptime(text.strip(), "%H:%M")
+    except ValueError:
+        return None
+    return parsed.strftime("%H:%M")
+
+
+def parse_timezone(text: str) -> str | None:
+    """
+    Проверяет название часового пояса IANA (например, 'Europe/Moscow').
+    Returns:
+        str | None: каноническое название пояса или None, если пояс неизвестен
+    """
+    try:
+        return pytz.timezone(text.strip()).zone
+    except pytz.UnknownTimeZoneError:
+        return None
+
+
+def next_delivery_utc(delivery_time: str | None, tz_name: str | None, after: float) -> int:
+    """
+    Вычисляет ближайший момент доставки строго после after.
+    Args:
+        delivery_time: местное время доставки 'ЧЧ:ММ'; None - время по умолчанию
+        tz_name: часовой пояс IANA; None - пояс бота по умолчанию
+        after: момент отсчёта, UNIX-время в секундах
+    Returns:
+        int: UNIX-время следующей доставки, кратное минуте
+    """
+    tz = pytz.timezone(tz_name or DEFAULT_TIMEZONE)
+    hour, minute = (int(part) for part in (delivery_time or DEFAULT_DELIVERY_TIME).split(":"))
+    local_date = datetime.fromtimestamp(after, tz).date()
+    while True:
+        # localize без is_dst сдвигает несуществующее из-за перевода часов время, а не падает
+        candidate = int(tz.localize(datetime.combine(local_date, time(hour, minute))).timestamp())
+        if candidate > after:
+            return candidate
+        local_date += timedelta(days=1)
+
+
+def delivery_date(delivery_utc: int, tz_name: str | None) -> str:
+    """
+    Возвращает местную дату доставки - ключ журнала доставки для подписчика.
+    Args:
+        delivery_utc: UNIX-время доставки
+        tz_name: часовой пояс IANA; None - пояс бота по умолчанию
+    Returns:
+        str: дата в формате YYYY-MM-DD
+    """
+    return datetime.fromtimestamp(delivery_utc, pytz.timezone(tz_name or DEFAULT_TIMEZONE)).date().isoformat()
+
+
+def slot_of(timestamp: float) -> int:
+    """Возвращает начало минутного слота колеса доставки, в который попадает timestamp."""
+    return int(timestamp) // SLOT_SECONDS * SLOT_SECONDS
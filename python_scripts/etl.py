@@ -1,11 +1,26 @@
-import os
-from dotenv import load_dotenv
+import time
+import asyncio
+from datetime import datetime, timezone
 
-import json
-import http.client
 import requests
 
+from python_scripts.http_client import fetch
+from python_scripts.http_cache import fetch_cached
+from python_scripts.history import history
+from python_scripts.circuit_breaker import CircuitBreaker
+from python_scripts.metrics import SOURCE_LATENCY, SOURCE_RESULTS
+from python_scripts.tracing import span
+from python_scripts.config.env import getenv
+from python_scripts.config.consts import (
+    SOURCE_TIMEOUT,
+    REPORT_TIMEOUT,
+    FALLBACK_MAX_AGE,
+    PRESSURE_TREND_WINDOW,
+    PRESSURE_TREND_TOLERANCE,
+    FLUX_RISING_DAYS
+)
 from python_scripts.config.endpoints import (
+    AMBEE_HOST,
     AMBEE_URL,
     OPEN_WEATHER_URL,
     GEOMAGNETIC_URL,
@@ -15,15 +30,14 @@ from python_scripts.interpretations import (
     hpa_to_mmhg,
     wind_direction,
     interpret_solar_flare_data,
-    interpret_geomagnetic_data
+    interpret_geomagnetic_data,
+    rising_streak
 )
 
-load_dotenv()
-
-OPEN_WEATHER_API = os.getenv("OPEN_WEATHER")
-AMBEE_API = os.getenv("AMBEE")
-LAT = os.getenv("LAT")
-LON = os.getenv("LON")
+OPEN_WEATHER_API = getenv("OPEN_WEATHER")
+AMBEE_API = getenv("AMBEE")
+LAT = getenv("LAT")
+LON = getenv("LON")
 
 # Параметры запроса для OpenWeatherMap
 params = {
@@ -42,44 +56,55 @@ headers = {
 }
 
 
-def get_weather_info():
+def get_weather_info(lat: float | str | None = LAT, lon: float | str | None = LON):
     """Получение текущей погоды от OpenWeatherMap."""
     data = dict()
-    response = requests.get(OPEN_WEATHER_URL, params=params)
+    try:
+        response = fetch_cached("weather", OPEN_WEATHER_URL, params={**params, "lat": lat, "lon": lon})
+    except requests.RequestException as e:
+        return f"Ошибка запроса: {e}"
     if response.status_code == 200:
-        weather = response.json()
-        # Распаковка нужных данных
-        main = weather['weather'][0]['description']
-        direction = wind_direction(weather['wind']['deg'])  # Направление ветра
-        speed = weather['wind']['speed']
-        feels_like = weather['main']['feels_like']
-        pressure = hpa_to_mmhg(weather['main']['grnd_level']) # Фактическое давление (по дефолту - на уровне моря)
+        with span("parse", source="weather"):
+            weather = response.json()
+        with span("interpret", source="weather"):
+            # Распаковка нужных данных
+            main = weather['weather'][0]['description']
+            direction = wind_direction(weather['wind']['deg'])  # Направление ветра
+            speed = weather['wind']['speed']
+            feels_like = weather['main']['feels_like']
+            pressure = hpa_to_mmhg(weather['main']['grnd_level']) # Фактическое давление (по дефолту - на уровне моря)
         # Сохраняем информацию
         data['main'] = main
         data['feels_like'] = feels_like
         data['pressure'] = pressure
         data['wind'] = f"{direction} ветер, {speed} м/с"
+        data['pressure_change'] = record_pressure(
+            pressure_location(lat, lon), weather.get('dt') or int(time.time()), pressure
+        )
 
         return data
     else:
         return f"Ошибка: {response.status_code}"
 
 
-def get_pollen_info():
+def pressure_location(lat: float | str | None = LAT, lon: float | str | None = LON) -> str:
+    """Ключ ряда давления в локальной истории для координат запроса погоды."""
+    return f"{lat},{lon}"
+
+
+def get_pollen_info(lat: float | str | None = LAT, lon: float | str | None = LON):
     """Получение данных о пыльце от Ambee."""
-    conn = http.client.HTTPSConnection("api.ambeedata.com")
-    url = AMBEE_URL.format(lat=LAT, lon=LON)
+    url = AMBEE_HOST + AMBEE_URL.format(lat=lat, lon=lon)
     data = dict()
 
     try:
-        conn.request("GET", url, headers=headers)
-        res = conn.getresponse()
+        response = fetch("pollen", url, headers=headers)
 
-        if res.status != 200:
-            return f"Ошибка: сервер вернул код {res.status} - {res.reason}"
+        if response.status_code != 200:
+            return f"Ошибка: сервер вернул код {response.status_code} - {response.reason}"
 
-        response = res.read().decode("utf-8")
-        pollen_data = json.loads(response)['data'][0]
+        with span("parse", source="pollen"):
+            pollen_data = response.json()['data'][0]
 
         # Сохраняем уровни риска и концентрации по типам пыльцы
         data["risk_grass"] = pollen_data["Risk"]["grass_pollen"]
@@ -98,46 +123,287 @@ def get_pollen_info():
     except Exception as e:
         return f"Ошибка при запросе данных: {e}"
 
-    finally:
-        conn.close()
-
 
 def get_solar_flare_info():
     try:
-        response = requests.get(X_RAY_URL)
+        response = fetch_cached("solar_flare", X_RAY_URL)
         response.raise_for_status()
     except requests.RequestException as e:
         return f"Ошибка запроса: {e}"
 
-    x_ray = response.json()
-    rows = x_ray[1:]
-    latest_record = rows[-1]
-
-    if isinstance(latest_record, dict):
-        # Dict format — use the correct key name from the API
-        flux_value = latest_record.get("flux") or latest_record.get("flux_observed")
-    else:
-        # List format — original assumption
-        flux_value = latest_record[1]
+    with span("parse", source="solar_flare"):
+        rows = flux_rows(response.json())
+    if not rows:
+        return "Ошибка: ряд потока пуст"
+    time_tag, flux_value = parse_flux_row(rows[-1])
 
     if flux_value is None:
         return "Ошибка: не удалось получить значение потока"
 
-    interpretation = interpret_solar_flare_data(flux_value)
+    with span("interpret", source="solar_flare"):
+        interpretation = interpret_solar_flare_data(flux_value)
     return {
         'value': flux_value,
-        'interpretation': interpretation
+        'interpretation': interpretation,
+        'rising_days': record_flux(rows)
     }
 
 
+def flux_rows(payload: list) -> list:
+    """
+    Строки данных ряда NOAA 10cm-flux. В табличном формате первая строка - заголовок
+    ['time_tag', 'flux'], в формате словарей заголовка нет и все строки - данные.
+    """
+    if payload and isinstance(payload[0], list) and payload[0] and payload[0][0] == "time_tag":
+        return payload[1:]
+    return payload
+
+
+def parse_flux_row(record: dict | list) -> tuple[str | None, str | float | None]:
+    """
+    Извлекает метку времени и значение потока из строки ряда NOAA 10cm-flux.
+    Returns:
+        tuple: метка времени и значение потока (None, если их нет)
+    """
+    if isinstance(record, dict):
+        # Dict format — use the correct key name from the API
+        return record.get("time_tag"), record.get("flux") or record.get("flux_observed")
+    # List format — original assumption
+    return record[0], record[1]
+
+
+def parse_time_tag(time_tag: str) -> int:
+    """Переводит метку времени NOAA (UTC) в UNIX-время."""
+    return int(datetime.fromisoformat(time_tag.replace(" ", "T")).replace(tzinfo=timezone.utc).timestamp())
+
+
+def record_pressure(location: str, timestamp: int, pressure: float) -> float | None:
+    """
+    Сохраняет давление в локальную историю.
+    Returns:
+        float | None: изменение давления за сутки или None, если истории недостаточно
+    """
+    try:
+        with span("history", series="pressure"):
+            history.append("pressure", location, int(timestamp), pressure)
+        previous = history.value_near(
+            "pressure", location, timestamp - PRESSURE_TREND_WINDOW, PRESSURE_TREND_TOLERANCE
+        )
+    except OSError as e:
+        print(f"Failed to update pressure history: {e}")
+        return None
+    return None if previous is None else round(pressure - previous, 2)
+
+
+def record_flux(rows: list) -> int:
+    """
+    Дописывает в локальную историю все строки 30-дневного ряда потока новее уже сохранённых.
+    Returns:
+        int: сколько дней подряд растёт поток
+    """
+    try:
+        with span("history", series="flux", rows=len(rows)):
+            for row in rows:
+                time_tag, flux_value = parse_flux_row(row)
+                if time_tag and flux_value is not None:
+                    history.append("flux", "global", parse_time_tag(time_tag), float(flux_value))
+            _, values = history.last("flux", "global", FLUX_RISING_DAYS + 1)
+    except (OSError, ValueError) as e:
+        print(f"Failed to update flux history: {e}")
+        return 0
+    return rising_streak(list(values))
+
+
 def get_geomagnetic_info():
     """Получение прогноза геомагнитной активности."""
     try:
-        response = requests.get(GEOMAGNETIC_URL)
+        response = fetch_cached("geomagnetic", GEOMAGNETIC_URL)
         response.raise_for_status()
     except requests.RequestException as e:
         return f"Ошибка запроса: {e}"
-    geomagnetic_data = response.json()["1"]
-    return {
-        'prediction': interpret_geomagnetic_data(geomagnetic_data)
+    with span("parse", source="geomagnetic"):
+        scales = response.json()
+    geomagnetic_data = scales["1"]
+    record_g_scale(geomagnetic_data)
+    with span("interpret", source="geomagnetic"):
+        return {
+            'prediction': interpret_geomagnetic_data(geomagnetic_data),
+            'scale': geomagnetic_data['G']['Scale'],
+            'forecast': [parse_g_scale(scales.get(day)) for day in ("1", "2", "3")]
+        }
+
+
+def parse_g_scale(forecast: dict | None) -> int | None:
+    """Уровень шкалы G из прогноза на день или None, если его нет."""
+    try:
+        return int(forecast["G"]["Scale"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def record_g_scale(forecast: dict) -> None:
+    """Сохраняет прогноз по шкале G на ближайшие сутки в локальную историю."""
+    try:
+        date_stamp, scale = forecast.get("DateStamp"), forecast["G"]["Scale"]
+        if date_stamp and scale is not None:
+            history.append("g_scale", "global", parse_time_tag(date_stamp), float(scale))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Failed to update G-scale history: {e}")
+
+
+# Источники данных отчёта в порядке их следования
+SOURCES = {
+    "weather": get_weather_info,
+    "pollen": get_pollen_info,
+    "solar_flare": get_solar_flare_info,
+    "geomagnetic": get_geomagnetic_info,
+}
+# Зависящие от местоположения источники запрашиваются на каждую географическую ячейку,
+# глобальные данные NOAA - один раз на всех
+LOCAL_SOURCES = ("weather", "pollen")
+GLOBAL_SOURCES = ("solar_flare", "geomagnetic")
+
+# Выключатели по (источник, аргументы), как и last_good: у источников, зависящих от местоположения,
+# свой выключатель на каждую ячейку, поэтому сбои в одних местах не отключают источник для остальных
+breakers: dict[tuple, CircuitBreaker] = {}
+# Последние удачные данные по (источник, аргументы): (время получения, данные)
+last_good: dict[tuple, tuple[float, dict]] = {}
+
+
+def timeout_error(source: str) -> str:
+    """Строка ошибки для источника, не уложившегося в дедлайн."""
+    return f"Ошибка: источник {source} не ответил вовремя"
+
+
+def get_breaker(source: str, args: tuple) -> CircuitBreaker:
+    """
+    Возвращает выключатель источника для аргументов запроса, создавая его при первом обращении.
+    Args:
+        source: имя источника из SOURCES
+        args: аргументы функции источника (для погоды и пыльцы - координаты ячейки)
+    Returns:
+        CircuitBreaker: выключатель
+    """
+    key = (source, args)
+    breaker = breakers.get(key)
+    if breaker is None:
+        breaker = breakers.setdefault(key, CircuitBreaker())
+    return breaker
+
+
+def fallback(source: str, args: tuple, error: str) -> dict | str:
+    """
+    Подменяет ошибку источника последними удачными данными, если они не старше FALLBACK_MAX_AGE.
+    Возраст подставленных данных в секундах записывается в ключ 'age'.
+    Args:
+        source: имя источника из SOURCES
+        args: аргументы функции источника
+        error: строка ошибки на случай, если подходящих данных нет
+    Returns:
+        dict | str: последние удачные данные с возрастом или строка с ошибкой
+    """
+    saved = last_good.get((source, args))
+    if saved is None:
+        return error
+    age = time.time() - saved[0]
+    if age > FALLBACK_MAX_AGE:
+        return error
+    return {**saved[1], "age": age}
+
+
+async def fetch_source_async(source: str, *args, source_timeout: float = SOURCE_TIMEOUT) -> dict | str:
+    """
+    Получает данные одного источника в отдельном потоке, не блокируя event loop.
+    Запрос идёт через выключатель источника для этих аргументов (для погоды и пыльцы -
+    для этой ячейки): пока он разомкнут, API не вызывается
+    и сразу возвращаются последние удачные данные, так что сбой не добавляет задержки.
+    Args:
+        source: имя источника из SOURCES
+        args: аргументы функции источника (например, координаты)
+        source_timeout: дедлайн источника в секундах
+    Returns:
+        dict | str: данные источника, последние удачные данные или строка с ошибкой
+    """
+    breaker = get_breaker(source, args)
+    if not breaker.allow():
+        SOURCE_RESULTS.labels(source, "breaker_open").inc()
+        return fallback(source, args, f"Ошибка: источник {source} временно недоступен")
+
+    outcome = "error"
+    try:
+        with SOURCE_LATENCY.labels(source).time(), span("fetch", source=source):
+            result = await asyncio.wait_for(asyncio.to_thread(SOURCES[source], *args), source_timeout)
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        result = timeout_error(source)
+    except asyncio.CancelledError:
+        SOURCE_RESULTS.labels(source, "timeout").inc()
+        breaker.record_failure()
+        raise
+    except Exception as e:
+        result = f"Ошибка при запросе данных: {e}"
+
+    if isinstance(result, dict):
+        SOURCE_RESULTS.labels(source, "ok").inc()
+        breaker.record_success()
+        last_good[(source, args)] = (time.time(), result)
+        return result
+
+    SOURCE_RESULTS.labels(source, outcome).inc()
+    breaker.record_failure()
+    return fallback(source, args, result)
+
+
+async def fetch_sources_async(
+    sources: tuple[str, ...],
+    *args,
+    source_timeout: float = SOURCE_TIMEOUT,
+    total_timeout: float = REPORT_TIMEOUT,
+) -> dict[str, dict | str]:
+    """
+    Параллельно получает данные указанных источников.
+    Время ответа определяется самым медленным источником, а не суммой всех.
+    Источники, не уложившиеся в свой или общий дедлайн, возвращают последние удачные данные
+    или строку ошибки.
+    Args:
+        sources: имена источников из SOURCES
+        args: аргументы функций источников
+        source_timeout: дедлайн одного источника в секундах
+        total_timeout: общий дедлайн на все источники в секундах
+    Returns:
+        dict[str, dict | str]: данные или строки ошибок по именам источников
+    """
+    tasks = {
+        source: asyncio.create_task(fetch_source_async(source, *args, source_timeout=source_timeout))
+        for source in sources
     }
+    await asyncio.wait(tasks.values(), timeout=total_timeout)
+
+    results = {}
+    for source, task in tasks.items():
+        if task.done():
+            results[source] = task.result()
+        else:
+            task.cancel()
+            results[source] = fallback(source, args, timeout_error(source))
+    return results
+
+
+async def fetch_local_async(lat: float | str | None = LAT, lon: float | str | None = LON) -> dict[str, dict | str]:
+    """Параллельно получает погоду и пыльцу для заданных координат."""
+    return await fetch_sources_async(LOCAL_SOURCES, lat, lon)
+
+
+async def fetch_global_async() -> dict[str, dict | str]:
+    """Параллельно получает глобальные данные NOAA о солнечной и геомагнитной активности."""
+    return await fetch_sources_async(GLOBAL_SOURCES)
+
+
+async def fetch_all_async(lat: float | str | None = LAT, lon: float | str | None = LON) -> dict[str, dict | str]:
+    """
+    Параллельно получает данные всех источников для заданных координат.
+    Returns:
+        dict[str, dict | str]: данные или строки ошибок по именам источников
+    """
+    local_data, global_data = await asyncio.gather(fetch_local_async(lat, lon), fetch_global_async())
+    return {**local_data, **global_data}
@@ -0,0 +1,51 @@
+import math
+
+from python_scripts.config.consts import GEO_CELL_DEG
+
+
+def cell_for(lat: float, lon: float, size: float = GEO_CELL_DEG) -> str:
+    """
+    Возвращает идентификатор географической ячейки сетки size x size градусов.
+    Подписчики из одной ячейки получают общий прогноз, поэтому погодные API
+    вызываются один раз на занятую ячейку, а не на каждого пользователя.
+    Args:
+        lat: широта в градусах
+        lon: долгота в градусах
+        size: размер ячейки в градусах
+    Returns:
+        str: идентификатор ячейки вида '<строка>:<столбец>'
+    """
+    return f"{math.floor(lat / size)}:{math.floor(lon / size)}"
+
+
+def cell_center(cell: str, size: float = GEO_CELL_DEG) -> tuple[float, float]:
+    """
+    Возвращает координаты центра ячейки, по которым запрашивается прогноз.
+    Args:
+        cell: идентификатор ячейки из cell_for
+        size: размер ячейки в градусах
+    Returns:
+        tuple[float, float]: широта и долгота центра ячейки
+    """
+    row, column = (int(part) for part in cell.split(":"))
+    return round((row + 0.5) * size, 4), round((column + 0.5) * size, 4)
+
+
+def parse_location(text: str) -> tuple[float, float] | None:
+    """
+    Разбирает координаты из строки вида '55.75 37.62' или '55.75, 37.62'.
+    Args:
+        text: строка с широтой и долготой
+    Returns:
+        tuple[float, float] | None: широта и долгота или None, если строка некорректна
+    """
+    parts = text.replace(",", " ").split()
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
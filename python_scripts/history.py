@@ -0,0 +1,196 @@
+import os
+import re
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки файлов между процессами нет, историю пишет один процесс
+    fcntl = None
+
+from python_scripts.config.consts import HISTORY_DIR
+
+# Наблюдения: моменты времени - int64 (UNIX-время), значения - float64
+_TIME_TYPE = "q"
+_VALUE_TYPE = "d"
+# Строка ряда на диске: момент и значение одной записью фиксированной длины
+_ROW = struct.Struct("<qd")
+ROWS_SUFFIX = ".rows"
+# Прежний формат: два файла-столбца, переносится в файл строк при первой загрузке
+_LEGACY_COLUMNS = ((".t", _TIME_TYPE), (".v", _VALUE_TYPE))
+
+
+class Series:
+    """
+    Ряд наблюдений одного источника в одном месте.
+    На диске - файл только для дозаписи из строк фиксированной длины (int64 момент, float64 значение),
+    в памяти - типизированные массивы array по столбцам. Ряд упорядочен по времени, поэтому выборка
+    окна - два двоичных поиска. В файл пишут несколько процессов (воркеры рассылки): строка дописывается
+    одним вызовом write под блокировкой файла, а новизна наблюдения проверяется по хвосту файла,
+    дочитанному под той же блокировкой, так что строки не перемешиваются и не расходятся по столбцам.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.times = array(_TIME_TYPE)
+        self.values = array(_VALUE_TYPE)
+        self._offset = 0
+        self._migrate_columns()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Дочитывает строки, дописанные с прошлого чтения, в том числе другими процессами."""
+        try:
+            with open(self.path + ROWS_SUFFIX, "rb") as rows_file:
+                rows_file.seek(self._offset)
+                data = rows_file.read()
+        except FileNotFoundError:
+            return
+        # Неполная строка - прерванная запись; следующая запись под блокировкой её отрежет
+        data = data[:len(data) - len(data) % _ROW.size]
+        self._offset += len(data)
+        for timestamp, value in _ROW.iter_unpack(data):
+            self._add(timestamp, value)
+
+    def append(self, timestamp: int, value: float) -> bool:
+        """
+        Дописывает наблюдение, если оно новее последнего сохранённого (в том числе другим процессом).
+        Returns:
+            bool: True, если наблюдение добавлено
+        """
+        fd = self._open_locked()
+        try:
+            self.refresh()
+            if self.times and timestamp <= self.times[-1]:
+                return False
+            size = os.fstat(fd).st_size
+            if size % _ROW.size:
+                os.ftruncate(fd, size - size % _ROW.size)
+            os.write(fd, _ROW.pack(timestamp, value))
+        finally:
+            # Закрытие файла снимает блокировку
+            os.close(fd)
+        self._offset += _ROW.size
+        self._add(timestamp, value)
+        return True
+
+    def _add(self, timestamp: int, value: float) -> None:
+        if not self.times or timestamp > self.times[-1]:
+            self.times.append(timestamp)
+            self.values.append(value)
+
+    def _open_locked(self) -> int:
+        fd = os.open(self.path + ROWS_SUFFIX, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _migrate_columns(self) -> None:
+        """Переносит ряд из прежнего формата (файлы-столбцы .t и .v) в файл строк и удаляет столбцы."""
+        if not os.path.exists(self.path + _LEGACY_COLUMNS[0][0]):
+            return
+        fd = self._open_locked()
+        try:
+            if not os.path.exists(self.path + _LEGACY_COLUMNS[0][0]):
+                return
+            columns = []
+            for suffix, typecode in _LEGACY_COLUMNS:
+                column = array(typecode)
+                try:
+                    with open(self.path + suffix, "rb") as column_file:
+                        data = column_file.read()
+                    column.frombytes(data[:len(data) - len(data) % column.itemsize])
+                except FileNotFoundError:
+                    pass
+                columns.append(column)
+            if os.fstat(fd).st_size == 0:
+                rows = sorted(dict(zip(*columns)).items())
+                os.write(fd, b"".join(_ROW.pack(timestamp, value) for timestamp, value in rows))
+            for suffix, _ in _LEGACY_COLUMNS:
+                try:
+                    os.remove(self.path + suffix)
+                except FileNotFoundError:
+                    pass
+        finally:
+            os.close(fd)
+
+    def window(self, start: float, end: float) -> tuple[array, array]:
+        """
+        Возвращает наблюдения с моментами в интервале [start, end].
+        Строки, дописанные другими процессами, видны после refresh().
+        Returns:
+            tuple[array, array]: моменты времени и значения
+        """
+        lo = bisect_left(self.times, start)
+        hi = bisect_right(self.times, end)
+        return self.times[lo:hi], self.values[lo:hi]
+
+    def last(self, count: int) -> tuple[array, array]:
+        """Возвращает последние count наблюдений."""
+        return self.times[-count:], self.values[-count:]
+
+
+class ObservationHistory:
+    """
+    Локальная история наблюдений по источникам и местам: давление, поток 10.7 см, шкала G.
+    Позволяет оценивать тренды при формировании отчёта без обращения к сети.
+    """
+
+    def __init__(self, directory: str = HISTORY_DIR) -> None:
+        self.directory = directory
+        self._series: dict[tuple[str, str], Series] = {}
+        self._lock = threading.Lock()
+
+    def series(self, source: str, location: str) -> Series:
+        """
+        Возвращает ряд наблюдений источника в месте, загружая его с диска при первом обращении.
+        Args:
+            source: имя источника (например, 'pressure')
+            location: место наблюдения (например, координаты) или 'global'
+        Returns:
+            Series: ряд наблюдений
+        """
+        key = (source, location)
+        with self._lock:
+            if key not in self._series:
+                os.makedirs(self.directory, exist_ok=True)
+                filename = re.sub(r"[^\w.-]", "_", f"{source}-{location}")
+                self._series[key] = Series(os.path.join(self.directory, filename))
+            return self._series[key]
+
+    def append(self, source: str, location: str, timestamp: int, value: float) -> bool:
+        """Дописывает наблюдение в ряд; более старые, чем последнее, наблюдения пропускаются."""
+        series = self.series(source, location)
+        with self._lock:
+            return series.append(timestamp, value)
+
+    def window(self, source: str, location: str, start: float, end: float) -> tuple[array, array]:
+        """Возвращает наблюдения ряда в интервале [start, end], включая дописанные другими процессами."""
+        series = self.series(source, location)
+        with self._lock:
+            series.refresh()
+            return series.window(start, end)
+
+    def value_near(self, source: str, location: str, target: float, tolerance: float) -> float | None:
+        """
+        Возвращает наблюдение, ближайшее к моменту target, но не дальше tolerance секунд от него.
+        Returns:
+            float | None: значение или None, если подходящих наблюдений нет
+        """
+        times, values = self.window(source, location, target - tolerance, target + tolerance)
+        if not times:
+            return None
+        nearest = min(range(len(times)), key=lambda i: abs(times[i] - target))
+        return values[nearest]
+
+    def last(self, source: str, location: str, count: int) -> tuple[array, array]:
+        """Возвращает последние count наблюдений ряда."""
+        series = self.series(source, location)
+        with self._lock:
+            series.refresh()
+            return series.last(count)
+
+
+history = ObservationHistory()
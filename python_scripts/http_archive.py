@@ -0,0 +1,149 @@
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit, parse_qsl, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from python_scripts.config.consts import HTTP_ARCHIVE_SECRET_PARAMS
+
+# Заголовки ответа, которые не нужны для воспроизведения
+_SKIPPED_HEADERS = {"set-cookie", "content-encoding", "transfer-encoding", "connection", "content-length"}
+
+
+def request_key(source: str, url: str, params: dict | None = None) -> str:
+    """
+    Ключ запроса в архиве: источник, путь и отсортированные параметры без секретов (ключей API).
+    Хост в ключ не входит, поэтому архив воспроизводится и при другом адресе API
+    (например, заданном через OPEN_WEATHER_HOST).
+    Args:
+        source: имя источника
+        url: адрес запроса (может уже содержать параметры)
+        params: параметры строки запроса
+    Returns:
+        str: ключ вида 'weather GET /path?a=1&b=2'
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query)
+    query += [(name, str(value)) for name, value in (params or {}).items() if value is not None]
+    query = sorted((name, value) for name, value in query if name not in HTTP_ARCHIVE_SECRET_PARAMS)
+    return f"{source} GET {urlunsplit(('', '', parts.path, urlencode(query), ''))}"
+
+
+class ArchiveWriter:
+    """
+    Запись ответов внешних API в архив: одна строка JSON на ответ (статус, заголовки, тело, задержка),
+    каждая строка - отдельный член gzip. Член дописывается одним вызовом write в файл, открытый на
+    дозапись, поэтому архив пополняют параллельно несколько потоков и процессов, а оборванная
+    последняя запись не портит предыдущие.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, source: str, url: str, params: dict | None, response: requests.Response, latency: float) -> None:
+        """
+        Сохраняет ответ в архив.
+        Args:
+            source: имя источника
+            url: адрес запроса
+            params: параметры строки запроса
+            response: полученный ответ
+            latency: время ответа, секунды
+        """
+        entry = {
+            "key": request_key(source, url, params),
+            "recorded_at": time.time(),
+            "latency": round(latency, 6),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                name: value for name, value in response.headers.items() if name.lower() not in _SKIPPED_HEADERS
+            },
+        }
+        try:
+            entry["text"] = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body"] = base64.b64encode(response.content).decode("ascii")
+
+        member = gzip.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, member)
+            finally:
+                os.close(fd)
+
+
+class ArchiveReplayer:
+    """
+    Воспроизведение ответов из архива без сети.
+    Для каждого ключа запроса ответы отдаются в порядке записи, так что повторы после ошибок
+    воспроизводятся как были; когда записи по ключу кончаются, повторяется последняя.
+    Порядок считается отдельно по каждому ключу, поэтому результат не зависит от того,
+    в каком порядке параллельные потоки обращаются к разным источникам.
+    """
+
+    def __init__(self, path: str, with_latency: bool = False) -> None:
+        """
+        Args:
+            path: путь к архиву
+            with_latency: выдерживать ли перед ответом записанную задержку
+        Raises:
+            OSError: если архив не удалось прочитать
+        """
+        self.path = path
+        self.with_latency = with_latency
+        self.entries: dict[str, list[dict]] = defaultdict(list)
+        self._served: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            try:
+                for line in archive:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]].append(entry)
+            except EOFError:
+                # Последняя запись оборвана (процесс упал во время записи): остальные годятся
+                pass
+
+    def response(self, source: str, url: str, params: dict | None = None) -> requests.Response:
+        """
+        Возвращает следующий записанный ответ на запрос.
+        Args:
+            source: имя источника
+            url: адрес запроса
+            params: параметры строки запроса
+        Returns:
+            requests.Response: ответ, собранный из архива
+        Raises:
+            requests.ConnectionError: если такого запроса в архиве нет
+        """
+        key = request_key(source, url, params)
+        recorded = self.entries.get(key)
+        if not recorded:
+            raise requests.ConnectionError(f"No recorded response for {key} in {self.path}")
+        with self._lock:
+            index = min(self._served[key], len(recorded) - 1)
+            self._served[key] += 1
+        entry = recorded[index]
+        if self.with_latency:
+            time.sleep(entry["latency"])
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = entry["text"].encode("utf-8") if "text" in entry else base64.b64decode(entry["body"])
+        response.encoding = "utf-8"
+        response.url = url
+        return response
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any
+
+import requests
+
+from python_scripts.http_client import fetch
+from python_scripts.metrics import HTTP_CACHE_RESULTS
+from python_scripts.config.consts import HTTP_CACHE_DIR, HTTP_CACHE_FRESHNESS, HTTP_CACHE_STALE_MAX
+
+
+class CachedResponse:
+    """
+    Ответ внешнего API, сохранённый на диске вместе с валидаторами ETag / Last-Modified.
+    Повторяет используемую часть интерфейса requests.Response. Разобранный JSON
+    запоминается, поэтому подтверждённый ответом 304 ответ повторно не разбирается.
+    """
+
+    def __init__(
+        self,
+        content: bytes,
+        etag: str | None,
+        last_modified: str | None,
+        fetched_at: float,
+    ) -> None:
+        self.status_code = 200
+        self.reason = "OK"
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self._json: Any = None
+        self._parsed = False
+
+    def json(self) -> Any:
+        if not self._parsed:
+            self._json = json.loads(self.content)
+            self._parsed = True
+        return self._json
+
+    def raise_for_status(self) -> None:
+        """В кэш попадают только успешные ответы, поэтому проверка всегда проходит."""
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+_entries: dict[str, CachedResponse] = {}
+_refreshing: set[str] = set()
+_lock = threading.Lock()
+
+
+def fetch_cached(
+    source: str,
+    url: str,
+    params: dict | None = None,
+    headers: dict | None = None,
+) -> CachedResponse | requests.Response:
+    """
+    GET-запрос через дисковый кэш с условной перепроверкой.
+    Пока ответ моложе окна свежести источника (HTTP_CACHE_FRESHNESS), он отдаётся без сети.
+    Устаревший, но моложе предела источника в HTTP_CACHE_STALE_MAX ответ отдаётся сразу,
+    а перепроверяется в фоне; более старый - перепроверяется синхронно. Перепроверка отправляет
+    If-None-Match / If-Modified-Since, и ответ 304 лишь продлевает жизнь записи.
+    Args:
+        source: имя источника (ключ окна свежести и статистики)
+        url: адрес запроса
+        params: параметры строки запроса
+        headers: заголовки запроса
+    Returns:
+        CachedResponse | requests.Response: закэшированный ответ или ответ с ошибкой
+    Raises:
+        requests.RequestException: если запрос не удался, а подходящей записи в кэше нет
+    """
+    key = _cache_key(source, url, params)
+    entry = _load(key)
+    freshness = HTTP_CACHE_FRESHNESS.get(source, 0)
+    stale_max = HTTP_CACHE_STALE_MAX.get(source, 0)
+
+    if entry is not None:
+        age = entry.age()
+        if age < freshness:
+            HTTP_CACHE_RESULTS.labels(source, "hit").inc()
+            return entry
+        if age < stale_max:
+            HTTP_CACHE_RESULTS.labels(source, "stale").inc()
+            _refresh_in_background(key, source, url, params, headers)
+            return entry
+
+    HTTP_CACHE_RESULTS.labels(source, "miss").inc()
+    return _revalidate(key, source, url, params, headers, entry)
+
+
+def _revalidate(
+    key: str,
+    source: str,
+    url: str,
+    params: dict | None,
+    headers: dict | None,
+    entry: CachedResponse | None,
+) -> CachedResponse | requests.Response:
+    conditional = dict(headers or {})
+    if entry is not None:
+        if entry.etag:
+            conditional["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            conditional["If-Modified-Since"] = entry.last_modified
+
+    response = fetch(source, url, params=params, headers=conditional)
+
+    if response.status_code == 304 and entry is not None:
+        entry.fetched_at = time.time()
+        _save(key, entry, write_body=False)
+        return entry
+    if response.status_code != 200:
+        return response
+
+    entry = CachedResponse(
+        content=response.content,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+        fetched_at=time.time(),
+    )
+    _save(key, entry, write_body=True)
+    return entry
+
+
+def _refresh_in_background(
+    key: str,
+    source: str,
+    url: str,
+    params: dict | None,
+    headers: dict | None,
+) -> None:
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def refresh() -> None:
+        try:
+            _revalidate(key, source, url, params, headers, _load(key))
+        except requests.RequestException as e:
+            print(f"Background refresh of {source} failed: {e}")
+        finally:
+            with _lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=refresh, name=f"http-cache-{source}", daemon=True).start()
+
+
+def _cache_key(source: str, url: str, params: dict | None) -> str:
+    # Ключ API входит в хеш, но не попадает в имя файла в открытом виде
+    query = json.dumps(sorted((params or {}).items()), default=str)
+    return f"{source}-{hashlib.sha256((url + query).encode()).hexdigest()[:32]}"
+
+
+def _paths(key: str) -> tuple[str, str]:
+    base = os.path.join(HTTP_CACHE_DIR, key)
+    return base + ".meta.json", base + ".body"
+
+
+def _load(key: str) -> CachedResponse | None:
+    with _lock:
+        entry = _entries.get(key)
+    if entry is not None:
+        return entry
+
+    meta_path, body_path = _paths(key)
+    try:
+        with open(meta_path, encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        with open(body_path, "rb") as body_file:
+            content = body_file.read()
+    except (OSError, ValueError):
+        return None
+    # Обрезанный или старый файл метаданных - промах кэша, а не ошибка запроса
+    fetched_at = meta.get("fetched_at") if isinstance(meta, dict) else None
+    if not isinstance(fetched_at, (int, float)):
+        return None
+
+    entry = CachedResponse(content, meta.get("etag"), meta.get("last_modified"), fetched_at)
+    with _lock:
+        return _entries.setdefault(key, entry)
+
+
+def _save(key: str, entry: CachedResponse, write_body: bool) -> None:
+    with _lock:
+        _entries[key] = entry
+    meta_path, body_path = _paths(key)
+    try:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        if write_body:
+            _write_atomic(body_path, entry.content)
+        meta = {"etag": entry.etag, "last_modified": entry.last_modified, "fetched_at": entry.fetched_at}
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    except OSError as e:
+        # Кэш - оптимизация: ошибка записи на диск не должна ломать получение данных
+        print(f"Failed to write HTTP cache entry {key}: {e}")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_path, path)
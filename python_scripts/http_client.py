@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+from dataclasses import asdict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from python_scripts.http_archive import ArchiveWriter, ArchiveReplayer
+from python_scripts.metrics import HTTP_REQUEST_LATENCY
+from python_scripts.tracing import span
+from python_scripts.config.env import getenv
+from python_scripts.config.types import SourceStats
+from python_scripts.config.consts import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE,
+    HTTP_BACKOFF_MAX,
+    HTTP_RETRY_BUDGET,
+    HTTP_PER_HOST_LIMIT,
+    HTTP_POOL_SIZE,
+    HTTP_RETRY_STATUSES,
+    HTTP_ARCHIVE_PATH
+)
+
+# live - запросы в сеть; record - запросы в сеть с записью ответов в архив HTTP_ARCHIVE;
+# replay - ответы из архива без сети (HTTP_REPLAY_LATENCY=1 - с записанными задержками)
+HTTP_MODE = getenv("HTTP_MODE", "live")
+HTTP_ARCHIVE = getenv("HTTP_ARCHIVE", HTTP_ARCHIVE_PATH)
+HTTP_REPLAY_LATENCY = getenv("HTTP_REPLAY_LATENCY", "0") == "1"
+
+# Заголовки условного запроса: при записи не отправляются, чтобы в архив попадали полные ответы,
+# не зависящие от состояния локального кэша
+CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+# Одна сессия на процесс: keep-alive соединения переиспользуются между запросами,
+# поэтому DNS, TCP и TLS оплачиваются один раз на хост, а не на каждый запрос
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+_host_limits: dict[str, threading.BoundedSemaphore] = {}
+_stats: dict[str, SourceStats] = {}
+_lock = threading.Lock()
+
+_writer: ArchiveWriter | None = ArchiveWriter(HTTP_ARCHIVE) if HTTP_MODE == "record" else None
+_replayer: ArchiveReplayer | None = None
+
+
+def fetch(
+    source: str,
+    url: str,
+    params: dict | None = None,
+    headers: dict | None = None,
+) -> requests.Response:
+    """
+    Выполняет GET-запрос к внешнему API через общий пул соединений.
+    Таймауты на соединение и чтение обязательны; сетевые ошибки и ответы
+    из HTTP_RETRY_STATUSES повторяются не более HTTP_MAX_RETRIES раз с паузой
+    по экспоненте со случайным разбросом. Повтор начинается, только если вместе с паузой
+    и полными таймаутами он укладывается в HTTP_RETRY_BUDGET от начала запроса: запрос
+    завершается раньше дедлайна источника и не занимает лимит хоста в потоке, от результата
+    которого уже отказались. Одновременных запросов к одному хосту
+    не больше HTTP_PER_HOST_LIMIT. Повторы и задержки учитываются по источнику.
+    В режиме HTTP_MODE=record ответы дописываются в архив, в режиме replay берутся из него.
+    Args:
+        source: имя источника для статистики (например, 'weather')
+        url: адрес запроса
+        params: параметры строки запроса
+        headers: заголовки запроса
+    Returns:
+        requests.Response: последний полученный ответ (в том числе с кодом ошибки)
+    Raises:
+        requests.RequestException: если все попытки завершились сетевой ошибкой
+    """
+    stats = _source_stats(source)
+    host_limit = _host_limit(urlsplit(url).netloc)
+
+    deadline = time.monotonic() + HTTP_RETRY_BUDGET
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        # Повтор из архива мгновенный, ждать имеет смысл только при воспроизведении задержек
+        pause = _backoff(attempt) if HTTP_MODE != "replay" or HTTP_REPLAY_LATENCY else 0
+        try:
+            with span("http", source=source, attempt=attempt), host_limit:
+                response = _send(source, url, params, headers)
+        except requests.RequestException:
+            _record(source, stats, time.monotonic() - started)
+            if _is_last_attempt(attempt, pause, deadline):
+                with _lock:
+                    stats.failures += 1
+                raise
+        else:
+            _record(source, stats, time.monotonic() - started)
+            if response.status_code not in HTTP_RETRY_STATUSES or _is_last_attempt(attempt, pause, deadline):
+                if response.status_code >= 400:
+                    with _lock:
+                        stats.failures += 1
+                return response
+
+        with _lock:
+            stats.retries += 1
+        if pause:
+            time.sleep(pause)
+        attempt += 1
+
+
+def _is_last_attempt(attempt: int, pause: float, deadline: float) -> bool:
+    # Повтор не начинается, если в худшем случае (пауза и оба таймаута) не успеет до дедлайна
+    worst_case = pause + HTTP_CONNECT_TIMEOUT + HTTP_READ_TIMEOUT
+    return attempt == HTTP_MAX_RETRIES or time.monotonic() + worst_case > deadline
+
+
+def _send(source: str, url: str, params: dict | None, headers: dict | None) -> requests.Response:
+    if HTTP_MODE == "replay":
+        return _get_replayer().response(source, url, params)
+
+    if _writer is not None and headers:
+        headers = {name: value for name, value in headers.items() if name not in CONDITIONAL_HEADERS}
+    started = time.monotonic()
+    response = session.get(
+        url,
+        params=params,
+        headers=headers,
+        timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    )
+    if _writer is not None:
+        try:
+            _writer.record(source, url, params, response, time.monotonic() - started)
+        except OSError as e:
+            # Запись архива - отладочная возможность и не должна ломать получение данных
+            print(f"Failed to record {source} response: {e}")
+    return response
+
+
+def _get_replayer() -> ArchiveReplayer:
+    global _replayer
+    with _lock:
+        if _replayer is None:
+            try:
+                _replayer = ArchiveReplayer(HTTP_ARCHIVE, with_latency=HTTP_REPLAY_LATENCY)
+            except (OSError, ValueError) as e:
+                raise requests.ConnectionError(f"Failed to load HTTP archive {HTTP_ARCHIVE}: {e}") from e
+        return _replayer
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: случайная пауза до экспоненциального предела, чтобы повторы не шли залпом
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+def _host_limit(host: str) -> threading.BoundedSemaphore:
+    with _lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(HTTP_PER_HOST_LIMIT)
+        return _host_limits[host]
+
+
+def _source_stats(source: str) -> SourceStats:
+    with _lock:
+        return _stats.setdefault(source, SourceStats())
+
+
+def _record(source: str, stats: SourceStats, latency: float) -> None:
+    HTTP_REQUEST_LATENCY.labels(source).observe(latency)
+    with _lock:
+        stats.requests += 1
+        stats.total_latency += latency
+        stats.max_latency = max(stats.max_latency, latency)
+
+
+def get_http_stats() -> dict[str, dict]:
+    """
+    Возвращает статистику запросов по источникам: число запросов, повторов, неудач,
+    суммарную и максимальную задержку в секундах.
+    """
+    with _lock:
+        return {source: asdict(stats) for source, stats in _stats.items()}
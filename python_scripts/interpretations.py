@@ -9,7 +9,9 @@ from python_scripts.config.consts import (
     G_SCALE_WEAK,
     G_SCALE_MODERATE,
     G_SCALE_STRONG,
-    G_SCALE_POWERFUL
+    G_SCALE_POWERFUL,
+    PRESSURE_DROP_ALERT,
+    FLUX_RISING_DAYS
 )
 
 
@@ -73,3 +75,49 @@ def interpret_geomagnetic_data(data: dict) -> str:
         return "Ожидается мощная геомагнитная буря"
     else:
         return "Уровень геомагнитной активности неизвестен"
+
+
+def rising_streak(values: list[float]) -> int:
+    """
+    Считает, сколько последних значений подряд росло.
+    Args:
+        values (list[float]): значения в хронологическом порядке
+    Returns:
+        int: длина серии роста в конце ряда (0, если последнее значение не выросло)
+    """
+    streak = 0
+    for i in range(len(values) - 1, 0, -1):
+        if values[i] <= values[i - 1]:
+            break
+        streak += 1
+    return streak
+
+
+def interpret_pressure_trend(change: float | None) -> str | None:
+    """
+    Интерпретирует изменение давления за сутки.
+    Args:
+        change (float | None): изменение давления в мм.рт.ст. (None - истории недостаточно)
+    Returns:
+        str | None: предупреждение о резком изменении или None
+    """
+    if change is None:
+        return None
+    if change <= -PRESSURE_DROP_ALERT:
+        return f"Давление упало на {abs(round(change, 1))} мм.рт.ст. за сутки"
+    if change >= PRESSURE_DROP_ALERT:
+        return f"Давление выросло на {round(change, 1)} мм.рт.ст. за сутки"
+    return None
+
+
+def interpret_flux_trend(rising_days: int) -> str | None:
+    """
+    Интерпретирует рост потока радиоизлучения Солнца.
+    Args:
+        rising_days (int): сколько дней подряд рос поток
+    Returns:
+        str | None: предупреждение о росте активности или None
+    """
+    if rising_days >= FLUX_RISING_DAYS:
+        return f"Солнечная активность растёт {rising_days} дн. подряд"
+    return None
@@ -1,41 +1,248 @@
 import os
+import math
 import asyncio
-from dotenv import load_dotenv
-
-import pytz
-from aiogram import Bot, Dispatcher
-from aiogram.types import Message
-from aiogram.filters import Command
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.jobstores.base import JobLookupError
-
-from python_scripts.message import get_tg_jopae_message
-from python_scripts.subscriptions import init_db, add_subscriber, remove_subscriber, get_all_subscribers
-from python_scripts.config.consts import GREETINGS, HELP_MESSAGE
-
-load_dotenv()
+import secrets
+import socket
+import multiprocessing
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+from aiogram import Bot, Dispatcher, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import BufferedInputFile, Message
+from aiogram.filters import Command, CommandObject
+
+from python_scripts.db import get_database
+from python_scripts.metrics import MetricsServer, TELEGRAM_SENDS
+from python_scripts.startup import StartupTimer
+from python_scripts.tracing import tracer, traced, span
+from python_scripts.shards import LeaseManager, ShardWorker
+from python_scripts.cooldown import ChatCooldown
+from python_scripts.broadcast import (
+    BroadcastDispatcher,
+    DeliveryOutbox,
+    TimingWheel,
+    TokenBucket,
+    classify_send_error,
+    SEND_DEAD,
+    SEND_FAILED
+)
+from python_scripts.report_cache import ReportCache
+from python_scripts.geo import parse_location
+from python_scripts.thresholds import ThresholdTable, default_thresholds, parse_threshold
+from python_scripts.delivery_schedule import parse_delivery_time, parse_timezone
+from python_scripts.subscriptions import (
+    Partition,
+    init_db,
+    add_subscriber_async,
+    remove_subscriber_async,
+    set_subscriber_location,
+    set_subscriber_schedule,
+    set_subscriber_threshold,
+    toggle_subscriber_section,
+    load_thresholds,
+    get_subscriber,
+    get_pending_cells,
+    aiter_pending_recipients,
+    get_delivery_stats
+)
+from python_scripts.config.types import BroadcastResult, Subscriber
+from python_scripts.config.consts import (
+    GREETINGS,
+    HELP_MESSAGE,
+    PREWARM_CONCURRENCY,
+    BROADCAST_GLOBAL_RATE,
+    SECTION_BITS,
+    DEFAULT_SECTIONS,
+    CHART_FILE_TTL,
+    CHART_UPLOAD_ATTEMPTS,
+    CHART_FILENAME,
+    CHART_TEXT_SENT_SIZE,
+    TELEGRAM_CAPTION_LIMIT,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_WORKERS,
+    METRICS_HOST,
+    METRICS_PORT,
+    ON_DEMAND_BUDGET
+)
+from python_scripts.config.env import getenv
+
+if TYPE_CHECKING:
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+# The report pipeline (upstream clients, requests, rendering) is imported on first use or
+# in the background once updates are being handled, so it does not delay startup
+REPORT_PIPELINE: str = "python_scripts.message"
+
+TOKEN: str = getenv("JOPAE_BOT", "")
+TIMEZONE: str = getenv("TIMEZONE", "UTC")
+# "polling" (default) or "webhook"
+BOT_MODE: str = getenv("BOT_MODE", "polling")
+WEBHOOK_URL: str = getenv("WEBHOOK_URL", "")  # public base URL Telegram posts updates to
+WEBHOOK_SECRET: str = getenv("WEBHOOK_SECRET", "")  # random per start if empty
+# Alternative Bot API server, e.g. a local fake Telegram endpoint for testing
+TELEGRAM_API_URL: str = getenv("TELEGRAM_API_URL", "")
+# Number of broadcast worker processes (and chat_id partitions); 0 - everything in one process
+SHARDS: int = int(getenv("SHARDS", "0"))
+# "all" (default) handles updates and spawns SHARDS workers; "worker" runs a single broadcast worker
+ROLE: str = getenv("ROLE", "all")
+# Local Prometheus endpoint; spawned workers listen on the following ports; 0 - disabled
+METRICS_PORT_ENV: int = int(getenv("METRICS_PORT", str(METRICS_PORT)))
+# Chats allowed to use admin commands (/trace), comma-separated
+ADMIN_CHAT_IDS: frozenset[int] = frozenset(
+    int(chat_id) for chat_id in getenv("ADMIN_CHAT_IDS", "").split(",") if chat_id.strip()
+)
+
+# Share of broadcasts recorded as Chrome traces (0 - only when armed with /trace)
+tracer.sample_rate = float(getenv("TRACE_SAMPLE_RATE", "0"))
+
+bot: Bot = Bot(
+    token=TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None,
+)
+dp: Dispatcher = Dispatcher()
+# Created on first use: only the process that drives the delivery wheel imports APScheduler
+scheduler: "AsyncIOScheduler | None" = None
 
-TOKEN: str = os.getenv("JOPAE_BOT", "")
-TIMEZONE: str = os.getenv("TIMEZONE", "UTC")
+WHEEL_JOB_ID: str = "delivery_wheel"
 
-bot: Bot = Bot(token=TOKEN)
-dp: Dispatcher = Dispatcher()
-timezone: pytz.BaseTzInfo = pytz.timezone(TIMEZONE)
-scheduler: AsyncIOScheduler = AsyncIOScheduler(timezone=timezone)
+# Telegram file_id of the uploaded daily chart per (geo cell, delivery date)
+chart_files: ReportCache = ReportCache(ttl=CHART_FILE_TTL, name="chart_file")
+# (chat_id, delivery date) whose long text is sent but the chart is not yet: a retry sends only the chart
+texts_sent: "OrderedDict[tuple[int, str], None]" = OrderedDict()
+# Bot-wide send rate shared by every broadcast of the process (concurrent dates and partitions)
+send_bucket: TokenBucket = TokenBucket(BROADCAST_GLOBAL_RATE)
+# Per-chat rate limit of on-demand reports
+on_demand_cooldown: ChatCooldown = ChatCooldown()
+# On-demand sends that outlived the latency budget; kept so they are not garbage collected
+on_demand_tasks: set[asyncio.Task] = set()
 
 
 async def send_morning_message(chat_id: int) -> None:
     """
     Send a scheduled morning message to the specified Telegram chat.
 
+    The report text comes from the shared report cache for the chat's location,
+    so a broadcast to N chats costs one round of upstream requests per location.
+    Errors are logged; a chat that is permanently unreachable (e.g. the user blocked the bot)
+    is unsubscribed.
+
     :param chat_id: Unique identifier of the Telegram chat.
-    :raises Exception: If message sending fails (e.g., user blocked the bot).
     """
     try:
-        text: str = get_tg_jopae_message()
+        subscriber: Subscriber = await get_subscriber(chat_id) or Subscriber(chat_id)
+        await deliver_morning_message(subscriber, await load_thresholds(chat_id))
+    except Exception as e:
+        kind: str = classify_send_error(e)
+        TELEGRAM_SENDS.labels(kind).inc()
+        print(f"Error sending message to chat {chat_id} ({kind}): {e}")
+        if kind == SEND_DEAD:
+            await remove_subscriber_async(chat_id)
+    else:
+        TELEGRAM_SENDS.labels("sent").inc()
+
+
+async def deliver_morning_message(subscriber: Subscriber, thresholds: ThresholdTable = default_thresholds) -> None:
+    """
+    Send the morning report for the subscriber's location with the verdict for their thresholds
+    and only the sections they have enabled.
+
+    :param subscriber: Recipient of the message.
+    :param thresholds: Subscriber thresholds loaded for the broadcast.
+    :raises Exception: If message sending fails; the broadcast dispatcher handles it.
+    """
+    from python_scripts.message import get_cached_jopae_message
+
+    text: str = await get_cached_jopae_message(
+        subscriber.cell, subscriber.chat_id, thresholds, subscriber.sections
+    )
+    chart_date: str = subscriber.delivery_date or datetime.now(timezone.utc).date().isoformat()
+    await send_with_chart(subscriber.chat_id, text, subscriber.cell, chart_date)
+
+
+async def send_with_chart(chat_id: int, text: str, cell: str | None, chart_date: str) -> None:
+    """
+    Send the message text together with the daily chart for the location.
+
+    The text goes as the photo caption when it fits, otherwise as a message before the chart.
+    A long text already sent is remembered, so a retry after a failed chart does not send it twice.
+    The chart is optional: if it cannot be built or Telegram rejects the photo itself,
+    the text is sent on its own. Errors that concern this chat (blocked bot, rate limit,
+    network) are raised for the broadcast dispatcher to classify.
+
+    :param chat_id: Unique identifier of the Telegram chat.
+    :param text: Message text, used as the photo caption when it fits.
+    :param cell: Geo cell of the subscriber; None is the default location.
+    :param chart_date: Delivery date the chart belongs to, in YYYY-MM-DD format.
+    :raises Exception: If message sending fails; the broadcast dispatcher handles it.
+    """
+    caption: str | None = text if len(text) <= TELEGRAM_CAPTION_LIMIT else None
+    key: tuple[int, str] = (chat_id, chart_date)
+    if caption is None and key not in texts_sent:
         await bot.send_message(chat_id, text)
+        texts_sent[key] = None
+        if len(texts_sent) > CHART_TEXT_SENT_SIZE:
+            texts_sent.popitem(last=False)
+
+    try:
+        await send_chart(chat_id, cell, chart_date, caption)
     except Exception as e:
-        print(f"Error sending message to chat {chat_id}: {e}")
+        if classify_send_error(e) != SEND_FAILED:
+            raise
+        print(f"Chart for cell {cell} not sent to chat {chat_id}, sending text only: {e}")
+        if caption is not None:
+            await bot.send_message(chat_id, text)
+    texts_sent.pop(key, None)
+
+
+async def send_chart(chat_id: int, cell: str | None, chart_date: str, caption: str | None) -> None:
+    """
+    Send the daily chart for the location to the chat.
+
+    The chart is rendered and uploaded once per location and day: the first recipient
+    gets the file itself and every later (or concurrent) one is sent the cached Telegram file_id,
+    so each further send is a small metadata call. If the upload to another chat fails
+    (e.g. that user blocked the bot), the next recipient uploads the chart instead; the other
+    chat's error is never raised here, so it cannot be classified as this chat's failure.
+    If every shared attempt fails elsewhere, the chart is uploaded to this chat directly.
+
+    :param chat_id: Unique identifier of the Telegram chat.
+    :param cell: Geo cell of the subscriber; None is the default location.
+    :param chart_date: Delivery date the chart belongs to, in YYYY-MM-DD format.
+    :param caption: Photo caption, or None.
+    :raises Exception: If the chart cannot be built or sent to this chat.
+    """
+    from python_scripts.message import build_chart
+
+    for _ in range(CHART_UPLOAD_ATTEMPTS):
+        uploaded: bool = False
+
+        async def upload() -> str:
+            nonlocal uploaded
+            uploaded = True
+            png: bytes = await build_chart(cell)
+            with span("chart.upload", bytes=len(png)):
+                sent: Message = await bot.send_photo(chat_id, BufferedInputFile(png, CHART_FILENAME), caption=caption)
+            return sent.photo[-1].file_id
+
+        try:
+            file_id: str = await chart_files.get((cell, chart_date), upload)
+        except Exception:
+            if uploaded:
+                raise
+            # The upload was made by another chat and failed there: not this chat's error
+            continue
+        if not uploaded:
+            await bot.send_photo(chat_id, file_id, caption=caption)
+        return
+
+    png: bytes = await build_chart(cell)
+    await bot.send_photo(chat_id, BufferedInputFile(png, CHART_FILENAME), caption=caption)
 
 
 @dp.message(Command("start"))
@@ -43,27 +250,12 @@ async def start_command(message: Message) -> None:
     """
     Handle the /start command: subscribe the user to daily messages.
 
-    Adds the user's chat_id to the database and creates a daily job at 7:00 AM
-    in the configured timezone. Ensures idempotency using a unique job ID.
+    Adds the user's chat_id to the database with the default delivery time.
+    The delivery timing wheel picks up every subscriber, so no per-chat job is created.
 
     :param message: Incoming Telegram message object.
     """
-    chat_id: int = message.chat.id
-    add_subscriber(chat_id)
-
-    job_id: str = f"job_{chat_id}"
-    if not scheduler.get_job(job_id):
-        scheduler.add_job(
-            send_morning_message,
-            trigger="cron",
-            hour=7,
-            minute=0,
-            timezone=timezone,
-            args=[chat_id],
-            id=job_id,
-            replace_existing=True,
-        )
-
+    await add_subscriber_async(message.chat.id)
     await message.answer(GREETINGS)
 
 
@@ -72,20 +264,182 @@ async def stop_command(message: Message) -> None:
     """
     Handle the /stop command: unsubscribe the user from daily messages.
 
-    Removes the user's chat_id from the database and removes the scheduled job.
+    Removes the user's chat_id from the database, which excludes it from the next broadcast.
 
     :param message: Incoming Telegram message object.
     """
-    chat_id: int = message.chat.id
-    job_id: str = f"job_{chat_id}"
+    await remove_subscriber_async(message.chat.id)
+    await message.answer("You have unsubscribed from daily messages. To subscribe again, send /start.")
 
-    try:
-        scheduler.remove_job(job_id)
-    except JobLookupError:
-        pass
 
-    remove_subscriber(chat_id)
-    await message.answer("You have unsubscribed from daily messages. To subscribe again, send /start.")
+@dp.message(Command("location"))
+async def location_command(message: Message, command: CommandObject) -> None:
+    """
+    Handle the /location command: set the subscriber's location from "<lat> <lon>".
+
+    :param message: Incoming Telegram message object.
+    :param command: Parsed command with its arguments.
+    """
+    location: tuple[float, float] | None = parse_location(command.args or "")
+    if location is None:
+        await message.answer("Usage: /location <latitude> <longitude>, e.g. /location 55.75 37.62")
+        return
+    await save_location(message, *location)
+
+
+@dp.message(F.location)
+async def location_message(message: Message) -> None:
+    """
+    Handle a shared Telegram location: set it as the subscriber's location.
+
+    :param message: Incoming Telegram message object with a location.
+    """
+    await save_location(message, message.location.latitude, message.location.longitude)
+
+
+async def save_location(message: Message, lat: float, lon: float) -> None:
+    """
+    Store the location for the chat and confirm it to the user.
+
+    :param message: Incoming Telegram message object.
+    :param lat: Latitude in degrees.
+    :param lon: Longitude in degrees.
+    """
+    if await set_subscriber_location(message.chat.id, lat, lon):
+        await message.answer(f"Location saved: {lat:.4f}, {lon:.4f}")
+    else:
+        await message.answer("Subscribe with /start first, then set your location.")
+
+
+@dp.message(Command("time"))
+async def time_command(message: Message, command: CommandObject) -> None:
+    """
+    Handle the /time command: set the local delivery time from "HH:MM".
+
+    :param message: Incoming Telegram message object.
+    :param command: Parsed command with its arguments.
+    """
+    delivery_time: str | None = parse_delivery_time(command.args or "")
+    if delivery_time is None:
+        await message.answer("Usage: /time HH:MM, e.g. /time 08:30")
+        return
+    await save_schedule(message, delivery_time=delivery_time)
+
+
+@dp.message(Command("timezone"))
+async def timezone_command(message: Message, command: CommandObject) -> None:
+    """
+    Handle the /timezone command: set the subscriber's IANA timezone.
+
+    :param message: Incoming Telegram message object.
+    :param command: Parsed command with its arguments.
+    """
+    tz_name: str | None = parse_timezone(command.args or "")
+    if tz_name is None:
+        await message.answer("Usage: /timezone Area/City, e.g. /timezone Europe/Moscow")
+        return
+    await save_schedule(message, tz_name=tz_name)
+
+
+async def save_schedule(message: Message, delivery_time: str | None = None, tz_name: str | None = None) -> None:
+    """
+    Store the delivery time and/or timezone for the chat and confirm it to the user.
+
+    :param message: Incoming Telegram message object.
+    :param delivery_time: Local delivery time in HH:MM format.
+    :param tz_name: IANA timezone name.
+    """
+    if await set_subscriber_schedule(message.chat.id, delivery_time, tz_name):
+        await message.answer(f"Delivery schedule saved: {delivery_time or tz_name}")
+    else:
+        await message.answer("Subscribe with /start first, then set your delivery schedule.")
+
+
+@dp.message(Command("sensitivity"))
+async def sensitivity_command(message: Message, command: CommandObject) -> None:
+    """
+    Handle the /sensitivity command: set a personal threshold or reset all of them.
+
+    Accepts "pressure <mmHg>", "flux <SFU>", "g <level>" or "reset".
+
+    :param message: Incoming Telegram message object.
+    :param command: Parsed command with its arguments.
+    """
+    args: str = (command.args or "").strip()
+    if args.lower() == "reset":
+        name, value = None, None
+    else:
+        threshold: tuple[str, float] | None = parse_threshold(args)
+        if threshold is None:
+            await message.answer(
+                "Usage: /sensitivity pressure|flux|g <value>, e.g. /sensitivity pressure 745 "
+                "(g is a whole G-scale level from 1 to 5), or /sensitivity reset"
+            )
+            return
+        name, value = threshold
+
+    if await set_subscriber_threshold(message.chat.id, name, value):
+        await message.answer(f"Threshold saved: {name} {value:g}" if name else "Thresholds reset to defaults.")
+    else:
+        await message.answer("Subscribe with /start first, then set your thresholds.")
+
+
+@dp.message(Command("settings"))
+async def settings_command(message: Message, command: CommandObject) -> None:
+    """
+    Handle the /settings command: show the enabled message sections or toggle one of them.
+
+    :param message: Incoming Telegram message object.
+    :param command: Parsed command with its arguments.
+    """
+    name: str = (command.args or "").strip().lower()
+    if not name:
+        subscriber: Subscriber | None = await get_subscriber(message.chat.id)
+        if subscriber is None:
+            await message.answer("Subscribe with /start first, then choose your sections.")
+            return
+        await message.answer(format_sections(subscriber.sections))
+        return
+    if name not in SECTION_BITS:
+        await message.answer(f"Usage: /settings [{'|'.join(SECTION_BITS)}]")
+        return
+
+    sections: int | None = await toggle_subscriber_section(message.chat.id, SECTION_BITS[name])
+    if sections is None:
+        await message.answer("Subscribe with /start first, then choose your sections.")
+    else:
+        await message.answer(format_sections(sections))
+
+
+def format_sections(sections: int | None) -> str:
+    """
+    Describe which message sections are enabled.
+
+    :param sections: Section bitmask; None means the default sections.
+    :return: One line per section with its state.
+    """
+    sections = DEFAULT_SECTIONS if sections is None else sections
+    lines: list[str] = [f"{'✅' if sections & bit else '❌'} {name}" for name, bit in SECTION_BITS.items()]
+    return "Message sections (toggle with /settings <section>):\n" + "\n".join(lines)
+
+
+@dp.message(Command("trace"))
+async def trace_command(message: Message, command: CommandObject) -> None:
+    """
+    Handle the admin /trace command: record the next broadcast as a Chrome trace.
+
+    "/trace profile" also takes a sampling CPU profile of the broadcast window.
+    The request is a flag file in TRACE_DIR, so broadcast worker processes pick it up too.
+    Chats not listed in ADMIN_CHAT_IDS are ignored.
+
+    :param message: Incoming Telegram message object.
+    :param command: Parsed command with its arguments.
+    """
+    if message.chat.id not in ADMIN_CHAT_IDS:
+        return
+    profile: bool = (command.args or "").strip().lower() == "profile"
+    await asyncio.to_thread(tracer.arm, profile)
+    await message.answer(f"The next broadcast will be traced{' with a CPU profile' if profile else ''}.")
 
 
 @dp.message(Command("help"))
@@ -98,71 +452,306 @@ async def help_command(message: Message) -> None:
     await message.answer(HELP_MESSAGE)
 
 
-async def restore_scheduled_jobs() -> None:
+def active_delivery_dates() -> list[str]:
+    """
+    Return the local delivery dates that may still have pending messages.
+
+    Subscribers' local dates differ from the UTC date by at most one day.
+
+    :return: Dates in YYYY-MM-DD format.
     """
-    Restore scheduled jobs for all subscribers from the database.
+    today = datetime.now(timezone.utc).date()
+    return [(today + timedelta(days=offset)).isoformat() for offset in (-1, 0, 1)]
 
-    Iterates through all subscribed chat IDs and adds missing jobs to the scheduler.
-    This ensures jobs persist across bot restarts.
+
+async def send_pending_deliveries(delivery_date: str, partition: Partition | None = None) -> BroadcastResult:
+    """
+    Send the morning message to every chat pending in the delivery log for the date.
+
+    Only chats still pending are sent to, so re-running after a restart resumes
+    where it stopped instead of messaging everyone again. Reports are normally prewarmed
+    by the wheel ahead of the slot; any location still cold is built once before the fan-out,
+    so the broadcast itself only performs Telegram sends. Subscriber thresholds are loaded
+    once per broadcast and each verdict is a table lookup, not a per-chat report evaluation.
+    Sends draw on the process-wide send_bucket, so broadcasts of different dates or partitions
+    running at the same time stay within the bot's rate limit together.
+    A sampled or /trace-armed broadcast is recorded as a Chrome trace in TRACE_DIR.
+
+    :param delivery_date: Local delivery date in YYYY-MM-DD format.
+    :param partition: Optional (k, i) partition: only chats with chat_id mod k == i.
+    :return: Broadcast totals and duration.
     """
-    chat_ids: list[int] = get_all_subscribers()
-    restored_count: int = 0
+    from python_scripts.message import is_report_warm
+
+    name: str = f"broadcast-{delivery_date}" + (f"-p{partition[1]}of{partition[0]}" if partition else "")
+    async with traced(name):
+        cells: list[str | None] = await get_pending_cells(delivery_date, partition)
+        late: list[str | None] = [cell for cell in cells if not is_report_warm(cell)]
+        wheel.record_warmth(delivery_date, warm=len(cells) - len(late), late=len(late))
+        with span("prewarm", cells=len(late)):
+            await prewarm_reports(late)
+
+        thresholds: ThresholdTable = await load_thresholds()
+
+        async def deliver(subscriber: Subscriber) -> None:
+            await deliver_morning_message(subscriber, thresholds)
 
-    for chat_id in chat_ids:
-        job_id: str = f"job_{chat_id}"
-        if not scheduler.get_job(job_id):
-            scheduler.add_job(
-                send_morning_message,
-                trigger="cron",
-                hour=7,
-                minute=0,
-                timezone=timezone,
-                args=[chat_id],
-                id=job_id,
-                replace_existing=True,
+        dispatcher = BroadcastDispatcher(deliver, outbox=DeliveryOutbox(), global_bucket=send_bucket)
+        with span("broadcast", delivery_date=delivery_date):
+            result: BroadcastResult = await dispatcher.run(
+                aiter_pending_recipients(delivery_date, partition=partition)
             )
-            restored_count += 1
 
-    print(f"Restored {restored_count} scheduled jobs from database.")
+        print(f"Delivery stats for {delivery_date}: {await asyncio.to_thread(get_delivery_stats, delivery_date)}")
+        return result
 
 
-@dp.message(Command("test"))
+async def prewarm_reports(cells: list[str | None]) -> None:
+    """
+    Build and cache the report for every given location.
+
+    Weather APIs are called once per geo cell and NOAA data once overall.
+
+    :param cells: Geo cells to prepare reports for; None is the default location.
+    """
+    from python_scripts.message import get_cached_report
+
+    semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+
+    async def prewarm(cell: str | None) -> None:
+        async with semaphore:
+            await get_cached_report(cell)
+
+    await asyncio.gather(*(prewarm(cell) for cell in cells))
+
+
+wheel: TimingWheel = TimingWheel(send_pending_deliveries, prewarm=prewarm_reports)
+
+
+def get_scheduler() -> "AsyncIOScheduler":
+    """
+    Return the APScheduler instance, creating it on first call.
+
+    Sharded deployments drive the wheel from the worker processes, so the process that only
+    handles updates never imports APScheduler.
+
+    :return: Scheduler in the bot's default timezone.
+    """
+    global scheduler
+    if scheduler is None:
+        import pytz
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+        scheduler = AsyncIOScheduler(timezone=pytz.timezone(TIMEZONE))
+    return scheduler
+
+
+def schedule_delivery_wheel() -> None:
+    """
+    Register the minute tick of the delivery timing wheel in the scheduler.
+
+    One job serves all subscribers whatever their delivery time and timezone;
+    each tick only touches subscribers whose slot has come. Broadcasts run as background
+    tasks of the wheel, so a long broadcast does not hold back the following ticks.
+    """
+    get_scheduler().add_job(
+        wheel.tick,
+        trigger="cron",
+        second=0,
+        id=WHEEL_JOB_ID,
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+
+
+@dp.message(Command("test", "report"))
 async def test_message(message: Message) -> None:
     """
-    Handle the /test command: send a test morning message immediately.
+    Handle the /test and /report commands: send the morning message immediately.
 
-    Allows testing the bot functionality by sending a morning message
-    directly to the chat without waiting for the scheduled time.
-    Sends a confirmation message after the main message.
+    The report is served from the shared report cache, so concurrent requests share one
+    in-flight fetch and upstream APIs are queried at most once per cache window.
+    Each chat may ask at most once per ON_DEMAND_COOLDOWN seconds. If the report is not ready
+    within ON_DEMAND_BUDGET seconds, the user is told it is on its way and it is sent when ready.
 
     :param message: Incoming Telegram message object.
     """
-    await send_morning_message(message.chat.id)
+    wait: float = on_demand_cooldown.check(message.chat.id)
+    if wait:
+        await message.answer(f"Please wait {math.ceil(wait)} s before requesting another report.")
+        return
+
+    task: asyncio.Task = asyncio.create_task(send_morning_message(message.chat.id))
+    try:
+        await asyncio.wait_for(asyncio.shield(task), ON_DEMAND_BUDGET)
+    except asyncio.TimeoutError:
+        on_demand_tasks.add(task)
+        task.add_done_callback(on_demand_tasks.discard)
+        await message.answer("The report is being prepared and will arrive shortly.")
+        return
     await message.answer("Test message sent.")
 
 
-async def main() -> None:
+async def run_webhook(startup: StartupTimer | None = None) -> None:
     """
-    Main entry point for the Telegram bot application.
+    Receive updates through the embedded webhook server until cancelled.
 
-    Initializes the database, starts the APScheduler, restores scheduled jobs,
-    and starts polling for Telegram updates.
-    Does not return control during normal operation.
+    Registers WEBHOOK_URL with a secret token, so requests without it are rejected.
+    Updates are queued and handled by WEBHOOK_WORKERS concurrent workers.
+
+    :param startup: Startup timer of the process, marked ready once the webhook is registered.
+    """
+    from python_scripts.webhook import WebhookServer
+
+    server = WebhookServer(
+        dp,
+        bot,
+        getenv("WEBHOOK_PATH", WEBHOOK_PATH),
+        WEBHOOK_SECRET or secrets.token_urlsafe(32),
+        workers=int(getenv("WEBHOOK_WORKERS", str(WEBHOOK_WORKERS))),
+    )
+    await server.start(getenv("WEBHOOK_HOST", WEBHOOK_HOST), int(getenv("WEBHOOK_PORT", str(WEBHOOK_PORT))))
+    try:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + server.path,
+            secret_token=server.secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=True,
+        )
+        if startup is not None:
+            startup.mark("set_webhook")
+            startup.ready()
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+async def start_metrics(port: int) -> MetricsServer | None:
+    """
+    Start the local Prometheus endpoint of this process.
+
+    :param port: Port to listen on; 0 disables the endpoint.
+    :return: Started server or None if disabled.
     """
+    if not port:
+        return None
+    server = MetricsServer()
+    await server.start(getenv("METRICS_HOST", METRICS_HOST), port)
+    return server
+
+
+async def worker_main(metrics_port: int = METRICS_PORT_ENV) -> None:
+    """
+    Entry point of a broadcast worker process.
+
+    The worker does not receive Telegram updates. It competes for leases in the shared SQLite file:
+    the leader moves due subscribers into the delivery log and every worker sends the pending
+    deliveries of the chat_id partitions it holds. Partitions of a dead worker are taken over
+    once its leases expire.
+    All broadcasts of the worker share send_bucket, throttled to the worker's share of the bot-wide rate.
+
+    :param metrics_port: Port of the worker's metrics endpoint; 0 disables it.
+    """
+    if SHARDS < 1:
+        raise ValueError("A broadcast worker needs SHARDS > 0 partitions")
+    startup = StartupTimer()
     init_db()
+    startup.mark("init_db")
+    metrics: MetricsServer | None = await start_metrics(metrics_port)
+    startup.mark("metrics")
+    startup.ready()
+    leases = LeaseManager(f"{socket.gethostname()}-{os.getpid()}", SHARDS)
+    try:
+        await ShardWorker(leases, send_pending_deliveries, wheel, active_delivery_dates, bucket=send_bucket).run()
+    finally:
+        if metrics is not None:
+            await metrics.stop()
+        await bot.session.close()
+        get_database().close()
+
+
+def run_worker_process(index: int) -> None:
+    """
+    Run a broadcast worker in a child process.
 
-    if not scheduler.running:
-        scheduler.start()
+    :param index: Worker number; its metrics endpoint listens on METRICS_PORT + 1 + index.
+    """
+    asyncio.run(worker_main(METRICS_PORT_ENV + 1 + index if METRICS_PORT_ENV else 0))
 
-    await restore_scheduled_jobs()
 
-    await bot.delete_webhook(drop_pending_updates=True)
+def spawn_workers() -> list[multiprocessing.Process]:
+    """
+    Start SHARDS broadcast worker processes.
+
+    :return: Started processes.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes: list[multiprocessing.Process] = [
+        context.Process(target=run_worker_process, args=(i,), name=f"jopae-worker-{i}", daemon=True)
+        for i in range(SHARDS)
+    ]
+    for process in processes:
+        process.start()
+    return processes
+
+
+async def main() -> None:
+    """
+    Main entry point for the Telegram bot application.
+
+    Initializes the database, starts the APScheduler with the delivery wheel tick
+    and starts receiving Telegram updates by long polling or, with BOT_MODE=webhook,
+    through the embedded webhook server. Interrupted deliveries are resumed and the report
+    pipeline is imported in the background, so updates are handled as soon as Telegram is reached.
+    With SHARDS > 0 broadcasts are left to the worker processes and this process only handles updates.
+    Metrics are served on METRICS_PORT unless it is 0.
+    The startup time breakdown is printed and exported as jopae_startup_seconds.
+    Does not return control during normal operation.
+    """
+    startup = StartupTimer()
+    init_db()
+    startup.mark("init_db")
+    metrics: MetricsServer | None = await start_metrics(METRICS_PORT_ENV)
+    startup.mark("metrics")
+
+    background: list[asyncio.Task] = []
+    if not SHARDS:
+        wheel_scheduler: "AsyncIOScheduler" = get_scheduler()
+        if not wheel_scheduler.running:
+            wheel_scheduler.start()
+        schedule_delivery_wheel()
+        startup.mark("scheduler")
+        background.append(asyncio.create_task(startup.measure("resume", wheel.resume(active_delivery_dates()))))
+    background.append(asyncio.create_task(
+        startup.measure("report_pipeline", asyncio.to_thread(import_module, REPORT_PIPELINE))
+    ))
 
     try:
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(startup)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            startup.mark("delete_webhook")
+            startup.ready()
+            await dp.start_polling(bot)
     finally:
+        for task in background:
+            task.cancel()
+        if metrics is not None:
+            await metrics.stop()
         await bot.close()
+        get_database().close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if ROLE == "worker":
+        asyncio.run(worker_main())
+    else:
+        workers: list[multiprocessing.Process] = spawn_workers()
+        try:
+            asyncio.run(main())
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
@@ -1,12 +1,42 @@
-from python_scripts.config.types import JopaeReport
-from python_scripts.config.consts import PRESSURE_THRESHOLD
+import asyncio
+from functools import lru_cache
+
+from python_scripts.config.types import JopaeReport, CellReport, ReportMetrics
+from python_scripts.config.consts import (
+    PRESSURE_THRESHOLD,
+    PRESSURE_DROP_ALERT,
+    VERDICT_WEATHER,
+    VERDICT_POLLEN,
+    VERDICT_SOLAR,
+    VERDICT_GEOMAGNETIC,
+    VERDICT_ALL,
+    DEFAULT_SECTIONS
+)
+from python_scripts.thresholds import ThresholdTable, default_thresholds
+from python_scripts.metrics import RENDER_LATENCY
+from python_scripts.report_cache import ReportCache
+from python_scripts.tracing import span
+from python_scripts.interpretations import interpret_pressure_trend, interpret_flux_trend
+from python_scripts.geo import cell_center
+from python_scripts.chart import render_daily_chart
 from python_scripts.etl import (
+    pressure_location,
+    fetch_local_async,
+    fetch_global_async,
     get_weather_info,
     get_pollen_info,
     get_solar_flare_info,
     get_geomagnetic_info
 )
 
+# Причины отвала жопы в порядке секций сообщения (биты секций совпадают с битами вердикта)
+VERDICT_REASONS = (
+    (VERDICT_WEATHER, "погоды"),
+    (VERDICT_POLLEN, "пыльцы"),
+    (VERDICT_SOLAR, "солнечных вспышек"),
+    (VERDICT_GEOMAGNETIC, "магнитных бурь"),
+)
+
 
 def get_tg_jopae_message() -> str:
     """
@@ -20,36 +50,227 @@ def get_tg_jopae_message() -> str:
     solar_flare_data = get_solar_flare_info()
     geomagnetic_data = get_geomagnetic_info()
 
-    weather = weather_message(weather_data)
-    pollen = pollen_message(pollen_data)
-    solar = solar_flare_message(solar_flare_data)
-    geomagnetic = geomagnetic_message(geomagnetic_data)
-
-    jopae_list = [weather.jopae, pollen.jopae, solar.jopae, geomagnetic.jopae]
-    reasons = []
-
-    if weather.jopae:
-        reasons.append("погоды")
-    if pollen.jopae:
-        reasons.append("пыльцы")
-    if solar.jopae:
-        reasons.append("солнечных вспышек")
-    if geomagnetic.jopae:
-        reasons.append("магнитных бурь")
-
-    if all(jopae_list):
-        message = "Сегодня будет тотальный отвал жопы. Можешь даже не вставать\n\n"
-    elif any(jopae_list):
-        message = f"Сегодня жопа отпадёт из-за {', '.join(reasons)}\n\n"
-    else:
-        message = "Сегодня жопа будет на месте\n\n"
+    return compose_jopae_message(weather_data, pollen_data, solar_flare_data, geomagnetic_data)
+
+
+async def get_tg_jopae_message_async(cell: str | None = None) -> str:
+    """
+    Асинхронный вариант get_tg_jopae_message с порогами по умолчанию.
+    Args:
+        cell: географическая ячейка подписчика; None - местоположение по умолчанию
+    Returns:
+        str: текст сообщения
+    """
+    report = await build_report_async(cell)
+    return render_report(report, default_thresholds.verdict(0, report.metrics))
+
+
+async def build_report_async(cell: str | None = None) -> CellReport:
+    """
+    Собирает отчёт для ячейки: все источники опрашиваются параллельно с дедлайнами,
+    поэтому медленный источник не блокирует бота и не задерживает остальные секции.
+    Погода и пыльца запрашиваются для ячейки, глобальные данные NOAA берутся из общего кэша
+    и загружаются один раз на все ячейки.
+    Args:
+        cell: географическая ячейка подписчика; None - местоположение по умолчанию
+    Returns:
+        CellReport: текст секций и показатели для вердикта
+    """
+    local_data, global_data = await asyncio.gather(
+        fetch_local_async(*cell_center(cell)) if cell is not None else fetch_local_async(),
+        report_cache.get("global", fetch_global_async),
+    )
+    return compose_report(
+        local_data["weather"], local_data["pollen"], global_data["solar_flare"], global_data["geomagnetic"]
+    )
+
+
+def compose_jopae_message(
+    weather_data: dict | str,
+    pollen_data: dict | str,
+    solar_flare_data: dict | str,
+    geomagnetic_data: dict | str,
+) -> str:
+    """
+    Собирает текст сообщения из уже полученных данных источников с порогами по умолчанию.
+    Args:
+        weather_data, pollen_data, solar_flare_data, geomagnetic_data: данные от API или строки с ошибкой
+    Returns:
+        str: текст сообщения
+    """
+    report = compose_report(weather_data, pollen_data, solar_flare_data, geomagnetic_data)
+    return render_report(report, default_thresholds.verdict(0, report.metrics))
+
+
+def compose_report(
+    weather_data: dict | str,
+    pollen_data: dict | str,
+    solar_flare_data: dict | str,
+    geomagnetic_data: dict | str,
+) -> CellReport:
+    """
+    Собирает секции отчёта и показатели, по которым вердикт вычисляется для каждого набора порогов.
+    Секции не зависят от подписчика, поэтому собираются один раз на ячейку;
+    какие из них войдут в сообщение, решает маска секций подписчика при выводе.
+    Args:
+        weather_data, pollen_data, solar_flare_data, geomagnetic_data: данные от API или строки с ошибкой
+    Returns:
+        CellReport: текст секций и показатели для вердикта
+    """
+    with RENDER_LATENCY.labels("compose").time(), span("render", stage="compose"):
+        weather = weather_message(weather_data)
+        pollen = pollen_message(pollen_data)
+        solar = solar_flare_message(solar_flare_data)
+        geomagnetic = geomagnetic_message(geomagnetic_data)
 
-    message += weather.report
-    # message += pollen.report
-    message += solar.report
-    message += geomagnetic.report
+        return CellReport(
+            (weather.report, pollen.report, solar.report, geomagnetic.report),
+            report_metrics(weather_data, pollen, solar_flare_data, geomagnetic_data)
+        )
 
-    return message
+
+def report_metrics(
+    weather_data: dict | str,
+    pollen: JopaeReport,
+    solar_flare_data: dict | str,
+    geomagnetic_data: dict | str,
+) -> ReportMetrics:
+    """
+    Извлекает из данных источников показатели, сравниваемые с порогами подписчиков.
+    Резкое падение давления, пыльца и неизвестный уровень шкалы G от порогов не зависят
+    и попадают в постоянные биты вердикта.
+    Returns:
+        ReportMetrics: показатели отчёта
+    """
+    metrics = {}
+    fixed = VERDICT_POLLEN if pollen.jopae else 0
+
+    if isinstance(weather_data, dict):
+        metrics['pressure'] = weather_data['pressure']
+        pressure_change = weather_data.get('pressure_change')
+        if pressure_change is not None and pressure_change <= -PRESSURE_DROP_ALERT:
+            fixed |= VERDICT_WEATHER
+    if isinstance(solar_flare_data, dict):
+        metrics['flux'] = float(solar_flare_data['value'])
+    if isinstance(geomagnetic_data, dict):
+        try:
+            metrics['g_scale'] = int(geomagnetic_data['scale'])
+        except (KeyError, TypeError, ValueError):
+            if geomagnetic_data['prediction'] != "Магнитных бурь нет":
+                fixed |= VERDICT_GEOMAGNETIC
+
+    return ReportMetrics(fixed=fixed, **metrics)
+
+
+@lru_cache(maxsize=None)
+def verdict_header(verdict: int, sections: int = VERDICT_ALL) -> str:
+    """
+    Строка вердикта по битовой маске причин отвала жопы.
+    Args:
+        verdict: сочетание битов VERDICT_*, уже ограниченное секциями подписчика
+        sections: секции, которые подписчик получает
+    Returns:
+        str: первая строка сообщения
+    """
+    # Тотальный отвал - когда сработали все секции подписчика, и их больше одной
+    if verdict == sections and verdict & (verdict - 1):
+        return "Сегодня будет тотальный отвал жопы. Можешь даже не вставать\n\n"
+    reasons = [reason for bit, reason in VERDICT_REASONS if verdict & bit]
+    if reasons:
+        return f"Сегодня жопа отпадёт из-за {', '.join(reasons)}\n\n"
+    return "Сегодня жопа будет на месте\n\n"
+
+
+def render_report(report: CellReport, verdict: int, sections: int | None = None) -> str:
+    """
+    Текст сообщения: строка вердикта и включённые подписчиком секции отчёта ячейки.
+    Каждый вариант (маска секций, вердикт) собирается один раз на отчёт и затем
+    переиспользуется всеми подписчиками с тем же сочетанием, поэтому стоимость рассылки
+    зависит от числа вариантов, а не от числа подписчиков.
+    Args:
+        report: отчёт ячейки
+        verdict: маска вердикта подписчика
+        sections: маска секций подписчика; None - секции по умолчанию
+    Returns:
+        str: текст сообщения
+    """
+    sections = DEFAULT_SECTIONS if sections is None else sections
+    key = (sections, verdict & sections)
+    text = report.variants.get(key)
+    if text is None:
+        with RENDER_LATENCY.labels("variant").time(), span("render", stage="variant"):
+            text = report.variants[key] = verdict_header(key[1], sections) + "".join(
+                section for (bit, _), section in zip(VERDICT_REASONS, report.sections) if sections & bit
+            )
+    return text
+
+
+report_cache = ReportCache()
+
+
+async def get_cached_report(cell: str | None = None) -> CellReport:
+    """
+    Возвращает отчёт для географической ячейки из общего кэша. Отчёт собирается
+    один раз на ячейку за время жизни кэша, источники опрашиваются параллельно, не блокируя event loop.
+    Args:
+        cell: географическая ячейка подписчика; None - местоположение по умолчанию
+    Returns:
+        CellReport: текст секций и показатели для вердикта
+    """
+    return await report_cache.get(("report", cell), lambda: build_report_async(cell))
+
+
+async def get_cached_jopae_message(
+    cell: str | None = None,
+    chat_id: int = 0,
+    thresholds: ThresholdTable = default_thresholds,
+    sections: int | None = None,
+) -> str:
+    """
+    Возвращает утреннее сообщение подписчику: отчёт ячейки из общего кэша, вердикт по его порогам
+    и выбранные им секции.
+    Args:
+        cell: географическая ячейка подписчика; None - местоположение по умолчанию
+        chat_id: идентификатор чата, по которому выбираются пороги
+        thresholds: пороги подписчиков, загруженные на рассылку
+        sections: маска секций подписчика; None - секции по умолчанию
+    Returns:
+        str: текст сообщения
+    """
+    report = await get_cached_report(cell)
+    return render_report(report, thresholds.verdict(chat_id, report.metrics), sections)
+
+
+async def build_chart(cell: str | None = None) -> bytes:
+    """
+    Рисует утренний график для ячейки: давление по локальной истории, поток 10.7 см за 30 дней
+    и прогноз шкалы G из общих данных NOAA. Рисование идёт вне event loop.
+    Args:
+        cell: географическая ячейка подписчика; None - местоположение по умолчанию
+    Returns:
+        bytes: PNG
+    """
+    global_data = await report_cache.get("global", fetch_global_async)
+    geomagnetic = global_data["geomagnetic"]
+    forecast = geomagnetic.get('forecast', []) if isinstance(geomagnetic, dict) else []
+    location = pressure_location(*cell_center(cell)) if cell is not None else pressure_location()
+    return await asyncio.to_thread(_render_chart, location, forecast)
+
+
+def _render_chart(location: str, forecast: list[int | None]) -> bytes:
+    with RENDER_LATENCY.labels("chart").time(), span("render", stage="chart"):
+        return render_daily_chart(location, forecast)
+
+
+def is_report_warm(cell: str | None) -> bool:
+    """
+    Проверяет, собран ли уже отчёт для ячейки, т.е. обойдётся ли отправка без запросов к API.
+    Args:
+        cell: географическая ячейка; None - местоположение по умолчанию
+    Returns:
+        bool: True, если отчёт есть в кэше и не истёк
+    """
+    return report_cache.is_fresh(("report", cell))
 
 
 def weather_message(data: dict | str) -> JopaeReport:
@@ -63,8 +284,12 @@ def weather_message(data: dict | str) -> JopaeReport:
         feels_like = data['feels_like']
         pressure = data['pressure']
         wind = data['wind']
-        jopae = pressure < PRESSURE_THRESHOLD
+        pressure_change = data.get('pressure_change')
+        sharp_drop = pressure_change is not None and pressure_change <= -PRESSURE_DROP_ALERT
+        jopae = pressure < PRESSURE_THRESHOLD or sharp_drop
         report = f"За окном {weather_main}\nПо ощущениям {feels_like} градусов\n{wind}\nДавление {pressure} мм.рт.ст.\n"
+        report += trend_line(interpret_pressure_trend(pressure_change))
+        report += stale_note(data)
     else:
         jopae = False
         report = data + "\n"
@@ -97,7 +322,7 @@ def pollen_message(data: dict | str) -> JopaeReport:
             jopae = False
             report = ["Риска аллергии нет"]
 
-        report = "".join(report).rstrip(", ") + "\n"
+        report = "".join(report).rstrip(", ") + "\n" + stale_note(data)
     else:
         jopae = False
         report = data + "\n"
@@ -115,6 +340,7 @@ def solar_flare_message(data: dict | str) -> JopaeReport:
         interpretation = data['interpretation']
         jopae = interpretation != "Влияние на здоровье нет"
         report = f"Вспышки на Солнце: {flux_value} SFU\n{interpretation} \n"
+        report += trend_line(interpret_flux_trend(data.get('rising_days', 0))) + stale_note(data)
     else:
         jopae = False
         report = data + "\n"
@@ -130,8 +356,28 @@ def geomagnetic_message(data: dict | str) -> JopaeReport:
     if isinstance(data, dict):
         prediction = data['prediction']
         jopae = prediction != "Магнитных бурь нет"
-        report = prediction + "\n"
+        report = prediction + "\n" + stale_note(data)
     else:
         jopae = False
         report = data + "\n"
     return JopaeReport(jopae, report)
+
+
+def stale_note(data: dict) -> str:
+    """
+    Пометка для секции, собранной из последних удачных данных, пока источник недоступен.
+    Args: data (dict): данные источника; ключ 'age' - возраст данных в секундах
+    Returns: str: строка с возрастом данных или пустая строка для свежих данных
+    """
+    age = data.get('age')
+    if age is None:
+        return ""
+    hours, minutes = divmod(int(age // 60), 60)
+    if hours:
+        return f"(данные {hours} ч {minutes} мин назад, источник недоступен)\n"
+    return f"(данные {minutes} мин назад, источник недоступен)\n"
+
+
+def trend_line(trend: str | None) -> str:
+    """Строка тренда по локальной истории наблюдений или пустая строка, если тренда нет."""
+    return f"{trend}\n" if trend else ""
@@ -0,0 +1,321 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from python_scripts.config.consts import (
+    METRICS_PATH,
+    METRICS_LATENCY_BUCKETS,
+    METRICS_RENDER_BUCKETS,
+    METRICS_BROADCAST_BUCKETS
+)
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+# Тип содержимого текстового формата Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Value:
+    """Значение счётчика или датчика для одного набора меток."""
+
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.function: Callable[[], float] | None = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Значение будет вычисляться функцией в момент выгрузки (например, длина очереди)."""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class HistogramValue:
+    """Гистограмма для одного набора меток: счётчики корзин, сумма и число наблюдений."""
+
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        # bisect_left даёт первую границу >= value, т.е. корзину le="граница"
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> "Timer":
+        """Контекстный менеджер, записывающий длительность блока в секундах."""
+        return Timer(self)
+
+    def snapshot(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Timer:
+    __slots__ = ("histogram", "_started")
+
+    def __init__(self, histogram: HistogramValue) -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> "Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.histogram.observe(time.perf_counter() - self._started)
+
+
+class Metric:
+    """
+    Метрика с необязательными метками. Значения для каждого сочетания меток создаются
+    при первом обращении; на горячем пути стоит один раз получить их через labels()
+    и дальше обновлять напрямую, тогда запись - это одно сложение под неоспариваемой блокировкой.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        registry: "Registry | None" = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self._children: dict[tuple[str, ...], Value | HistogramValue] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values: object):
+        """
+        Значение метрики для сочетания меток.
+        Args:
+            values: значения меток в порядке их объявления
+        Returns:
+            Value | HistogramValue: значение, которое можно обновлять
+        """
+        key = tuple(map(str, values))
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> Value | HistogramValue:
+        return Value()
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        """Пары (имя, метки, значение) для выгрузки."""
+        for key, child in list(self._children.items()):
+            yield self.name, dict(zip(self.label_names, key)), child.get()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = METRICS_LATENCY_BUCKETS,
+        registry: "Registry | None" = None,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labels, registry)
+
+    def _new_child(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> Timer:
+        return self.labels().time()
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.label_names, key))
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    """Набор метрик процесса с выгрузкой в текстовом формате Prometheus."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """
+        Выгружает все метрики.
+        Returns:
+            str: текст в формате Prometheus 0.0.4
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    pairs = ",".join(f'{label}="{_escape(text)}"' for label, text in labels.items())
+                    lines.append(f"{name}{{{pairs}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class MetricsServer:
+    """
+    Локальный HTTP-сервер, отдающий метрики процесса по GET METRICS_PATH.
+    aiohttp.web импортируется только при запуске сервера: процессы с METRICS_PORT = 0 за него не платят.
+    """
+
+    def __init__(self, registry: Registry | None = None, path: str = METRICS_PATH) -> None:
+        self.registry = registry or REGISTRY
+        self.path = path
+        self._runner: "web.AppRunner | None" = None
+
+    async def handle(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(body=self.registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self, host: str, port: int) -> None:
+        """
+        Запускает сервер.
+        Args:
+            host: адрес, на котором слушать
+            port: порт
+        """
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+REGISTRY = Registry()
+
+# Внешние источники данных
+SOURCE_LATENCY = Histogram(
+    "jopae_source_fetch_seconds", "Time to get data of a report source, including retries and cache", ("source",)
+)
+SOURCE_RESULTS = Counter(
+    "jopae_source_fetch_total", "Report source fetches by result (ok, error, timeout, breaker_open)", ("source", "result")
+)
+HTTP_REQUEST_LATENCY = Histogram(
+    "jopae_http_request_seconds", "Latency of a single upstream HTTP attempt", ("source",)
+)
+HTTP_CACHE_RESULTS = Counter(
+    "jopae_http_cache_total", "Upstream response cache lookups by result (hit, stale, miss)", ("source", "result")
+)
+REPORT_CACHE_RESULTS = Counter(
+    "jopae_report_cache_total", "Report cache lookups by result (hit, miss, coalesced)", ("cache", "result")
+)
+
+# Сборка сообщений
+RENDER_LATENCY = Histogram(
+    "jopae_render_seconds", "Time to compose report sections, render a message variant or draw the chart",
+    ("stage",), buckets=METRICS_RENDER_BUCKETS
+)
+
+# Рассылка
+TELEGRAM_SENDS = Counter(
+    "jopae_telegram_sends_total", "Broadcast send attempts by outcome (sent, dead, rate_limited, transient, failed)",
+    ("outcome",)
+)
+TELEGRAM_SEND_LATENCY = Histogram("jopae_telegram_send_seconds", "Time to deliver one broadcast message")
+BROADCAST_DURATION = Histogram(
+    "jopae_broadcast_duration_seconds", "Duration of a broadcast including retries", buckets=METRICS_BROADCAST_BUCKETS
+)
+BROADCAST_IN_FLIGHT = Gauge("jopae_broadcast_in_flight", "Broadcast messages being sent right now")
+BROADCAST_RETRY_QUEUE = Gauge("jopae_broadcast_retry_queue", "Chats waiting for the next broadcast retry pass")
+WEBHOOK_QUEUE = Gauge("jopae_webhook_queue", "Telegram updates waiting in the webhook queue")
+
+# Запуск процесса
+STARTUP_SECONDS = Gauge(
+    "jopae_startup_seconds", "Time spent in each startup phase of the process (imports, init_db, ..., ready)", ("phase",)
+)
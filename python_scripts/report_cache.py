@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from python_scripts.metrics import REPORT_CACHE_RESULTS
+from python_scripts.config.consts import REPORT_CACHE_TTL
+
+
+class ReportCache:
+    """
+    Общий кэш готовых отчётов с TTL и защитой от параллельной сборки (single-flight).
+    Первый вызов собирает значение, параллельные вызовы ждут его же результата,
+    последующие получают закэшированное значение до истечения TTL.
+    """
+
+    def __init__(self, ttl: float = REPORT_CACHE_TTL, name: str = "report") -> None:
+        """
+        Args:
+            ttl: время жизни значения, секунды
+            name: имя кэша в метриках
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._hit_metric = REPORT_CACHE_RESULTS.labels(name, "hit")
+        self._miss_metric = REPORT_CACHE_RESULTS.labels(name, "miss")
+        self._coalesced_metric = REPORT_CACHE_RESULTS.labels(name, "coalesced")
+        self._entries: dict[Hashable, tuple[float, Any]] = {}
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, builder: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Возвращает значение по ключу, при необходимости собирая его ровно один раз.
+        Args:
+            key: ключ кэша
+            builder: корутинная функция, собирающая значение при промахе
+        Returns:
+            Any: закэшированное или только что собранное значение
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            self._hit_metric.inc()
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            self._coalesced_metric.inc()
+        else:
+            self.misses += 1
+            self._miss_metric.inc()
+            task = asyncio.ensure_future(builder())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._store(key, t))
+        # shield: отмена одного ожидающего не должна отменять сборку для остальных
+        return await asyncio.shield(task)
+
+    def _store(self, key: Hashable, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, task.result())
+
+    def is_fresh(self, key: Hashable) -> bool:
+        """Проверяет, что по ключу есть не истёкшее значение (без учёта счётчиков)."""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """Сбрасывает одну запись кэша или весь кэш целиком."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики попаданий, промахов и ожиданий уже идущей сборки."""
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
@@ -0,0 +1,220 @@
+import asyncio
+import math
+import sqlite3
+import time
+from typing import Awaitable, Callable, Iterable
+
+from python_scripts.db import get_database
+from python_scripts.broadcast import TimingWheel, TokenBucket
+from python_scripts.delivery_schedule import slot_of
+from python_scripts.subscriptions import Partition, materialize_due_deliveries, get_pending_cells
+from python_scripts.config.consts import BROADCAST_GLOBAL_RATE, LEASE_TTL, SHARD_POLL_INTERVAL
+
+# Аренда лидера: лидер переносит наступившие доставки в журнал
+LEADER_LEASE = "leader"
+# Аренда раздела рассылки: её владелец отправляет сообщения чатам с chat_id mod k == i
+PARTITION_LEASE = "partition:{}"
+# Пульс воркера: по числу живых пульсов считается справедливая доля разделов
+MEMBER_LEASE = "member:{}"
+
+
+class LeaseManager:
+    """
+    Аренды в общей базе SQLite для координации процессов-воркеров без внешнего брокера.
+    Аренда - строка таблицы 'leases' с владельцем и сроком действия; захватить её можно,
+    только если она свободна или истекла. Каждый воркер периодически продлевает свои аренды,
+    поэтому аренды умершего воркера истекают через ttl секунд и достаются остальным.
+    Все изменения одного обновления идут в одной транзакции BEGIN IMMEDIATE,
+    так что два процесса не могут захватить одну аренду одновременно.
+    """
+
+    def __init__(self, owner: str, partitions: int, ttl: float = LEASE_TTL) -> None:
+        """
+        Args:
+            owner: уникальный идентификатор воркера (например, хост и pid)
+            partitions: число разделов chat_id
+            ttl: срок действия аренды, секунды
+        """
+        self.owner = owner
+        self.partitions = partitions
+        self.ttl = ttl
+        self.is_leader = False
+        self.owned: frozenset[int] = frozenset()
+        # Число живых воркеров при последнем обновлении (считая этот)
+        self.members = 1
+
+    def refresh(self, now: float | None = None) -> tuple[bool, frozenset[int]]:
+        """
+        Продлевает аренды воркера и захватывает свободные до справедливой доли ceil(k / число воркеров).
+        Лишние разделы (например, после появления нового воркера) отпускаются.
+        Args:
+            now: текущее UNIX-время
+        Returns:
+            tuple[bool, frozenset[int]]: является ли воркер лидером и какими разделами владеет
+        Raises:
+            sqlite3.Error: если произошла ошибка базы данных
+        """
+        now = time.time() if now is None else now
+
+        def update(conn: sqlite3.Connection) -> tuple[bool, frozenset[int]]:
+            conn.execute("DELETE FROM leases WHERE name LIKE 'member:%' AND expires_at < ?", (now,))
+            self._acquire(conn, MEMBER_LEASE.format(self.owner), now)
+            members = conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE name LIKE 'member:%' AND expires_at >= ?", (now,)
+            ).fetchone()[0]
+            self.members = max(members, 1)
+            share = math.ceil(self.partitions / self.members)
+
+            is_leader = self._acquire(conn, LEADER_LEASE, now)
+            owned = [i for i in range(self.partitions) if self._holds(conn, PARTITION_LEASE.format(i), now)]
+            for i in owned[share:]:
+                self._release(conn, PARTITION_LEASE.format(i))
+            owned = [i for i in owned[:share] if self._acquire(conn, PARTITION_LEASE.format(i), now)]
+            for i in range(self.partitions):
+                if len(owned) >= share:
+                    break
+                if i not in owned and self._acquire(conn, PARTITION_LEASE.format(i), now):
+                    owned.append(i)
+            return is_leader, frozenset(owned)
+
+        try:
+            self.is_leader, self.owned = get_database().write(update)
+        except sqlite3.Error as e:
+            raise sqlite3.Error(f"Failed to refresh leases for {self.owner}: {e}") from e
+        return self.is_leader, self.owned
+
+    async def refresh_async(self) -> tuple[bool, frozenset[int]]:
+        """Асинхронный вариант refresh: запись выполняется вне event loop."""
+        return await asyncio.to_thread(self.refresh)
+
+    def release(self) -> None:
+        """
+        Отпускает все аренды воркера, чтобы при штатной остановке разделы перешли к другим сразу.
+        Raises:
+            sqlite3.Error: если произошла ошибка базы данных
+        """
+        try:
+            get_database().write(lambda conn: conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,)))
+        except sqlite3.Error as e:
+            raise sqlite3.Error(f"Failed to release leases for {self.owner}: {e}") from e
+        self.is_leader, self.owned = False, frozenset()
+
+    def _acquire(self, conn: sqlite3.Connection, name: str, now: float) -> bool:
+        cursor = conn.execute(
+            """
+            INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+            """,
+            (name, self.owner, now + self.ttl, now)
+        )
+        return cursor.rowcount > 0
+
+    def _holds(self, conn: sqlite3.Connection, name: str, now: float) -> bool:
+        row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        return row is not None and row[0] == self.owner and row[1] >= now
+
+    def _release(self, conn: sqlite3.Connection, name: str) -> None:
+        conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+
+class ShardWorker:
+    """
+    Воркер рассылки в многопроцессном режиме.
+    Каждые poll секунд продлевает аренды; лидер переносит наступившие доставки в журнал,
+    а каждый воркер рассылает ожидающие доставки своих разделов. Рассылка раздела,
+    аренду которого воркер потерял, останавливается, и раздел дорассылает новый владелец.
+    Отчёты каждый процесс собирает сам и заранее прогревает только ячейки подписчиков своих разделов.
+    Ячейку, подписчики которой попали в разделы разных воркеров, собирает каждый из них: общий
+    дисковый кэш ответов внешних API снижает число повторных запросов, но не исключает их
+    (одновременные промахи кэша, пыльца не кэшируется).
+    Лимит Telegram общий для бота, поэтому все рассылки процесса берут токены из одного ведра bucket,
+    скорость которого - rate, делённая на число живых воркеров. Пока остальные воркеры
+    не заметили нового (не дольше poll секунд), суммарная скорость может превышать rate.
+    """
+
+    def __init__(
+        self,
+        leases: LeaseManager,
+        send: Callable[[str, Partition], Awaitable[object]],
+        wheel: TimingWheel,
+        delivery_dates: Callable[[], Iterable[str]],
+        poll: float = SHARD_POLL_INTERVAL,
+        bucket: TokenBucket | None = None,
+        rate: float = BROADCAST_GLOBAL_RATE,
+    ) -> None:
+        """
+        Args:
+            leases: аренды воркера
+            send: корутина, рассылающая ожидающие доставки за дату в разделе
+            wheel: колесо доставки, используемое для прогрева отчётов
+            delivery_dates: функция, возвращающая даты, за которые могут быть ожидающие доставки
+            poll: период обновления аренд и проверки журнала, секунды
+            bucket: общее ведро скорости отправки рассылок процесса
+            rate: допустимая скорость отправки бота, сообщений в секунду, на все воркеры вместе
+        """
+        self.leases = leases
+        self.send = send
+        self.wheel = wheel
+        self.delivery_dates = delivery_dates
+        self.poll = poll
+        self.bucket = bucket
+        self.rate = rate
+        self._slot: int | None = None
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def run(self) -> None:
+        """Работает до отмены; при отмене останавливает рассылки и отпускает аренды."""
+        try:
+            while True:
+                try:
+                    await self.step()
+                except sqlite3.Error as e:
+                    print(f"Shard worker {self.leases.owner} step failed: {e}")
+                await asyncio.sleep(self.poll)
+        finally:
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            await asyncio.to_thread(self.leases.release)
+
+    async def step(self, now: float | None = None) -> None:
+        """
+        Одна итерация: продление аренд, перенос доставок лидером, запуск рассылки своих разделов.
+        Args:
+            now: текущее UNIX-время
+        """
+        now = time.time() if now is None else now
+        was_owned = self.leases.owned
+        is_leader, owned = await self.leases.refresh_async()
+        if owned != was_owned:
+            print(f"Shard worker {self.leases.owner}: leader={is_leader}, partitions={sorted(owned)}")
+        if self.bucket is not None:
+            self.bucket.set_rate(self.rate / self.leases.members)
+
+        for partition, task in list(self._tasks.items()):
+            if partition not in owned:
+                task.cancel()
+            if task.done():
+                del self._tasks[partition]
+
+        slot = slot_of(now)
+        if slot != self._slot:
+            self._slot = slot
+            if owned:
+                self.wheel.start_prewarm(slot + self.wheel.lead, [(self.leases.partitions, i) for i in owned])
+            if is_leader:
+                await asyncio.to_thread(materialize_due_deliveries, slot)
+
+        for partition in owned:
+            if partition not in self._tasks:
+                self._tasks[partition] = asyncio.create_task(self._send_partition(partition))
+
+    async def _send_partition(self, partition: int) -> None:
+        key: Partition = (self.leases.partitions, partition)
+        try:
+            for delivery_date in self.delivery_dates():
+                if await get_pending_cells(delivery_date, key):
+                    await self.send(delivery_date, key)
+        except Exception as e:
+            print(f"Delivery for partition {partition} failed: {e}")
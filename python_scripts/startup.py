@@ -0,0 +1,88 @@
+import os
+import time
+from typing import Any, Awaitable
+
+from python_scripts.metrics import STARTUP_SECONDS
+
+
+def process_age() -> float | None:
+    """
+    Возвращает, сколько секунд назад запущен процесс: старт интерпретатора и все импорты до вызова.
+    Момент запуска берётся из /proc (Linux).
+    Returns:
+        float | None: возраст процесса или None, если /proc недоступен
+    """
+    try:
+        with open("/proc/self/stat", encoding="ascii") as stat:
+            # Имя процесса в скобках может содержать пробелы, поэтому поля считаются после ')'
+            fields = stat.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", encoding="ascii") as uptime:
+            system_uptime = float(uptime.read().split()[0])
+        return max(system_uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def format_phases(phases: dict[str, float]) -> str:
+    """Фазы запуска одной строкой: 'imports 3.41s, init_db 0.02s, ...'."""
+    return ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phases.items())
+
+
+class StartupTimer:
+    """
+    Разбивка времени запуска процесса по фазам.
+    Первая фаза imports - возраст процесса при создании таймера (интерпретатор и импорты модулей),
+    каждая следующая длится от предыдущей отметки. Когда процесс готов обрабатывать обновления,
+    разбивка печатается одной строкой. Фоновые шаги, которые идут уже после готовности (возобновление
+    доставок, прогрев конвейера отчёта), измеряются отдельно. Все длительности отдаются метрикой
+    jopae_startup_seconds{phase}.
+    """
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+        self.background: dict[str, float] = {}
+        self._last = time.perf_counter()
+        age = process_age()
+        if age is not None:
+            self._record(self.phases, "imports", age)
+
+    def mark(self, phase: str) -> None:
+        """
+        Завершает фазу запуска.
+        Args:
+            phase: имя фазы, закончившейся к этому моменту
+        """
+        now = time.perf_counter()
+        self._record(self.phases, phase, now - self._last)
+        self._last = now
+
+    def ready(self) -> float:
+        """
+        Отмечает готовность процесса и печатает разбивку запуска.
+        Returns:
+            float: время от запуска процесса до готовности, секунды
+        """
+        total = sum(self.phases.values())
+        STARTUP_SECONDS.labels("ready").set(total)
+        print(f"Started in {total:.2f}s: {format_phases(self.phases)}")
+        return total
+
+    async def measure(self, phase: str, step: Awaitable[Any]) -> Any:
+        """
+        Выполняет фоновый шаг запуска и записывает его длительность.
+        Args:
+            phase: имя шага
+            step: корутина или future шага
+        Returns:
+            Any: результат шага
+        """
+        started = time.perf_counter()
+        result = await step
+        self._record(self.background, phase, time.perf_counter() - started)
+        print(f"Startup background: {format_phases(self.background)}")
+        return result
+
+    @staticmethod
+    def _record(phases: dict[str, float], phase: str, seconds: float) -> None:
+        phases[phase] = seconds
+        STARTUP_SECONDS.labels(phase).set(seconds)
@@ -1,32 +1,129 @@
 import sqlite3
-from python_scripts.config.consts import DB_PATH
+import time
+from operator import itemgetter
+from typing import AsyncIterator, Callable, Iterable, Iterator
+
+from python_scripts.db import get_database
+from python_scripts.geo import cell_for
+from python_scripts.thresholds import ThresholdTable
+from python_scripts.delivery_schedule import next_delivery_utc, delivery_date as local_delivery_date
+from python_scripts.config.types import Subscriber
+from python_scripts.config.consts import (
+    DB_PAGE_SIZE,
+    DELIVERY_PENDING,
+    DELIVERY_SENT,
+    DELIVERY_FAILED,
+    DELIVERY_MAX_LATENESS,
+    DEFAULT_SECTIONS
+)
+
+# Раздел подписчиков для распределения рассылки между воркерами: (число разделов, номер раздела)
+Partition = tuple[int, int]
+
+_SUBSCRIBERS_QUERY_BASE = "SELECT chat_id FROM subscribers WHERE chat_id > ?"
+_PENDING_QUERY_BASE = "SELECT chat_id FROM deliveries WHERE delivery_date = ? AND status = ? AND chat_id > ?"
+# Ожидающие доставки вместе с параметрами подписчика; уже отписавшиеся чаты отсекаются JOIN
+_PENDING_RECIPIENTS_QUERY_BASE = (
+    "SELECT chat_id, subscribers.cell, delivery_date, subscribers.sections "
+    "FROM deliveries JOIN subscribers USING (chat_id) "
+    "WHERE delivery_date = ? AND status = ? AND chat_id > ?"
+)
+
+# Колонки, добавленные к 'subscribers' после первой версии схемы
+_SUBSCRIBER_COLUMNS = {
+    "lat": "REAL",
+    "lon": "REAL",
+    "cell": "TEXT",
+    "delivery_time": "TEXT",
+    "tz": "TEXT",
+    "next_delivery_utc": "INTEGER",
+    "pressure_threshold": "REAL",
+    "flux_threshold": "REAL",
+    "g_threshold": "INTEGER",
+    "sections": "INTEGER",
+}
+
+# Колонки пользовательских порогов по названиям из /sensitivity
+_THRESHOLD_COLUMNS = {
+    "pressure": "pressure_threshold",
+    "flux": "flux_threshold",
+    "g": "g_threshold",
+}
 
 
 def init_db() -> None:
     """
-    Инициализирует базу данных SQLite и создает таблицу 'subscribers', если она не существует.
-    Таблица содержит:
+    Инициализирует базу данных SQLite и создает таблицы 'subscribers', 'deliveries' и 'leases',
+    если они не существуют.
+    Таблица 'subscribers' содержит:
         - chat_id (INTEGER PRIMARY KEY): уникальный идентификатор чата Telegram
         - subscribed_at (TIMESTAMP): время подписки, по умолчанию CURRENT_TIMESTAMP
+        - lat, lon (REAL): местоположение подписчика, NULL - местоположение по умолчанию
+        - cell (TEXT): географическая ячейка местоположения (индексируется)
+        - delivery_time (TEXT), tz (TEXT): местное время доставки 'ЧЧ:ММ' и часовой пояс IANA,
+          NULL - значения по умолчанию
+        - next_delivery_utc (INTEGER): UNIX-время следующей доставки (индексируется, слот колеса доставки)
+        - pressure_threshold, flux_threshold (REAL), g_threshold (INTEGER): пороги чувствительности
+          подписчика, NULL - порог по умолчанию
+        - sections (INTEGER): битовая маска секций сообщения, NULL - секции по умолчанию
+    Недостающие колонки добавляются в существующую таблицу при запуске.
+    Таблица 'deliveries' - журнал доставки утренних сообщений:
+        - chat_id, delivery_date (PRIMARY KEY): чат и дата рассылки (YYYY-MM-DD)
+        - status (TEXT): pending, sent или failed
+        - attempts (INTEGER): число попыток доставки
+        - updated_at (TIMESTAMP): время последнего изменения статуса
+    Таблица 'leases' - аренды для координации процессов-воркеров рассылки:
+        - name (TEXT PRIMARY KEY): лидер, раздел chat_id или пульс воркера
+        - owner (TEXT): идентификатор воркера-владельца
+        - expires_at (REAL): UNIX-время окончания аренды
     Raises:
         sqlite3.Error: если произошла ошибка базы данных при подключении или создании таблицы
     """
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
+    def create_tables(conn: sqlite3.Connection) -> None:
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS subscribers (
                 chat_id INTEGER PRIMARY KEY,
                 subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        conn.commit()
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(subscribers)")}
+        for column, column_type in _SUBSCRIBER_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE subscribers ADD COLUMN {column} {column_type}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_subscribers_cell ON subscribers (cell)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_subscribers_next_delivery ON subscribers (next_delivery_utc, chat_id)"
+        )
+        # Подписчики из версий без расписания получают доставку по умолчанию
+        conn.execute(
+            "UPDATE subscribers SET next_delivery_utc = ? WHERE next_delivery_utc IS NULL",
+            (next_delivery_utc(None, None, time.time()),)
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS deliveries (
+                chat_id INTEGER NOT NULL,
+                delivery_date TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (chat_id, delivery_date)
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_deliveries_date_status ON deliveries (delivery_date, status, chat_id)"
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+    try:
+        get_database().write(create_tables)
     except sqlite3.Error as e:
-        raise sqlite3.Error(f"Failed to initialize database or create 'subscribers' table: {e}") from e
-    finally:
-        if conn:
-            conn.close()
+        raise sqlite3.Error(f"Failed to initialize database or create tables: {e}") from e
 
 
 def add_subscriber(chat_id: int) -> None:
@@ -40,42 +137,138 @@ def add_subscriber(chat_id: int) -> None:
         TypeError: если chat_id не является целым числом
         sqlite3.Error: если произошла ошибка базы данных при вставке
     """
-    if not isinstance(chat_id, int):
-        raise TypeError(f"Expected chat_id to be int, got {type(chat_id).__name__}")
+    _check_chat_id(chat_id)
+    try:
+        get_database().write(_insert_subscriber(chat_id))
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to add subscriber with chat_id={chat_id}: {e}") from e
 
-    conn = None
+
+async def add_subscriber_async(chat_id: int) -> None:
+    """
+    Асинхронный вариант add_subscriber для обработчиков бота: запись уходит
+    в общий групповой коммит и не блокирует event loop.
+    Args:
+        chat_id: уникальный идентификатор чата Telegram
+    Raises:
+        TypeError: если chat_id не является целым числом
+        sqlite3.Error: если произошла ошибка базы данных при вставке
+    """
+    _check_chat_id(chat_id)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("INSERT OR IGNORE INTO subscribers (chat_id) VALUES (?)", (chat_id,))
-        conn.commit()
+        await get_database().write_async(_insert_subscriber(chat_id))
     except sqlite3.Error as e:
         raise sqlite3.Error(f"Failed to add subscriber with chat_id={chat_id}: {e}") from e
-    finally:
-        if conn:
-            conn.close()
 
 
 def get_all_subscribers() -> list[int]:
     """
     Получает список всех идентификаторов чатов подписчиков из базы данных.
+    Для больших таблиц предпочтительнее iter_subscribers, не держащий весь список в памяти.
     Returns:
         list[int]: список уникальных идентификаторов чатов Telegram текущих подписчиков
     Raises:
         sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
     """
-    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT chat_id FROM subscribers")
-        chat_ids = [row[0] for row in cursor.fetchall()]
-        return chat_ids
+        return list(iter_subscribers())
     except sqlite3.Error as e:
         raise sqlite3.Error(f"Failed to fetch subscribers from database: {e}") from e
-    finally:
-        if conn:
-            conn.close()
+
+
+def partition_of(chat_id: int, partitions: int) -> int:
+    """
+    Возвращает номер раздела чата; совпадает с фильтром раздела в SQL-запросах,
+    в том числе для отрицательных chat_id групп.
+    """
+    return chat_id % partitions
+
+
+def iter_subscribers(page_size: int = DB_PAGE_SIZE, partition: Partition | None = None) -> Iterator[int]:
+    """
+    Потоково перебирает подписчиков по возрастанию chat_id страницами по page_size строк.
+    Используется keyset-пагинация по первичному ключу, поэтому память не зависит от размера таблицы,
+    а вставки и удаления во время обхода не сбивают позицию.
+    Args:
+        page_size: число строк на страницу
+        partition: необязательный раздел (k, i) - только чаты с chat_id mod k == i
+    Yields:
+        int: идентификатор чата Telegram
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
+    """
+    query = _keyset_query(_SUBSCRIBERS_QUERY_BASE, partition)
+    yield from _iter_pages(query, (), page_size, partition)
+
+
+async def aiter_subscribers(page_size: int = DB_PAGE_SIZE, partition: Partition | None = None) -> AsyncIterator[int]:
+    """
+    Асинхронный вариант iter_subscribers: каждая страница читается вне event loop.
+    Args:
+        page_size: число строк на страницу
+        partition: необязательный раздел (k, i) - только чаты с chat_id mod k == i
+    Yields:
+        int: идентификатор чата Telegram
+    """
+    query = _keyset_query(_SUBSCRIBERS_QUERY_BASE, partition)
+    async for chat_id in _aiter_pages(query, (), page_size, partition):
+        yield chat_id
+
+
+def _keyset_query(base: str, partition: Partition | None) -> str:
+    if partition is not None:
+        base += " AND ((chat_id % ?) + ?) % ? = ?"
+    return base + " ORDER BY chat_id LIMIT ?"
+
+
+def _page_params(
+    params: tuple,
+    last_chat_id: int | None,
+    page_size: int,
+    partition: Partition | None,
+) -> tuple:
+    # Меньше любого chat_id Telegram, включая отрицательные идентификаторы групп
+    after = last_chat_id if last_chat_id is not None else -(2 ** 63)
+    partition_params = () if partition is None else (partition[0], partition[0], partition[0], partition[1])
+    return (*params, after, *partition_params, page_size)
+
+
+def _iter_pages(
+    query: str,
+    params: tuple,
+    page_size: int,
+    partition: Partition | None,
+    convert: Callable[[tuple], object] = itemgetter(0),
+) -> Iterator:
+    last_chat_id = None
+    while True:
+        page = get_database().read(
+            lambda conn: conn.execute(query, _page_params(params, last_chat_id, page_size, partition)).fetchall()
+        )
+        for row in page:
+            yield convert(row)
+        if len(page) < page_size:
+            return
+        last_chat_id = page[-1][0]
+
+
+async def _aiter_pages(
+    query: str,
+    params: tuple,
+    page_size: int,
+    partition: Partition | None,
+    convert: Callable[[tuple], object] = itemgetter(0),
+) -> AsyncIterator:
+    last_chat_id = None
+    while True:
+        page = await get_database().read_async(
+            lambda conn: conn.execute(query, _page_params(params, last_chat_id, page_size, partition)).fetchall()
+        )
+        for row in page:
+            yield convert(row)
+        if len(page) < page_size:
+            return
+        last_chat_id = page[-1][0]
 
 
 def remove_subscriber(chat_id: int) -> None:
@@ -86,17 +279,482 @@ def remove_subscriber(chat_id: int) -> None:
     Raises:
         sqlite3.Error: если произошла ошибка базы данных при удалении
     """
+    _check_chat_id(chat_id)
+    try:
+        get_database().write(_delete_subscriber(chat_id))
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to remove subscriber with chat_id={chat_id}: {e}") from e
+
+
+async def remove_subscriber_async(chat_id: int) -> None:
+    """
+    Асинхронный вариант remove_subscriber для обработчиков бота.
+    Args:
+        chat_id: идентификатор чата Telegram для отписки
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при удалении
+    """
+    _check_chat_id(chat_id)
+    try:
+        await get_database().write_async(_delete_subscriber(chat_id))
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to remove subscriber with chat_id={chat_id}: {e}") from e
+
+
+def remove_subscribers(chat_ids: list[int]) -> int:
+    """
+    Удаляет пачку подписчиков (например, заблокировавших бота) одной транзакцией.
+    Args:
+        chat_ids: идентификаторы чатов Telegram
+    Returns:
+        int: число удалённых подписчиков
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при удалении
+    """
+    if not chat_ids:
+        return 0
+
+    def delete(conn: sqlite3.Connection) -> int:
+        params = [(chat_id,) for chat_id in chat_ids]
+        conn.executemany(
+            "DELETE FROM deliveries WHERE chat_id = ? AND status = ?",
+            [(chat_id, DELIVERY_PENDING) for chat_id in chat_ids]
+        )
+        return conn.executemany("DELETE FROM subscribers WHERE chat_id = ?", params).rowcount
+
+    try:
+        return get_database().write(delete)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to remove {len(chat_ids)} subscribers: {e}") from e
+
+
+def _check_chat_id(chat_id: int) -> None:
     if not isinstance(chat_id, int):
         raise TypeError(f"Expected chat_id to be int, got {type(chat_id).__name__}")
 
-    conn = None
+
+def _insert_subscriber(chat_id: int) -> Callable[[sqlite3.Connection], sqlite3.Cursor]:
+    return lambda conn: conn.execute(
+        "INSERT OR IGNORE INTO subscribers (chat_id, next_delivery_utc) VALUES (?, ?)",
+        (chat_id, next_delivery_utc(None, None, time.time()))
+    )
+
+
+def _delete_subscriber(chat_id: int) -> Callable[[sqlite3.Connection], sqlite3.Cursor]:
+    def delete(conn: sqlite3.Connection) -> sqlite3.Cursor:
+        # Неотправленные сообщения отписавшемуся больше не нужны
+        conn.execute("DELETE FROM deliveries WHERE chat_id = ? AND status = ?", (chat_id, DELIVERY_PENDING))
+        return conn.execute("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))
+
+    return delete
+
+
+async def set_subscriber_location(chat_id: int, lat: float, lon: float) -> bool:
+    """
+    Сохраняет местоположение подписчика и его географическую ячейку.
+    Args:
+        chat_id: идентификатор чата Telegram
+        lat: широта в градусах
+        lon: долгота в градусах
+    Returns:
+        bool: True, если подписчик найден и обновлён
+    Raises:
+        TypeError: если chat_id не является целым числом
+        sqlite3.Error: если произошла ошибка базы данных при обновлении
+    """
+    _check_chat_id(chat_id)
+
+    def update(conn: sqlite3.Connection) -> bool:
+        cursor = conn.execute(
+            "UPDATE subscribers SET lat = ?, lon = ?, cell = ? WHERE chat_id = ?",
+            (lat, lon, cell_for(lat, lon), chat_id)
+        )
+        return cursor.rowcount > 0
+
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))
-        conn.commit()
+        return await get_database().write_async(update)
     except sqlite3.Error as e:
-        raise sqlite3.Error(f"Failed to remove subscriber with chat_id={chat_id}: {e}") from e
-    finally:
-        if conn:
-            conn.close()
+        raise sqlite3.Error(f"Failed to set location for chat_id={chat_id}: {e}") from e
+
+
+async def get_subscriber(chat_id: int) -> Subscriber | None:
+    """
+    Возвращает параметры подписчика.
+    Args:
+        chat_id: идентификатор чата Telegram
+    Returns:
+        Subscriber | None: подписчик или None, если чат не подписан
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
+    """
+    def select(conn: sqlite3.Connection) -> tuple | None:
+        return conn.execute(
+            "SELECT chat_id, cell, delivery_time, tz, sections FROM subscribers WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+
+    try:
+        row = await get_database().read_async(select)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to fetch subscriber with chat_id={chat_id}: {e}") from e
+    if row is None:
+        return None
+    return Subscriber(chat_id=row[0], cell=row[1], delivery_time=row[2], tz=row[3], sections=row[4])
+
+
+async def get_occupied_cells() -> list[str | None]:
+    """
+    Возвращает все географические ячейки, в которых есть подписчики (None - местоположение по умолчанию).
+    Число ячеек определяет число запросов к погодным API за рассылку.
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
+    """
+    def select(conn: sqlite3.Connection) -> list[str | None]:
+        return [row[0] for row in conn.execute("SELECT DISTINCT cell FROM subscribers")]
+
+    try:
+        return await get_database().read_async(select)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to fetch occupied cells: {e}") from e
+
+
+async def set_subscriber_schedule(
+    chat_id: int,
+    delivery_time: str | None = None,
+    tz_name: str | None = None,
+) -> bool:
+    """
+    Меняет время доставки и/или часовой пояс подписчика и пересчитывает ближайшую доставку.
+    Незаданные параметры остаются прежними.
+    Args:
+        chat_id: идентификатор чата Telegram
+        delivery_time: местное время доставки 'ЧЧ:ММ'
+        tz_name: часовой пояс IANA
+    Returns:
+        bool: True, если подписчик найден и обновлён
+    Raises:
+        TypeError: если chat_id не является целым числом
+        sqlite3.Error: если произошла ошибка базы данных при обновлении
+    """
+    _check_chat_id(chat_id)
+
+    def update(conn: sqlite3.Connection) -> bool:
+        row = conn.execute("SELECT delivery_time, tz FROM subscribers WHERE chat_id = ?", (chat_id,)).fetchone()
+        if row is None:
+            return False
+        new_time = delivery_time or row[0]
+        new_tz = tz_name or row[1]
+        conn.execute(
+            "UPDATE subscribers SET delivery_time = ?, tz = ?, next_delivery_utc = ? WHERE chat_id = ?",
+            (new_time, new_tz, next_delivery_utc(new_time, new_tz, time.time()), chat_id)
+        )
+        return True
+
+    try:
+        return await get_database().write_async(update)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to set schedule for chat_id={chat_id}: {e}") from e
+
+
+async def set_subscriber_threshold(chat_id: int, name: str | None, value: float | None = None) -> bool:
+    """
+    Задаёт подписчику свой порог чувствительности или сбрасывает все пороги к значениям по умолчанию.
+    Args:
+        chat_id: идентификатор чата Telegram
+        name: название порога (pressure, flux или g); None - сбросить все пороги
+        value: значение порога
+    Returns:
+        bool: True, если подписчик найден и обновлён
+    Raises:
+        TypeError: если chat_id не является целым числом
+        sqlite3.Error: если произошла ошибка базы данных при обновлении
+    """
+    _check_chat_id(chat_id)
+    if name is None:
+        query = f"UPDATE subscribers SET {' = NULL, '.join(_THRESHOLD_COLUMNS.values())} = NULL WHERE chat_id = ?"
+        params: tuple = (chat_id,)
+    else:
+        query = f"UPDATE subscribers SET {_THRESHOLD_COLUMNS[name]} = ? WHERE chat_id = ?"
+        params = (int(value) if name == "g" else value, chat_id)
+
+    try:
+        return await get_database().write_async(lambda conn: conn.execute(query, params).rowcount > 0)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to set thresholds for chat_id={chat_id}: {e}") from e
+
+
+async def load_thresholds(chat_id: int | None = None) -> ThresholdTable:
+    """
+    Загружает пороги подписчиков, задавших свои значения, одним запросом на рассылку.
+    Args:
+        chat_id: необязательный чат - загрузить пороги только одного подписчика
+    Returns:
+        ThresholdTable: колоночная таблица порогов
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
+    """
+    query = (
+        "SELECT chat_id, pressure_threshold, flux_threshold, g_threshold FROM subscribers "
+        "WHERE (pressure_threshold IS NOT NULL OR flux_threshold IS NOT NULL OR g_threshold IS NOT NULL)"
+    )
+    params: tuple = ()
+    if chat_id is not None:
+        query += " AND chat_id = ?"
+        params = (chat_id,)
+
+    try:
+        return await get_database().read_async(lambda conn: ThresholdTable(conn.execute(query, params)))
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to load subscriber thresholds: {e}") from e
+
+
+async def toggle_subscriber_section(chat_id: int, section: int) -> int | None:
+    """
+    Включает или выключает секцию сообщения подписчика.
+    Args:
+        chat_id: идентификатор чата Telegram
+        section: бит секции из SECTION_BITS
+    Returns:
+        int | None: новая маска секций или None, если чат не подписан
+    Raises:
+        TypeError: если chat_id не является целым числом
+        sqlite3.Error: если произошла ошибка базы данных при обновлении
+    """
+    _check_chat_id(chat_id)
+
+    def update(conn: sqlite3.Connection) -> int | None:
+        row = conn.execute("SELECT sections FROM subscribers WHERE chat_id = ?", (chat_id,)).fetchone()
+        if row is None:
+            return None
+        sections = (DEFAULT_SECTIONS if row[0] is None else row[0]) ^ section
+        conn.execute("UPDATE subscribers SET sections = ? WHERE chat_id = ?", (sections, chat_id))
+        return sections
+
+    try:
+        return await get_database().write_async(update)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to toggle section for chat_id={chat_id}: {e}") from e
+
+
+def _to_subscriber(row: tuple) -> Subscriber:
+    chat_id, cell, delivery_date, sections = row
+    return Subscriber(chat_id=chat_id, cell=cell, delivery_date=delivery_date, sections=sections)
+
+
+def materialize_due_deliveries(now: float, page_size: int = DB_PAGE_SIZE) -> set[str]:
+    """
+    Переносит подписчиков, чьё время доставки наступило, в журнал доставки.
+    Выборка идёт по индексу next_delivery_utc, поэтому стоимость пропорциональна числу
+    подписчиков, которым пора отправлять, а не размеру таблицы. В той же транзакции
+    next_delivery_utc сдвигается на следующий день: после перезапуска подписчик не будет
+    поставлен в журнал повторно, а уже поставленные записи дождутся отправки в статусе pending.
+    Доставки, просроченные больше чем на DELIVERY_MAX_LATENESS, только переносятся на следующий день.
+    Args:
+        now: текущее UNIX-время
+        page_size: число подписчиков в одной транзакции
+    Returns:
+        set[str]: местные даты доставки, по которым появились новые записи
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных
+    """
+    def materialize_page(conn: sqlite3.Connection) -> tuple[int, set[str]]:
+        rows = conn.execute(
+            """
+            SELECT chat_id, delivery_time, tz, next_delivery_utc FROM subscribers
+            WHERE next_delivery_utc <= ?
+            ORDER BY next_delivery_utc, chat_id
+            LIMIT ?
+            """,
+            (now, page_size)
+        ).fetchall()
+        deliveries = [
+            (chat_id, local_delivery_date(due, tz))
+            for chat_id, _, tz, due in rows
+            if now - due <= DELIVERY_MAX_LATENESS
+        ]
+        conn.executemany("INSERT OR IGNORE INTO deliveries (chat_id, delivery_date) VALUES (?, ?)", deliveries)
+        conn.executemany(
+            "UPDATE subscribers SET next_delivery_utc = ? WHERE chat_id = ?",
+            [(next_delivery_utc(delivery_time, tz, now), chat_id) for chat_id, delivery_time, tz, _ in rows]
+        )
+        return len(rows), {date for _, date in deliveries}
+
+    dates: set[str] = set()
+    try:
+        while True:
+            count, page_dates = get_database().write(materialize_page)
+            dates |= page_dates
+            if count < page_size:
+                return dates
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to materialize due deliveries: {e}") from e
+
+
+def get_pending_deliveries(delivery_date: str) -> list[int]:
+    """
+    Возвращает чаты, которым сообщение за указанную дату ещё не доставлено.
+    Args:
+        delivery_date: дата рассылки в формате YYYY-MM-DD
+    Returns:
+        list[int]: идентификаторы чатов в статусе pending
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
+    """
+    try:
+        return list(_iter_pages(_keyset_query(_PENDING_QUERY_BASE, None), (delivery_date, DELIVERY_PENDING), DB_PAGE_SIZE, None))
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to fetch pending deliveries for {delivery_date}: {e}") from e
+
+
+async def aiter_pending_deliveries(
+    delivery_date: str,
+    page_size: int = DB_PAGE_SIZE,
+    partition: Partition | None = None,
+) -> AsyncIterator[int]:
+    """
+    Потоково перебирает чаты в статусе pending за указанную дату (keyset-пагинация по chat_id).
+    Args:
+        delivery_date: дата рассылки в формате YYYY-MM-DD
+        page_size: число строк на страницу
+        partition: необязательный раздел (k, i) - только чаты с chat_id mod k == i
+    Yields:
+        int: идентификатор чата Telegram
+    """
+    query = _keyset_query(_PENDING_QUERY_BASE, partition)
+    async for chat_id in _aiter_pages(query, (delivery_date, DELIVERY_PENDING), page_size, partition):
+        yield chat_id
+
+
+async def aiter_pending_recipients(
+    delivery_date: str,
+    page_size: int = DB_PAGE_SIZE,
+    partition: Partition | None = None,
+) -> AsyncIterator[Subscriber]:
+    """
+    Как aiter_pending_deliveries, но возвращает подписчиков вместе с их параметрами доставки.
+    Чаты, отписавшиеся после постановки в журнал, пропускаются.
+    Args:
+        delivery_date: дата рассылки в формате YYYY-MM-DD
+        page_size: число строк на страницу
+        partition: необязательный раздел (k, i) - только чаты с chat_id mod k == i
+    Yields:
+        Subscriber: получатель рассылки
+    """
+    query = _keyset_query(_PENDING_RECIPIENTS_QUERY_BASE, partition)
+    params = (delivery_date, DELIVERY_PENDING)
+    async for subscriber in _aiter_pages(query, params, page_size, partition, _to_subscriber):
+        yield subscriber
+
+
+def mark_deliveries(statuses: list[tuple[int, str, str]]) -> None:
+    """
+    Фиксирует статусы доставки пачкой в одной транзакции.
+    Args:
+        statuses: тройки (chat_id, дата рассылки, статус), статус - sent или failed
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при обновлении
+    """
+    if not statuses:
+        return
+
+    def update(conn: sqlite3.Connection) -> None:
+        conn.executemany(
+            """
+            UPDATE deliveries
+            SET status = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE chat_id = ? AND delivery_date = ?
+            """,
+            [(status, chat_id, delivery_date) for chat_id, delivery_date, status in statuses]
+        )
+
+    try:
+        get_database().write(update)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to update {len(statuses)} deliveries: {e}") from e
+
+
+async def get_pending_cells(delivery_date: str, partition: Partition | None = None) -> list[str | None]:
+    """
+    Возвращает географические ячейки чатов, ожидающих доставки за указанную дату.
+    Args:
+        delivery_date: дата рассылки в формате YYYY-MM-DD
+        partition: необязательный раздел (k, i) - только чаты с chat_id mod k == i
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
+    """
+    query = (
+        "SELECT DISTINCT subscribers.cell FROM deliveries JOIN subscribers USING (chat_id) "
+        "WHERE delivery_date = ? AND status = ?"
+    )
+    params: tuple = (delivery_date, DELIVERY_PENDING)
+    if partition is not None:
+        query += " AND ((chat_id % ?) + ?) % ? = ?"
+        params += (partition[0], partition[0], partition[0], partition[1])
+
+    def select(conn: sqlite3.Connection) -> list[str | None]:
+        return [row[0] for row in conn.execute(query, params)]
+
+    try:
+        return await get_database().read_async(select)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to fetch pending cells for {delivery_date}: {e}") from e
+
+
+async def get_cells_due_between(
+    start: float,
+    end: float,
+    partitions: Iterable[Partition] | None = None,
+) -> list[str | None]:
+    """
+    Возвращает географические ячейки подписчиков, чья доставка приходится на интервал (start, end].
+    Выборка идёт по индексу next_delivery_utc, поэтому затрагивает только подписчиков этого интервала.
+    Args:
+        start: начало интервала, UNIX-время (не включительно)
+        end: конец интервала, UNIX-время (включительно)
+        partitions: необязательные разделы (k, i) - только чаты, попадающие в один из них
+    Returns:
+        list[str | None]: ячейки; None - местоположение по умолчанию
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
+    """
+    query = "SELECT DISTINCT cell FROM subscribers WHERE next_delivery_utc > ? AND next_delivery_utc <= ?"
+    params: tuple = (start, end)
+    if partitions is not None:
+        partitions = list(partitions)
+        if not partitions:
+            return []
+        query += " AND (" + " OR ".join(["((chat_id % ?) + ?) % ? = ?"] * len(partitions)) + ")"
+        for k, i in partitions:
+            params += (k, k, k, i)
+
+    def select(conn: sqlite3.Connection) -> list[str | None]:
+        return [row[0] for row in conn.execute(query, params)]
+
+    try:
+        return await get_database().read_async(select)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to fetch cells due between {start} and {end}: {e}") from e
+
+
+def get_delivery_stats(delivery_date: str) -> dict[str, int]:
+    """
+    Считает записи журнала доставки за день по статусам.
+    Args:
+        delivery_date: дата рассылки в формате YYYY-MM-DD
+    Returns:
+        dict[str, int]: число сообщений в статусах sent, failed и pending
+    Raises:
+        sqlite3.Error: если произошла ошибка базы данных при выполнении запроса
+    """
+    def select(conn: sqlite3.Connection) -> dict[str, int]:
+        cursor = conn.execute(
+            "SELECT status, COUNT(*) FROM deliveries WHERE delivery_date = ? GROUP BY status",
+            (delivery_date,)
+        )
+        stats = {DELIVERY_SENT: 0, DELIVERY_FAILED: 0, DELIVERY_PENDING: 0}
+        stats.update(dict(cursor.fetchall()))
+        return stats
+
+    try:
+        return get_database().read(select)
+    except sqlite3.Error as e:
+        raise sqlite3.Error(f"Failed to fetch delivery stats for {delivery_date}: {e}") from e
@@ -0,0 +1,118 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+from python_scripts.config.types import ReportMetrics
+from python_scripts.config.consts import (
+    PRESSURE_THRESHOLD,
+    SOLAR_FLARE_NO_EFFECT,
+    DEFAULT_G_SCALE_THRESHOLD,
+    THRESHOLD_LIMITS,
+    VERDICT_WEATHER,
+    VERDICT_SOLAR,
+    VERDICT_GEOMAGNETIC
+)
+
+# Строка порогов подписчика: (chat_id, давление, поток, шкала G); None - порог по умолчанию
+ThresholdRow = tuple[int, float | None, float | None, int | None]
+
+
+class ThresholdTable:
+    """
+    Пороги чувствительности подписчиков в колоночном виде, загружаемые один раз на рассылку.
+    Хранятся только подписчики со своими порогами: отсортированные chat_id и номер набора порогов
+    для каждого. Сами наборы порогов дедуплицированы (набор 0 - пороги по умолчанию), поэтому вердикт
+    по отчёту ячейки вычисляется одним проходом по различным наборам, а не по подписчикам,
+    и для каждого отчёта запоминается. На подписчика остаётся двоичный поиск и чтение из массива.
+    """
+
+    def __init__(self, rows: Iterable[ThresholdRow] = ()) -> None:
+        self.chat_ids = array('q')
+        self.set_ids = array('I')
+        self.pressure = array('d', [PRESSURE_THRESHOLD])
+        self.flux = array('d', [SOLAR_FLARE_NO_EFFECT])
+        self.g_scale = array('b', [DEFAULT_G_SCALE_THRESHOLD])
+        self._verdicts: dict[ReportMetrics, array] = {}
+
+        sets = {(float(PRESSURE_THRESHOLD), float(SOLAR_FLARE_NO_EFFECT), DEFAULT_G_SCALE_THRESHOLD): 0}
+        for chat_id, pressure, flux, g_scale in sorted(rows):
+            key = (
+                float(PRESSURE_THRESHOLD if pressure is None else pressure),
+                float(SOLAR_FLARE_NO_EFFECT if flux is None else flux),
+                DEFAULT_G_SCALE_THRESHOLD if g_scale is None else g_scale,
+            )
+            set_id = sets.get(key)
+            if set_id is None:
+                set_id = sets[key] = len(sets)
+                self.pressure.append(key[0])
+                self.flux.append(key[1])
+                self.g_scale.append(key[2])
+            self.chat_ids.append(chat_id)
+            self.set_ids.append(set_id)
+
+    def __len__(self) -> int:
+        return len(self.chat_ids)
+
+    def set_of(self, chat_id: int) -> int:
+        """Номер набора порогов подписчика (0 - пороги по умолчанию)."""
+        i = bisect_left(self.chat_ids, chat_id)
+        if i < len(self.chat_ids) and self.chat_ids[i] == chat_id:
+            return self.set_ids[i]
+        return 0
+
+    def verdicts(self, metrics: ReportMetrics) -> array:
+        """
+        Вычисляет битовые маски вердикта для всех наборов порогов сразу.
+        Args:
+            metrics: показатели отчёта ячейки
+        Returns:
+            array: маска вердикта для каждого набора порогов, по номеру набора
+        """
+        verdicts = self._verdicts.get(metrics)
+        if verdicts is None:
+            verdicts = self._verdicts[metrics] = array('B', (
+                metrics.fixed
+                | (VERDICT_WEATHER if metrics.pressure < pressure else 0)
+                | (VERDICT_SOLAR if metrics.flux >= flux else 0)
+                | (VERDICT_GEOMAGNETIC if metrics.g_scale >= g_scale else 0)
+                for pressure, flux, g_scale in zip(self.pressure, self.flux, self.g_scale)
+            ))
+        return verdicts
+
+    def verdict(self, chat_id: int, metrics: ReportMetrics) -> int:
+        """
+        Возвращает маску вердикта подписчика для отчёта его ячейки.
+        Args:
+            chat_id: идентификатор чата Telegram
+            metrics: показатели отчёта ячейки
+        Returns:
+            int: сочетание битов VERDICT_*
+        """
+        return self.verdicts(metrics)[self.set_of(chat_id)]
+
+
+default_thresholds = ThresholdTable()
+
+
+def parse_threshold(text: str) -> tuple[str, float] | None:
+    """
+    Разбирает порог из строки вида 'pressure 745', 'flux 180' или 'g 2'.
+    Уровень шкалы G хранится целым, поэтому дробное значение g считается некорректным.
+    Args:
+        text: название порога и его значение
+    Returns:
+        tuple[str, float] | None: название и значение порога или None, если строка некорректна
+    """
+    parts = text.lower().split()
+    if len(parts) != 2 or parts[0] not in THRESHOLD_LIMITS:
+        return None
+    try:
+        value = float(parts[1])
+    except ValueError:
+        return None
+    low, high = THRESHOLD_LIMITS[parts[0]]
+    if not low <= value <= high:
+        return None
+    if parts[0] == "g" and not value.is_integer():
+        return None
+    return parts[0], value
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from python_scripts.config.consts import TRACE_DIR, TRACE_MAX_EVENTS, TRACE_PROFILE_INTERVAL
+
+# Файлы-флаги в каталоге трассировок: следующая рассылка (в любом процессе с тем же каталогом)
+# будет трассирована, с профилем CPU или без
+ARMED_FLAG = "armed"
+ARMED_PROFILE_FLAG = "armed-profile"
+
+
+class _NoSpan:
+    """Пустой участок: возвращается, пока трассировка выключена, и ничего не делает."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    """Участок трассировки; при выходе записывается как событие 'X' формата Chrome trace."""
+
+    __slots__ = ("tracer", "name", "args", "tid", "_started")
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.tid = tracer.current_tid()
+
+    def __enter__(self) -> "Span":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: type | None, *exc_info: object) -> None:
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.tid, self._started, time.perf_counter(), self.args)
+
+
+class SamplingProfiler(threading.Thread):
+    """
+    Статистический профилировщик CPU: каждые interval секунд снимает стеки всех потоков процесса
+    (sys._current_frames) и считает одинаковые стеки. Результат - свёрнутые стеки (формат
+    flamegraph.pl и speedscope). Цена - одна выборка на интервал, код приложения не инструментируется.
+    """
+
+    def __init__(self, interval: float = TRACE_PROFILE_INTERVAL) -> None:
+        super().__init__(name="trace-profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                calls = []
+                while frame is not None:
+                    code = frame.f_code
+                    calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                calls.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(calls))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def folded(self) -> str:
+        """Свёрнутые стеки: строка 'поток;функция;...;функция число_выборок' на стек."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Tracer:
+    """
+    Трассировка конвейера отчёта по требованию.
+    Пока трассировка не запущена, span() возвращает общий пустой участок, так что инструментированный
+    код платит только за вызов функции и проверку флага. Во время трассировки участки пишутся событиями
+    формата Chrome trace (chrome://tracing, Perfetto) с отдельной дорожкой на каждую задачу asyncio
+    и каждый поток, поэтому вложенность участков видна на дорожке. Разрешение имён (DNS) на время
+    трассировки оборачивается участком 'dns'. Одновременно идёт не больше одной трассировки на процесс.
+    """
+
+    def __init__(self, directory: str = TRACE_DIR, max_events: int = TRACE_MAX_EVENTS) -> None:
+        """
+        Args:
+            directory: каталог для файлов трассировок и флагов
+            max_events: предел числа событий одной трассировки; лишние отбрасываются
+        """
+        self.directory = directory
+        self.max_events = max_events
+        self.sample_rate = 0.0
+        self.active = False
+        self.name = ""
+        self.dropped = 0
+        self._events: list[dict] = []
+        self._tracks: dict[int, tuple[int, str]] = {}
+        self._origin = 0.0
+        self._profiler: SamplingProfiler | None = None
+        self._getaddrinfo = socket.getaddrinfo
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **args: Any) -> Span | _NoSpan:
+        """
+        Участок трассировки, используемый как контекстный менеджер.
+        Args:
+            name: имя участка (fetch, parse, interpret, render, db.read, send, ...)
+            args: произвольные поля, показываемые в просмотрщике
+        Returns:
+            Span | _NoSpan: записывающий участок или пустой, если трассировка выключена
+        """
+        if not self.active:
+            return _NO_SPAN
+        return Span(self, name, args)
+
+    def current_tid(self) -> int:
+        """Номер дорожки: задача asyncio, в которой выполняется код, или поток вне event loop."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        owner = task if task is not None else threading.current_thread()
+        key = id(owner)
+        track = self._tracks.get(key)
+        if track is None:
+            label = task.get_name() if task is not None else owner.name
+            with self._lock:
+                track = self._tracks.setdefault(key, (len(self._tracks) + 1, label))
+        return track[0]
+
+    def record(self, name: str, tid: int, started: float, finished: float, args: dict[str, Any]) -> None:
+        if not self.active:
+            return
+        if len(self._events) >= self.max_events:
+            self.dropped += 1
+            return
+        self._events.append({
+            "name": name,
+            "ph": "X",
+            "ts": (started - self._origin) * 1e6,
+            "dur": (finished - started) * 1e6,
+            "pid": os.getpid(),
+            "tid": tid,
+            "args": args,
+        })
+
+    def arm(self, profile: bool = False) -> None:
+        """
+        Помечает, что следующую рассылку нужно трассировать, даже если она не попала в выборку.
+        Флаг - файл в каталоге трассировок, поэтому его видят и процессы-воркеры рассылки.
+        Args:
+            profile: снимать ли вместе с трассировкой профиль CPU
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ARMED_PROFILE_FLAG if profile else ARMED_FLAG), "w"):
+            pass
+
+    def take_sample(self) -> tuple[bool, bool]:
+        """
+        Решает, трассировать ли очередную рассылку: по флагу arm (забирает его) или с вероятностью sample_rate.
+        Returns:
+            tuple[bool, bool]: трассировать ли и снимать ли профиль CPU
+        """
+        for flag, profile in ((ARMED_PROFILE_FLAG, True), (ARMED_FLAG, False)):
+            try:
+                # Флаг забирает тот процесс, которому удалось его удалить
+                os.remove(os.path.join(self.directory, flag))
+                return True, profile
+            except OSError:
+                pass
+        return random.random() < self.sample_rate, False
+
+    def start(self, name: str, profile: bool = False) -> None:
+        """
+        Запускает трассировку.
+        Args:
+            name: имя трассировки, входит в имена файлов
+            profile: запустить ли статистический профилировщик CPU
+        """
+        with self._lock:
+            self._events, self._tracks, self.dropped = [], {}, 0
+        self.name = name
+        self._origin = time.perf_counter()
+        socket.getaddrinfo = self._traced_getaddrinfo
+        if profile:
+            self._profiler = SamplingProfiler()
+            self._profiler.start()
+        self.active = True
+
+    def stop(self) -> list[str]:
+        """
+        Останавливает трассировку и записывает файлы: <имя>.trace.json и, если снимался профиль, <имя>.folded.
+        Returns:
+            list[str]: пути записанных файлов
+        """
+        self.active = False
+        socket.getaddrinfo = self._getaddrinfo
+        profiler, self._profiler = self._profiler, None
+        if profiler is not None:
+            profiler.stop()
+
+        base = os.path.join(self.directory, self.name)
+        pid = os.getpid()
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"jopae {pid}"}}] + [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": label}}
+            for tid, label in self._tracks.values()
+        ]
+        os.makedirs(self.directory, exist_ok=True)
+        paths = [base + ".trace.json"]
+        with open(paths[0], "w", encoding="utf-8") as trace_file:
+            json.dump({
+                "traceEvents": metadata + self._events,
+                "displayTimeUnit": "ms",
+                "otherData": {"name": self.name, "dropped_events": self.dropped},
+            }, trace_file, ensure_ascii=False, default=str)
+        if profiler is not None:
+            paths.append(base + ".folded")
+            with open(paths[1], "w", encoding="utf-8") as folded_file:
+                folded_file.write(profiler.folded())
+        self._events, self._tracks = [], {}
+        return paths
+
+    def _traced_getaddrinfo(self, host: Any, *args: Any, **kwargs: Any) -> Any:
+        with self.span("dns", host=str(host)):
+            return self._getaddrinfo(host, *args, **kwargs)
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+@asynccontextmanager
+async def traced(name: str) -> AsyncIterator[bool]:
+    """
+    Трассирует блок, если он попал в выборку (Tracer.take_sample) и другая трассировка не идёт.
+    Файлы записываются вне event loop после выхода из блока.
+    Args:
+        name: имя трассировки
+    Yields:
+        bool: идёт ли трассировка
+    """
+    if tracer.active:
+        yield False
+        return
+    sampled, profile = await asyncio.to_thread(tracer.take_sample)
+    if not sampled:
+        yield False
+        return
+
+    name = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    tracer.start(name, profile)
+    try:
+        yield True
+    finally:
+        try:
+            paths = await asyncio.to_thread(tracer.stop)
+            print(f"Trace written: {', '.join(paths)}")
+        except OSError as e:
+            print(f"Failed to write trace {name}: {e}")
@@ -0,0 +1,110 @@
+import asyncio
+import hmac
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from python_scripts.metrics import WEBHOOK_QUEUE
+from python_scripts.config.consts import WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS, WEBHOOK_DRAIN_TIMEOUT
+
+# Заголовок, в котором Telegram присылает секрет, заданный в setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Встроенный HTTP-сервер для приёма обновлений Telegram через webhook.
+    Запрос только проверяется и кладётся в ограниченную очередь, после чего Telegram сразу получает ответ;
+    обработку ведут workers фоновых задач. Если очередь заполнена, сервер отвечает 503
+    и Telegram повторит доставку позже, так что всплеск обновлений не растит память без предела.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        path: str,
+        secret: str,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        workers: int = WEBHOOK_WORKERS,
+    ) -> None:
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.queue: asyncio.Queue[Update] = asyncio.Queue(maxsize=queue_size)
+        self.received = 0
+        self.rejected = 0
+        self._tasks: list[asyncio.Task] = []
+        self._runner: web.AppRunner | None = None
+
+    def application(self) -> web.Application:
+        """Приложение aiohttp с единственным маршрутом webhook."""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        Принимает обновление: проверяет секрет и ставит обновление в очередь.
+        Args:
+            request: POST-запрос от Telegram
+        Returns:
+            web.Response: 200 - принято, 401 - неверный секрет, 400 - некорректное тело,
+            503 - очередь заполнена
+        """
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    async def _work(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+            except Exception as e:
+                print(f"Error handling update {update.update_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def start(self, host: str, port: int) -> None:
+        """
+        Запускает обработчики очереди и HTTP-сервер.
+        Args:
+            host: адрес, на котором слушать
+            port: порт
+        """
+        WEBHOOK_QUEUE.set_function(self.queue.qsize)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._runner = web.AppRunner(self.application())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self) -> None:
+        """
+        Перестаёт принимать запросы, дообрабатывает очередь (не дольше WEBHOOK_DRAIN_TIMEOUT)
+        и останавливает обработчики.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        try:
+            await asyncio.wait_for(self.queue.join(), WEBHOOK_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Webhook queue not drained on shutdown, {self.queue.qsize()} updates dropped")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
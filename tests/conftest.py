@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+# Бот проверяет формат токена при импорте модуля
+os.environ.setdefault("JOPAE_BOT", "123456:test-token")
+
+from python_scripts import db  # noqa: E402
+from python_scripts.subscriptions import init_db  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Отдельная база SQLite на тест вместо общей subscriptions.db."""
+    database = db.Database(str(tmp_path / "subscriptions.db"))
+    monkeypatch.setattr(db, "_database", database)
+    init_db()
+    yield database
+    database.close()
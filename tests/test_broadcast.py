@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramMigrateToChat,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError
+)
+from aiogram.methods import SendMessage
+
+from python_scripts import broadcast
+from python_scripts.broadcast import (
+    BroadcastDispatcher,
+    TokenBucket,
+    classify_send_error,
+    SEND_DEAD,
+    SEND_FAILED,
+    SEND_RATE_LIMITED,
+    SEND_TRANSIENT
+)
+from python_scripts.config.types import Subscriber
+
+METHOD = SendMessage(chat_id=1, text="test")
+
+
+@pytest.mark.parametrize("error, kind", [
+    (TelegramForbiddenError(METHOD, "Forbidden: bot was blocked by the user"), SEND_DEAD),
+    (TelegramMigrateToChat(METHOD, "group migrated", migrate_to_chat_id=-100), SEND_DEAD),
+    (TelegramBadRequest(METHOD, "Bad Request: chat not found"), SEND_DEAD),
+    (TelegramBadRequest(METHOD, "Bad Request: message is too long"), SEND_FAILED),
+    (TelegramRetryAfter(METHOD, "Too Many Requests", retry_after=3), SEND_RATE_LIMITED),
+    (TelegramServerError(METHOD, "Internal Server Error"), SEND_TRANSIENT),
+    (TelegramNetworkError(METHOD, "connection reset"), SEND_TRANSIENT),
+    (asyncio.TimeoutError(), SEND_TRANSIENT),
+    (ValueError("bug"), SEND_FAILED),
+])
+def test_classify_send_error(error, kind):
+    assert classify_send_error(error) == kind
+
+
+def run_broadcast(send, recipients, monkeypatch, **options):
+    pruned = []
+    monkeypatch.setattr(broadcast, "remove_subscribers", lambda chat_ids: pruned.extend(chat_ids) or len(chat_ids))
+    options = {"global_rate": 1000, "per_chat_rate": 1000, "retry_backoff": 0, **options}
+    result = asyncio.run(BroadcastDispatcher(send, **options).run([Subscriber(i) for i in recipients]))
+    return result, pruned
+
+
+def test_dead_chats_are_pruned_and_others_delivered(monkeypatch):
+    async def send(subscriber):
+        if subscriber.chat_id in (1, 2):
+            raise TelegramForbiddenError(METHOD, "Forbidden: bot was blocked by the user")
+
+    result, pruned = run_broadcast(send, range(1, 8), monkeypatch)
+
+    assert sorted(pruned) == [1, 2]
+    assert (result.sent, result.failed, result.pruned) == (5, 2, 2)
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    attempts = {}
+
+    async def send(subscriber):
+        attempts[subscriber.chat_id] = attempts.get(subscriber.chat_id, 0) + 1
+        if attempts[subscriber.chat_id] == 1:
+            raise TelegramServerError(METHOD, "Bad Gateway")
+
+    result, pruned = run_broadcast(send, range(3), monkeypatch)
+
+    assert (result.sent, result.failed, result.retried) == (3, 0, 3)
+    assert pruned == []
+
+
+def test_transient_errors_fail_after_max_attempts(monkeypatch):
+    async def send(subscriber):
+        raise TelegramNetworkError(METHOD, "connection reset")
+
+    result, pruned = run_broadcast(send, range(2), monkeypatch, max_attempts=3)
+
+    assert (result.sent, result.failed, result.retried) == (0, 2, 4)
+    assert pruned == []
+
+
+def test_requeued_deliveries_do_not_print_progress(monkeypatch, capsys):
+    seen = set()
+
+    async def send(subscriber):
+        if subscriber.chat_id not in seen:
+            seen.add(subscriber.chat_id)
+            raise TelegramNetworkError(METHOD, "connection reset")
+
+    run_broadcast(send, range(12), monkeypatch, progress_every=5)
+
+    progress = [line for line in capsys.readouterr().out.splitlines() if line.startswith("Broadcast progress")]
+    assert [line.split()[2] for line in progress] == ["5", "10"]
+
+
+def test_per_chat_rate_holds_across_retries(monkeypatch):
+    sent_at = []
+
+    async def send(subscriber):
+        sent_at.append(time.monotonic())
+        if len(sent_at) == 1:
+            raise TelegramNetworkError(METHOD, "connection reset")
+
+    run_broadcast(send, [1], monkeypatch, per_chat_rate=5)
+
+    assert sent_at[1] - sent_at[0] >= 0.18
+
+
+def test_concurrent_broadcasts_share_the_global_rate(monkeypatch):
+    monkeypatch.setattr(broadcast, "remove_subscribers", lambda chat_ids: 0)
+
+    async def send(subscriber):
+        pass
+
+    async def main():
+        bucket = TokenBucket(20)
+        dispatchers = [BroadcastDispatcher(send, per_chat_rate=1000, global_bucket=bucket) for _ in range(2)]
+        started = time.monotonic()
+        # Ведро выдаёт 20 токенов сразу, остальные 10 - со скоростью 20 в секунду
+        await asyncio.gather(*(
+            dispatcher.run([Subscriber(i) for i in range(offset, offset + 15)])
+            for offset, dispatcher in zip((0, 100), dispatchers)
+        ))
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.45
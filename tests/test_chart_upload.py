@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+from aiogram.methods import SendPhoto
+
+from python_scripts import jopae_tg_bot, message
+from python_scripts.broadcast import classify_send_error, SEND_DEAD, SEND_TRANSIENT
+from python_scripts.config.consts import TELEGRAM_CAPTION_LIMIT
+from python_scripts.report_cache import ReportCache
+
+BLOCKED = {1, 2}
+
+
+class Photo:
+    def __init__(self, file_id: str) -> None:
+        self.file_id = file_id
+
+
+class Sent:
+    def __init__(self, file_id: str) -> None:
+        self.photo = [Photo(file_id)]
+
+
+@pytest.fixture
+def stub_bot(monkeypatch):
+    uploads = []
+
+    async def send_photo(chat_id, photo, caption=None):
+        await asyncio.sleep(0.01)
+        if chat_id in BLOCKED:
+            raise TelegramForbiddenError(SendPhoto(chat_id=chat_id, photo="x"), "Forbidden: bot was blocked by the user")
+        if not isinstance(photo, str):
+            uploads.append(chat_id)
+        return Sent("file-id")
+
+    async def build_chart(cell):
+        return b"png"
+
+    monkeypatch.setattr(jopae_tg_bot.bot, "send_photo", send_photo)
+    monkeypatch.setattr(message, "build_chart", build_chart)
+    monkeypatch.setattr(jopae_tg_bot, "chart_files", ReportCache(ttl=60, name="chart_file"))
+    return uploads
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    sent = []
+
+    async def send_message(chat_id, text):
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(jopae_tg_bot.bot, "send_message", send_message)
+    monkeypatch.setattr(jopae_tg_bot, "texts_sent", jopae_tg_bot.OrderedDict())
+    return sent
+
+
+def send_all(chat_ids):
+    async def main():
+        return await asyncio.gather(
+            *(jopae_tg_bot.send_with_chart(chat_id, "text", "cell", "2026-01-01") for chat_id in chat_ids),
+            return_exceptions=True,
+        )
+
+    return dict(zip(chat_ids, asyncio.run(main())))
+
+
+def test_blocked_uploader_does_not_fail_waiting_chats(stub_bot, monkeypatch):
+    monkeypatch.setattr(jopae_tg_bot, "CHART_UPLOAD_ATTEMPTS", 3)
+
+    results = send_all(range(1, 8))
+
+    assert [chat_id for chat_id, result in results.items() if isinstance(result, Exception)] == [1, 2]
+    assert all(classify_send_error(results[chat_id]) == SEND_DEAD for chat_id in BLOCKED)
+    assert stub_bot == [3]
+
+
+def test_chart_is_uploaded_directly_when_every_shared_upload_fails(stub_bot, monkeypatch):
+    monkeypatch.setattr(jopae_tg_bot, "CHART_UPLOAD_ATTEMPTS", 1)
+
+    results = send_all([1, 3])
+
+    assert isinstance(results[1], TelegramForbiddenError)
+    assert results[3] is None
+    assert stub_bot == [3]
+
+
+def test_report_is_sent_without_the_chart_when_it_cannot_be_built(stub_bot, messages, monkeypatch):
+    async def build_chart(cell):
+        raise OSError("history file is unreadable")
+
+    monkeypatch.setattr(message, "build_chart", build_chart)
+
+    results = send_all([3, 4])
+
+    assert results == {3: None, 4: None}
+    assert messages == [(3, "text"), (4, "text")]
+    assert stub_bot == []
+
+
+def test_long_text_is_not_sent_again_when_the_chart_is_retried(stub_bot, messages, monkeypatch):
+    long_text = "x" * (TELEGRAM_CAPTION_LIMIT + 1)
+    send_photo = jopae_tg_bot.bot.send_photo
+    failures = [TelegramNetworkError(SendPhoto(chat_id=3, photo="x"), "connection reset")]
+
+    async def flaky_send_photo(chat_id, photo, caption=None):
+        if failures:
+            raise failures.pop()
+        return await send_photo(chat_id, photo, caption=caption)
+
+    monkeypatch.setattr(jopae_tg_bot.bot, "send_photo", flaky_send_photo)
+
+    async def deliver():
+        return await jopae_tg_bot.send_with_chart(3, long_text, "cell", "2026-01-01")
+
+    with pytest.raises(TelegramNetworkError) as error:
+        asyncio.run(deliver())
+    assert classify_send_error(error.value) == SEND_TRANSIENT
+    asyncio.run(deliver())
+
+    assert messages == [(3, long_text)]
+    assert stub_bot == [3]
+    assert not jopae_tg_bot.texts_sent
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from python_scripts import circuit_breaker, etl
+from python_scripts.circuit_breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_a_single_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 60
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_failed_probe_doubles_the_pause_up_to_the_limit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, max_reset_timeout=100)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+
+    # Неудачная проба: пауза удваивается, но не больше max_reset_timeout
+    breaker.record_failure()
+    clock.now += 99
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_breakers_are_per_location_for_local_sources(monkeypatch):
+    monkeypatch.setattr(etl, "breakers", {})
+    monkeypatch.setattr(etl, "last_good", {})
+
+    def weather(lat, lon):
+        if lat == "0":
+            raise RuntimeError("upstream error")
+        return {"lat": lat}
+
+    monkeypatch.setitem(etl.SOURCES, "weather", weather)
+    for _ in range(etl.get_breaker("weather", ("0", "0")).failure_threshold):
+        asyncio.run(etl.fetch_source_async("weather", "0", "0"))
+
+    assert etl.get_breaker("weather", ("0", "0")).state == OPEN
+    assert asyncio.run(etl.fetch_source_async("weather", "1", "1")) == {"lat": "1"}
+    assert etl.get_breaker("weather", ("1", "1")).state == CLOSED
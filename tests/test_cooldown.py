@@ -0,0 +1,20 @@
+from python_scripts.cooldown import ChatCooldown
+
+
+def test_cooldown_limits_each_chat():
+    cooldown = ChatCooldown(interval=60, max_size=10)
+
+    assert cooldown.check(1, now=0) == 0
+    assert cooldown.check(1, now=20) == 40
+    assert cooldown.check(2, now=20) == 0
+    assert cooldown.check(1, now=60) == 0
+
+
+def test_cooldown_forgets_the_least_recent_chat():
+    cooldown = ChatCooldown(interval=60, max_size=2)
+    for chat_id in (1, 2, 3):
+        cooldown.check(chat_id, now=0)
+
+    assert len(cooldown) == 2
+    assert cooldown.check(1, now=1) == 0
+    assert cooldown.check(3, now=1) == 59
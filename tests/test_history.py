@@ -0,0 +1,71 @@
+import multiprocessing
+import struct
+from array import array
+
+from python_scripts.history import ObservationHistory, Series, ROWS_SUFFIX
+
+
+def test_append_skips_observations_not_newer_than_the_last(tmp_path):
+    series = Series(str(tmp_path / "pressure"))
+
+    assert series.append(10, 740.0)
+    assert not series.append(10, 741.0)
+    assert not series.append(5, 742.0)
+    assert series.append(20, 743.0)
+    assert list(series.window(0, 15)[1]) == [740.0]
+    assert list(series.last(1)[0]) == [20]
+
+
+def test_series_is_reloaded_from_disk(tmp_path):
+    path = str(tmp_path / "flux")
+    series = Series(path)
+    for timestamp in (1, 2, 3):
+        series.append(timestamp, float(timestamp))
+
+    reloaded = Series(path)
+
+    assert list(reloaded.times) == [1, 2, 3]
+    assert list(reloaded.values) == [1.0, 2.0, 3.0]
+
+
+def test_rows_appended_by_another_instance_are_visible(tmp_path):
+    history, other = ObservationHistory(str(tmp_path)), ObservationHistory(str(tmp_path))
+    history.append("g_scale", "global", 1, 1.0)
+    other.append("g_scale", "global", 2, 2.0)
+
+    assert not history.append("g_scale", "global", 2, 3.0)
+    assert list(history.last("g_scale", "global", 5)[1]) == [1.0, 2.0]
+
+
+def test_legacy_column_files_are_converted(tmp_path):
+    path = str(tmp_path / "pressure")
+    with open(path + ".t", "wb") as times:
+        times.write(array("q", [1, 2, 3]).tobytes())
+    with open(path + ".v", "wb") as values:
+        values.write(array("d", [1.0, 2.0]).tobytes())
+
+    series = Series(path)
+
+    assert (list(series.times), list(series.values)) == ([1, 2], [1.0, 2.0])
+    assert sorted(child.name for child in tmp_path.iterdir()) == ["pressure" + ROWS_SUFFIX]
+
+
+def append_range(path: str, start: int) -> None:
+    series = Series(path)
+    for timestamp in range(start, 2000):
+        series.append(timestamp, float(timestamp))
+
+
+def test_concurrent_processes_keep_rows_ordered_and_aligned(tmp_path):
+    path = str(tmp_path / "pressure")
+    processes = [multiprocessing.Process(target=append_range, args=(path, start)) for start in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    with open(path + ROWS_SUFFIX, "rb") as rows_file:
+        rows = list(struct.iter_unpack("<qd", rows_file.read()))
+
+    assert [timestamp for timestamp, _ in rows] == list(range(2000))
+    assert all(timestamp == value for timestamp, value in rows)
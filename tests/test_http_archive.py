@@ -0,0 +1,99 @@
+import gzip
+import multiprocessing
+
+import pytest
+import requests
+
+from benchmarks.fake_servers import serve
+from benchmarks.load_test import free_port, wait_for
+from python_scripts import etl, http_cache, http_client
+from python_scripts.etl import flux_rows, parse_flux_row
+from python_scripts.history import ObservationHistory
+from python_scripts.http_archive import ArchiveWriter, request_key
+
+# Последняя строка 30-дневного ряда заглушки NOAA: 120 + 29 * 2
+LAST_FLUX = 178.0
+
+
+@pytest.fixture(params=[False, True], ids=["table_rows", "dict_rows"])
+def upstream(request):
+    """Заглушки внешних API в отдельном процессе; ряд потока в табличном формате или словарями."""
+    port = free_port()
+    config = {"upstream_latency": 0, "flux_dict_rows": request.param}
+    server = multiprocessing.get_context("spawn").Process(target=serve, args=("127.0.0.1", port, config), daemon=True)
+    server.start()
+    base = f"http://127.0.0.1:{port}"
+    wait_for(base + "/_stats")
+    yield server, base
+    server.terminate()
+    server.join()
+
+
+def use_fresh_state(monkeypatch, tmp_path, name: str) -> None:
+    """Пустые дисковый кэш, история и выключатели, чтобы ответ шёл через http_client."""
+    directory = tmp_path / name
+    directory.mkdir()
+    monkeypatch.chdir(directory)
+    monkeypatch.setattr(http_cache, "_entries", {})
+    monkeypatch.setattr(etl, "history", ObservationHistory(str(directory / "history")))
+
+
+def test_recorded_responses_are_replayed_offline(upstream, monkeypatch, tmp_path):
+    server, base = upstream
+    archive = str(tmp_path / "archive.jsonl.gz")
+    monkeypatch.setattr(etl, "X_RAY_URL", base + "/products/10cm-flux-30-day.json")
+
+    use_fresh_state(monkeypatch, tmp_path, "record")
+    monkeypatch.setattr(http_client, "HTTP_MODE", "record")
+    monkeypatch.setattr(http_client, "_writer", ArchiveWriter(archive))
+    recorded = etl.get_solar_flare_info()
+    weather = http_client.fetch("weather", base + "/data/2.5/weather", params={"lat": 55, "lon": 37, "appid": "secret"})
+
+    # Воспроизведение идёт без сети: заглушки остановлены
+    server.terminate()
+    server.join()
+    use_fresh_state(monkeypatch, tmp_path, "replay")
+    monkeypatch.setattr(http_client, "HTTP_MODE", "replay")
+    monkeypatch.setattr(http_client, "HTTP_ARCHIVE", archive)
+    monkeypatch.setattr(http_client, "_writer", None)
+    monkeypatch.setattr(http_client, "_replayer", None)
+    replayed = etl.get_solar_flare_info()
+    # Ключ API не входит в ключ архива, поэтому ответ находится и с другим ключом
+    replayed_weather = http_client.fetch("weather", base + "/data/2.5/weather", params={"lat": 55, "lon": 37, "appid": "other"})
+
+    assert isinstance(recorded, dict)
+    assert replayed == recorded
+    assert float(replayed["value"]) == LAST_FLUX
+    assert replayed_weather.json() == weather.json()
+    with gzip.open(archive, "rt", encoding="utf-8") as archived:
+        assert "secret" not in archived.read()
+
+
+def test_missing_request_is_a_connection_error(monkeypatch, tmp_path):
+    archive = str(tmp_path / "archive.jsonl.gz")
+    with gzip.open(archive, "wt", encoding="utf-8"):
+        pass
+    monkeypatch.setattr(http_client, "HTTP_MODE", "replay")
+    monkeypatch.setattr(http_client, "HTTP_ARCHIVE", archive)
+    monkeypatch.setattr(http_client, "_replayer", None)
+
+    with pytest.raises(requests.ConnectionError):
+        http_client.fetch("weather", "http://upstream/data/2.5/weather", params={"lat": 1})
+
+
+def test_request_key_ignores_host_order_and_secrets():
+    assert request_key("weather", "https://a/path?b=2", {"a": 1, "appid": "secret"}) == \
+        request_key("weather", "http://b:8080/path", {"appid": "other", "b": "2", "a": "1"})
+
+
+@pytest.mark.parametrize("payload", [
+    [["time_tag", "flux"], ["2026-01-01 20:00:00", "150"], ["2026-01-02 20:00:00", "152"]],
+    [{"time_tag": "2026-01-01 20:00:00", "flux": 150}, {"time_tag": "2026-01-02 20:00:00", "flux": 152}],
+    [{"time_tag": "2026-01-01 20:00:00", "flux_observed": 150}, {"time_tag": "2026-01-02 20:00:00", "flux_observed": 152}],
+], ids=["table", "dict", "dict_observed"])
+def test_flux_row_shapes_parse_the_same(payload):
+    rows = [parse_flux_row(row) for row in flux_rows(payload)]
+
+    assert [(time_tag, float(flux)) for time_tag, flux in rows] == [
+        ("2026-01-01 20:00:00", 150.0), ("2026-01-02 20:00:00", 152.0)
+    ]
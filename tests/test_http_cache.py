@@ -0,0 +1,116 @@
+import json
+import threading
+
+import pytest
+import requests
+
+from python_scripts import http_cache
+from python_scripts.config.consts import HTTP_CACHE_FRESHNESS, HTTP_CACHE_STALE_MAX
+
+URL = "https://services.swpc.noaa.gov/products/10cm-flux-30-day.json"
+
+
+class Upstream:
+    """Заглушка http_client.fetch: отдаёт заданные ответы по очереди и запоминает заголовки запросов."""
+
+    def __init__(self) -> None:
+        self.responses: list[requests.Response] = []
+        self.requests: list[dict] = []
+
+    def reply(self, status: int, body: bytes = b"", **headers: str) -> None:
+        response = requests.Response()
+        response.status_code = status
+        response._content = body
+        response.headers.update(headers)
+        self.responses.append(response)
+
+    def __call__(self, source, url, params=None, headers=None) -> requests.Response:
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path):
+    upstream = Upstream()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(http_cache, "_entries", {})
+    monkeypatch.setattr(http_cache, "fetch", upstream)
+    return upstream
+
+
+def age_entry(seconds: float) -> None:
+    for entry in http_cache._entries.values():
+        entry.fetched_at -= seconds
+
+
+def wait_for_refresh() -> None:
+    for thread in threading.enumerate():
+        if thread.name.startswith("http-cache-"):
+            thread.join(5)
+
+
+def test_fresh_entry_is_served_without_a_request(upstream):
+    upstream.reply(200, b"[1]", ETag='"v1"')
+
+    assert http_cache.fetch_cached("solar_flare", URL).json() == [1]
+    assert http_cache.fetch_cached("solar_flare", URL).json() == [1]
+    assert len(upstream.requests) == 1
+
+
+@pytest.mark.parametrize("validators, conditional", [
+    ({"ETag": '"v1"'}, {"If-None-Match": '"v1"'}),
+    ({"Last-Modified": "Mon, 01 Jan 2026 00:00:00 GMT"}, {"If-Modified-Since": "Mon, 01 Jan 2026 00:00:00 GMT"}),
+])
+def test_expired_entry_is_revalidated_with_a_conditional_get(upstream, validators, conditional):
+    upstream.reply(200, b"[1]", **validators)
+    upstream.reply(304)
+    first = http_cache.fetch_cached("solar_flare", URL)
+    age_entry(HTTP_CACHE_STALE_MAX["solar_flare"] + 1)
+
+    second = http_cache.fetch_cached("solar_flare", URL)
+
+    assert upstream.requests[1] == conditional
+    assert second is first and second.json() == [1]
+    assert second.age() < 1
+    # Ответ 304 продлевает запись и на диске: новый процесс её не перезапрашивает
+    http_cache._entries.clear()
+    assert http_cache.fetch_cached("solar_flare", URL).json() == [1]
+    assert len(upstream.requests) == 2
+
+
+def test_stale_entry_is_served_and_refreshed_in_background(upstream):
+    upstream.reply(200, b"[1]", ETag='"v1"')
+    upstream.reply(200, b"[2]", ETag='"v2"')
+    http_cache.fetch_cached("solar_flare", URL)
+    age_entry(HTTP_CACHE_FRESHNESS["solar_flare"] + 1)
+
+    stale = http_cache.fetch_cached("solar_flare", URL)
+    wait_for_refresh()
+
+    assert stale.json() == [1]
+    assert upstream.requests[1] == {"If-None-Match": '"v1"'}
+    assert http_cache.fetch_cached("solar_flare", URL).json() == [2]
+    assert len(upstream.requests) == 2
+
+
+def test_error_response_without_an_entry_is_returned_as_is(upstream):
+    upstream.reply(503)
+
+    assert http_cache.fetch_cached("solar_flare", URL).status_code == 503
+    assert not http_cache._entries
+
+
+@pytest.mark.parametrize("meta", ['{"etag": "\\"v1\\""}', "null", '{"fetched_at": "yesterday"}', '{"etag": '])
+def test_damaged_meta_file_is_a_cache_miss(upstream, meta):
+    upstream.reply(200, b"[1]", ETag='"v1"')
+    upstream.reply(200, b"[2]")
+    http_cache.fetch_cached("solar_flare", URL)
+    meta_path, _ = http_cache._paths(next(iter(http_cache._entries)))
+    with open(meta_path, "w", encoding="utf-8") as meta_file:
+        meta_file.write(meta)
+    http_cache._entries.clear()
+
+    assert http_cache.fetch_cached("solar_flare", URL).json() == [2]
+    assert upstream.requests[1] == {}
+    with open(meta_path, encoding="utf-8") as meta_file:
+        assert isinstance(json.load(meta_file)["fetched_at"], float)
@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+from python_scripts import http_client
+from python_scripts.config.consts import HTTP_MAX_RETRIES, HTTP_RETRY_BUDGET, SOURCE_TIMEOUT
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class Upstream:
+    """Заглушка _send: каждая попытка длится latency секунд и отвечает 503."""
+
+    def __init__(self, clock: Clock) -> None:
+        self.clock = clock
+        self.attempts = 0
+        self.latency = 0.01
+
+    def __call__(self, source, url, params, headers) -> requests.Response:
+        self.attempts += 1
+        self.clock.now += self.latency
+        response = requests.Response()
+        response.status_code = 503
+        return response
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    clock = Clock()
+    upstream = Upstream(clock)
+    monkeypatch.setattr(http_client.time, "monotonic", clock)
+    monkeypatch.setattr(http_client.time, "sleep", clock.sleep)
+    monkeypatch.setattr(http_client, "HTTP_MODE", "live")
+    monkeypatch.setattr(http_client, "_stats", {})
+    monkeypatch.setattr(http_client, "_send", upstream)
+    return upstream
+
+
+def test_fast_failures_are_retried(upstream, monkeypatch):
+    monkeypatch.setattr(http_client, "_backoff", lambda attempt: 0.1)
+
+    assert http_client.fetch("weather", "http://upstream/a").status_code == 503
+    assert upstream.attempts == HTTP_MAX_RETRIES + 1
+    assert http_client.get_http_stats()["weather"]["retries"] == HTTP_MAX_RETRIES
+
+
+def test_retries_stop_before_the_source_deadline(upstream):
+    upstream.latency = 4
+    started = upstream.clock.now
+
+    assert http_client.fetch("weather", "http://upstream/a").status_code == 503
+    assert upstream.attempts == 1
+    assert upstream.clock.now - started < SOURCE_TIMEOUT
+
+
+def test_network_errors_are_raised_once_the_budget_is_spent(upstream, monkeypatch):
+    def send(source, url, params, headers):
+        upstream.attempts += 1
+        upstream.clock.now += HTTP_RETRY_BUDGET / 2
+        raise requests.ConnectTimeout("timed out")
+
+    monkeypatch.setattr(http_client, "_send", send)
+
+    with pytest.raises(requests.ConnectTimeout):
+        http_client.fetch("weather", "http://upstream/a")
+    assert upstream.attempts == 1
+    assert http_client.get_http_stats()["weather"]["failures"] == 1
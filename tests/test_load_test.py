@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from benchmarks.fake_servers import FakeConfig, FakeServers, chance
+from benchmarks.load_test import free_port, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("values, share, expected", [
+    ([], 0.5, None),
+    ([3.0], 0.99, 3.0),
+    ([4.0, 1.0, 3.0, 2.0], 0.5, 2.0),
+    ([float(i) for i in range(1, 101)], 0.99, 99.0),
+    ([1.0, 2.0], 0.0, 1.0),
+])
+def test_percentile_by_nearest_rank(values, share, expected):
+    assert percentile(values, share) == expected
+
+
+def test_chance_is_deterministic():
+    assert chance(1, "blocked", 42) == chance(1, "blocked", 42)
+    assert chance(1, "blocked", 42) != chance(2, "blocked", 42)
+    assert 0 <= chance("any") < 1
+
+
+async def call_fakes(config: FakeConfig, scenario) -> FakeServers:
+    """Поднимает заглушки на localhost и выполняет scenario(client, base)."""
+    fakes = FakeServers(config)
+    runner = web.AppRunner(fakes.application())
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    base = f"http://127.0.0.1:{port}"
+    try:
+        async with aiohttp.ClientSession() as client:
+            await scenario(client, base)
+    finally:
+        await runner.cleanup()
+    return fakes
+
+
+def test_fake_telegram_answers_like_the_bot_api():
+    config = FakeConfig(telegram_latency=0, telegram_jitter=0, blocked_rate=0.5, telegram_429_rate=1.0)
+    blocked = [chat_id for chat_id in range(1, 50) if chance(config.seed, "blocked", chat_id) < 0.5]
+    alive = next(chat_id for chat_id in range(1, 50) if chat_id not in blocked)
+
+    async def scenario(client, base):
+        async def send(chat_id):
+            async with client.post(f"{base}/bot123:token/sendMessage", data={"chat_id": chat_id, "text": "hi"}) as response:
+                return response.status, await response.json()
+
+        status, body = await send(blocked[0])
+        assert status == 403 and not body["ok"]
+        status, body = await send(alive)
+        assert status == 429 and body["parameters"]["retry_after"] == config.telegram_retry_after
+        status, body = await send(alive)
+        assert status == 200 and body["result"]["chat"]["id"] == alive
+
+    fakes = asyncio.run(call_fakes(config, scenario))
+    assert list(fakes.delivered) == [alive]
+    assert fakes.calls["telegram.sendMessage"] == 3
+
+
+def test_fake_telegram_counts_only_photo_uploads():
+    async def scenario(client, base):
+        form = aiohttp.FormData()
+        form.add_field("chat_id", "1")
+        form.add_field("photo", b"png", filename="chart.png")
+        async with client.post(f"{base}/bot123:token/sendPhoto", data=form) as response:
+            file_id = (await response.json())["result"]["photo"][-1]["file_id"]
+        async with client.post(f"{base}/bot123:token/sendPhoto", data={"chat_id": 2, "photo": file_id}) as response:
+            assert (await response.json())["result"]["photo"][-1]["file_id"] == file_id
+        async with client.get(f"{base}/_stats") as response:
+            assert (await response.json())["uploads"] == 1
+
+    asyncio.run(call_fakes(FakeConfig(telegram_latency=0, telegram_jitter=0), scenario))
+
+
+@pytest.mark.parametrize("dict_rows", [False, True])
+def test_fake_flux_series_shapes(dict_rows):
+    async def scenario(client, base):
+        async with client.get(f"{base}/products/10cm-flux-30-day.json") as response:
+            rows = await response.json()
+        if dict_rows:
+            assert all(isinstance(row, dict) for row in rows)
+        else:
+            assert isinstance(rows[0], list) and all(len(row) == len(rows[0]) for row in rows)
+
+    asyncio.run(call_fakes(FakeConfig(upstream_latency=0, flux_dict_rows=dict_rows), scenario))
+
+
+def test_load_test_delivers_every_subscriber(tmp_path):
+    output = tmp_path / "results.json"
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "load_test.py"),
+         "--subscribers", "40", "--cells", "4", "--global-rate", "1000", "--output", str(output)],
+        check=True, capture_output=True, timeout=120,
+    )
+    results = json.loads(output.read_text(encoding="utf-8"))
+
+    assert results["delivered"] == 40
+    assert results["deliveries"] == {"sent": 40, "failed": 0, "pending": 0}
+    # Одна загрузка графика и один запрос погоды на ячейку, NOAA - один раз на рассылку
+    assert results["chart_uploads"] == results["cells"]
+    assert results["upstream_calls"]["openweather"] <= results["cells"]
+    assert results["upstream_calls"]["noaa.flux"] == 1
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from python_scripts import report_cache
+from python_scripts.report_cache import ReportCache
+
+
+def test_concurrent_misses_build_once():
+    builds = 0
+
+    async def build():
+        nonlocal builds
+        builds += 1
+        await asyncio.sleep(0.01)
+        return "report"
+
+    async def main():
+        cache = ReportCache(ttl=60)
+        results = await asyncio.gather(*(cache.get("cell", build) for _ in range(10)))
+        return cache, results
+
+    cache, results = asyncio.run(main())
+
+    assert results == ["report"] * 10
+    assert builds == 1
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": 9}
+
+
+def test_failures_are_shared_but_not_cached():
+    calls = 0
+
+    async def build():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        if calls == 1:
+            raise RuntimeError("upstream error")
+        return "report"
+
+    async def main():
+        cache = ReportCache(ttl=60)
+        first = await asyncio.gather(cache.get("cell", build), cache.get("cell", build), return_exceptions=True)
+        return first, await cache.get("cell", build)
+
+    first, second = asyncio.run(main())
+
+    assert all(isinstance(result, RuntimeError) for result in first)
+    assert second == "report"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(report_cache.time, "monotonic", lambda: now[0])
+    values = iter(["old", "new"])
+
+    async def build():
+        return next(values)
+
+    async def main():
+        cache = ReportCache(ttl=60)
+        first = await cache.get("cell", build)
+        assert cache.is_fresh("cell")
+        now[0] += 61
+        return first, cache.is_fresh("cell"), await cache.get("cell", build)
+
+    assert asyncio.run(main()) == ("old", False, "new")
+
+
+def test_cancelled_waiter_does_not_cancel_the_build():
+    async def build():
+        await asyncio.sleep(0.02)
+        return "report"
+
+    async def main():
+        cache = ReportCache(ttl=60)
+        waiter = asyncio.create_task(cache.get("cell", build))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await cache.get("cell", build), cache.stats()
+
+    result, stats = asyncio.run(main())
+
+    assert result == "report"
+    assert stats["misses"] == 1
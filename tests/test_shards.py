@@ -0,0 +1,79 @@
+import asyncio
+
+from python_scripts.broadcast import TokenBucket
+from python_scripts.shards import LeaseManager, ShardWorker
+
+TTL = 30
+
+
+def test_single_worker_takes_leadership_and_all_partitions(database):
+    worker = LeaseManager("a", 4, ttl=TTL)
+
+    assert worker.refresh(now=0) == (True, frozenset({0, 1, 2, 3}))
+
+
+def test_partitions_are_split_fairly_and_leader_is_exclusive(database):
+    first, second = LeaseManager("a", 4, ttl=TTL), LeaseManager("b", 4, ttl=TTL)
+    first.refresh(now=0)
+    second.refresh(now=1)
+    # Первый воркер отпускает лишние разделы, когда видит второго
+    first.refresh(now=2)
+    second.refresh(now=3)
+
+    assert first.is_leader and not second.is_leader
+    assert len(first.owned) == len(second.owned) == 2
+    assert first.owned.isdisjoint(second.owned)
+
+
+def test_leases_of_a_dead_worker_are_taken_over_after_ttl(database):
+    first, second = LeaseManager("a", 2, ttl=TTL), LeaseManager("b", 2, ttl=TTL)
+    first.refresh(now=0)
+    second.refresh(now=1)
+    first.refresh(now=2)
+    second.refresh(now=3)
+
+    # Первый воркер умер и больше не продлевает аренды: до истечения срока они за ним
+    assert second.refresh(now=TTL) == (False, frozenset(second.owned))
+    is_leader, owned = second.refresh(now=TTL + 3)
+
+    assert is_leader
+    assert owned == frozenset({0, 1})
+
+
+def test_released_leases_are_available_immediately(database):
+    first, second = LeaseManager("a", 2, ttl=TTL), LeaseManager("b", 2, ttl=TTL)
+    first.refresh(now=0)
+    first.release()
+
+    assert second.refresh(now=1) == (True, frozenset({0, 1}))
+    assert (first.is_leader, first.owned) == (False, frozenset())
+
+
+class StubWheel:
+    lead = 0
+
+    def start_prewarm(self, slot, partitions):
+        pass
+
+
+def test_workers_split_the_bot_send_rate(database):
+    async def send(delivery_date, partition):
+        pass
+
+    async def main():
+        buckets = [TokenBucket(30), TokenBucket(30)]
+        workers = [
+            ShardWorker(LeaseManager(owner, 4, ttl=TTL), send, StubWheel(), lambda: [], bucket=bucket, rate=30)
+            for owner, bucket in zip("ab", buckets)
+        ]
+        await workers[0].step()
+        assert buckets[0].rate == 30
+        # Второй воркер сразу видит двоих, первый - при следующем продлении аренд
+        await workers[1].step()
+        await workers[0].step()
+        for worker in workers:
+            for task in worker._tasks.values():
+                task.cancel()
+        return [bucket.rate for bucket in buckets]
+
+    assert asyncio.run(main()) == [15, 15]
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from python_scripts.subscriptions import (
+    add_subscriber,
+    get_cells_due_between,
+    get_pending_cells,
+    iter_subscribers,
+    materialize_due_deliveries,
+    partition_of,
+    remove_subscribers,
+    get_delivery_stats
+)
+
+# Отрицательные chat_id - группы Telegram
+CHAT_IDS = [-1001, -7, -2, 1, 2, 3, 10, 11, 12, 999]
+
+
+def add_due_subscribers(database, due: int) -> None:
+    for chat_id in CHAT_IDS:
+        add_subscriber(chat_id)
+    database.write(lambda conn: conn.executemany(
+        "UPDATE subscribers SET cell = ?, next_delivery_utc = ? WHERE chat_id = ?",
+        [(f"cell{chat_id}", due, chat_id) for chat_id in CHAT_IDS]
+    ))
+
+
+@pytest.mark.parametrize("partitions", [1, 2, 3, 4])
+def test_partitions_cover_every_chat_exactly_once(database, partitions):
+    add_due_subscribers(database, due=100)
+
+    seen = []
+    for i in range(partitions):
+        chats = list(iter_subscribers(page_size=3, partition=(partitions, i)))
+        assert all(partition_of(chat_id, partitions) == i for chat_id in chats)
+        seen += chats
+
+    assert sorted(seen) == sorted(CHAT_IDS)
+
+
+def test_cells_due_between_respects_interval_and_partitions(database):
+    add_due_subscribers(database, due=100)
+    database.write(lambda conn: conn.execute("UPDATE subscribers SET next_delivery_utc = 500 WHERE chat_id = 999"))
+
+    all_cells = asyncio.run(get_cells_due_between(0, 200))
+    cells = asyncio.run(get_cells_due_between(0, 200, [(3, 0), (3, 2)]))
+
+    assert sorted(all_cells) == sorted(f"cell{chat_id}" for chat_id in CHAT_IDS if chat_id != 999)
+    assert sorted(cells) == sorted(
+        f"cell{chat_id}" for chat_id in CHAT_IDS if chat_id != 999 and partition_of(chat_id, 3) in (0, 2)
+    )
+    assert asyncio.run(get_cells_due_between(0, 200, [])) == []
+
+
+def test_pending_cells_by_partition(database):
+    add_due_subscribers(database, due=100)
+    dates = materialize_due_deliveries(100)
+    (delivery_date,) = dates
+
+    for i in range(2):
+        cells = asyncio.run(get_pending_cells(delivery_date, (2, i)))
+        assert sorted(cells) == sorted(f"cell{chat_id}" for chat_id in CHAT_IDS if partition_of(chat_id, 2) == i)
+
+
+def test_pruning_removes_subscribers_and_their_pending_deliveries(database):
+    add_due_subscribers(database, due=100)
+    (delivery_date,) = materialize_due_deliveries(100)
+
+    assert remove_subscribers([1, -7, 123456]) == 2
+    assert sorted(iter_subscribers()) == sorted(set(CHAT_IDS) - {1, -7})
+    assert get_delivery_stats(delivery_date)["pending"] == len(CHAT_IDS) - 2
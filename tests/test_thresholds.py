@@ -0,0 +1,49 @@
+import pytest
+
+from python_scripts.config.consts import VERDICT_GEOMAGNETIC, VERDICT_POLLEN, VERDICT_SOLAR, VERDICT_WEATHER
+from python_scripts.config.types import ReportMetrics
+from python_scripts.thresholds import ThresholdTable, parse_threshold
+
+
+def metrics(pressure=750.0, flux=100.0, g_scale=0, fixed=0):
+    return ReportMetrics(pressure=pressure, flux=flux, g_scale=g_scale, fixed=fixed)
+
+
+def test_default_thresholds_for_unknown_chats():
+    table = ThresholdTable([(5, 760, None, None)])
+
+    assert table.set_of(1) == 0
+    assert table.verdict(1, metrics(pressure=739)) == VERDICT_WEATHER
+    assert table.verdict(1, metrics(pressure=745)) == 0
+
+
+def test_custom_thresholds_are_deduplicated():
+    table = ThresholdTable([(3, 760, None, None), (1, 760, None, None), (2, None, 120, 3)])
+
+    assert len(table) == 3
+    assert table.set_of(1) == table.set_of(3) != table.set_of(2)
+    assert len(table.pressure) == 3
+
+
+def test_verdict_combines_fixed_bits_and_thresholds():
+    table = ThresholdTable([(1, 760, 120, 3)])
+    report = metrics(pressure=750, flux=130, g_scale=2, fixed=VERDICT_POLLEN)
+
+    assert table.verdict(1, report) == VERDICT_POLLEN | VERDICT_WEATHER | VERDICT_SOLAR
+    assert table.verdict(2, report) == VERDICT_POLLEN | VERDICT_GEOMAGNETIC
+
+
+@pytest.mark.parametrize("text, parsed", [
+    ("pressure 745", ("pressure", 745.0)),
+    ("FLUX 180", ("flux", 180.0)),
+    ("g 2", ("g", 2.0)),
+    ("g 2.0", ("g", 2.0)),
+    ("g 2.5", None),
+    ("g 6", None),
+    ("pressure 900", None),
+    ("g two", None),
+    ("humidity 50", None),
+    ("pressure", None),
+])
+def test_parse_threshold(text, parsed):
+    assert parse_threshold(text) == parsed
@@ -0,0 +1,71 @@
+import asyncio
+
+from python_scripts import broadcast
+from python_scripts.broadcast import TimingWheel
+
+
+def test_ticks_are_not_held_back_by_a_running_broadcast(monkeypatch):
+    materialized, fired = [], []
+
+    def materialize(slot):
+        materialized.append(slot)
+        return {"2026-01-01"}
+
+    async def fire(delivery_date):
+        fired.append(delivery_date)
+        await asyncio.sleep(0.05)
+
+    monkeypatch.setattr(broadcast, "materialize_due_deliveries", materialize)
+
+    async def main():
+        wheel = TimingWheel(fire)
+        for slot in (0, 60, 120):
+            await wheel.tick(slot)
+        assert materialized == [0, 60, 120]
+        await wheel.wait_fired()
+
+    asyncio.run(main())
+    # Одна рассылка по дате за раз: тики во время рассылки сливаются в один дополнительный проход
+    assert fired == ["2026-01-01", "2026-01-01"]
+
+
+def test_different_dates_are_sent_concurrently(monkeypatch):
+    running, peak = 0, 0
+
+    async def fire(delivery_date):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    monkeypatch.setattr(broadcast, "materialize_due_deliveries", lambda slot: {"2026-01-01", "2026-01-02"})
+
+    async def main():
+        wheel = TimingWheel(fire)
+        await wheel.tick(0)
+        await wheel.wait_fired()
+
+    asyncio.run(main())
+    assert peak == 2
+
+
+def test_failed_broadcast_does_not_stop_the_wheel(monkeypatch, capsys):
+    calls = []
+
+    async def fire(delivery_date):
+        calls.append(delivery_date)
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(broadcast, "materialize_due_deliveries", lambda slot: {f"day{slot}"})
+
+    async def main():
+        wheel = TimingWheel(fire)
+        await wheel.tick(0)
+        await wheel.wait_fired()
+        await wheel.tick(60)
+        await wheel.wait_fired()
+
+    asyncio.run(main())
+    assert calls == ["day0", "day60"]
+    assert "Delivery for day0 failed" in capsys.readouterr().out
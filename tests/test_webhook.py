@@ -0,0 +1,106 @@
+import asyncio
+import socket
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+from benchmarks.fake_servers import FakeConfig, FakeServers
+from python_scripts.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "webhook-secret"
+PATH = "/webhook"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def update(update_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "text": "/start",
+        },
+    }
+
+
+async def run_webhook(scenario, queue_size: int = 1, workers: int = 1) -> FakeServers:
+    """Поднимает заглушку Bot API и WebhookServer на localhost и выполняет scenario(server, post, gate)."""
+    fakes = FakeServers(FakeConfig(telegram_latency=0, telegram_jitter=0))
+    telegram = web.AppRunner(fakes.application())
+    await telegram.setup()
+    telegram_port = free_port()
+    await web.TCPSite(telegram, "127.0.0.1", telegram_port).start()
+
+    bot = Bot(
+        "123456:test-token",
+        session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{telegram_port}")),
+    )
+    gate = asyncio.Event()
+    dispatcher = Dispatcher()
+
+    @dispatcher.message()
+    async def reply(message: Message) -> None:
+        await gate.wait()
+        await message.answer("ok")
+
+    server = WebhookServer(dispatcher, bot, PATH, SECRET, queue_size=queue_size, workers=workers)
+    port = free_port()
+    await server.start("127.0.0.1", port)
+    try:
+        async with aiohttp.ClientSession() as client:
+            async def post(body: dict, secret: str = SECRET) -> int:
+                async with client.post(f"http://127.0.0.1:{port}{PATH}", json=body, headers={SECRET_HEADER: secret}) as response:
+                    return response.status
+
+            await scenario(server, post, gate)
+    finally:
+        # Обработчики отпускаются только перед остановкой сервера
+        gate.set()
+        await server.stop()
+        await bot.session.close()
+        await telegram.cleanup()
+    return fakes
+
+
+def test_wrong_secret_is_rejected():
+    async def scenario(server, post, gate):
+        assert await post(update(1, 1), secret="wrong") == 401
+        assert await post(update(2, 1), secret="") == 401
+        assert server.received == 0 and server.queue.empty()
+
+    fakes = asyncio.run(run_webhook(scenario))
+    assert fakes.calls["telegram.sendMessage"] == 0
+
+
+def test_full_queue_answers_503():
+    async def scenario(server, post, gate):
+        # Первое обновление забирает единственный обработчик, второе занимает очередь
+        assert await post(update(1, 1)) == 200
+        await asyncio.sleep(0.05)
+        assert await post(update(2, 2)) == 200
+        assert await post(update(3, 3)) == 503
+        assert (server.received, server.rejected) == (2, 1)
+
+    fakes = asyncio.run(run_webhook(scenario))
+    assert sorted(fakes.delivered) == [1, 2]
+
+
+def test_queued_updates_are_drained_on_shutdown():
+    async def scenario(server, post, gate):
+        for update_id in range(1, 6):
+            assert await post(update(update_id, update_id)) == 200
+        # Обработчики заняты до самой остановки: stop() должен дождаться всей очереди
+        assert server.queue.qsize() > 0
+
+    fakes = asyncio.run(run_webhook(scenario, queue_size=10, workers=2))
+    assert sorted(fakes.delivered) == [1, 2, 3, 4, 5]